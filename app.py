@@ -1,52 +1,278 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, session, jsonify, send_file
 import json
 import os
 import random
 import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
 from flask_socketio import SocketIO, join_room, leave_room, emit
 from flask import copy_current_request_context
 import string
 from io import BytesIO
+import time
+import click
+import atexit
+import gc
+import hmac
+import sqlite3
+import struct
+from assets import Asset, StaticAssets, send_asset
+from bank_registry import BankRegistry
+from broadcast import BroadcastScheduler
+from game_store import create_game_store
+from item_stats import create_item_stats, question_report
+from leaderboard import Leaderboard
+from mastery import Mastery, decode_ids, encode_ids, pack_keys, pack_record, record_answers, remap, select, unpack_keys, unpack_record
+from metrics import Registry, create_shared_metrics, instrument_flask, instrument_socketio
+from permutations import Permutation, derive_seed
+from question_bank import BankView, QuestionBank, file_source
+from scoring import UNANSWERED, answer_vector, answered, checksum, merge_answers, record_answer, score, score_many
+from scoring_queue import ScoringQueue
+from search_index import SearchIndex, fold
+from session_store import ServerSideSessionInterface, create_store
+from shuffle_plans import PlanCache, ShuffledQuestions, build_shuffle_plan
+from sqlite_pubsub import SQLiteManager
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+
+# Cross-worker Socket.IO fan-out: redis:// or amqp:// go through flask-socketio's
+# message queue support, sqlite:///path.db is a local stand-in for one box.
+# Several workers cannot share long-polling sessions, so clients use
+# websockets only when a queue is configured.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+socketio_options = {}
+if SOCKETIO_MESSAGE_QUEUE and SOCKETIO_MESSAGE_QUEUE.startswith('sqlite:///'):
+    socketio_options['client_manager'] = SQLiteManager(SOCKETIO_MESSAGE_QUEUE)
+elif SOCKETIO_MESSAGE_QUEUE:
+    socketio_options['message_queue'] = SOCKETIO_MESSAGE_QUEUE
+SOCKETIO_TRANSPORTS = ['websocket'] if SOCKETIO_MESSAGE_QUEUE else ['polling', 'websocket']
+# Long-polling payloads larger than this many bytes are gzip-compressed
+socketio_options['compression_threshold'] = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024))
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', **socketio_options)
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
 
-# Global variable to store questions (loaded once)
-QUESTIONS = None
+# Latency and payload metrics for every route and Socket.IO handler (must be
+# set up before the handlers are declared), served at /metrics
+METRICS = Registry(prefix='exam_')
+instrument_flask(app, METRICS)
+instrument_socketio(socketio, METRICS)
+# Each worker counts on its own; with sqlite:///path.db every worker saves
+# its counters there every METRICS_SAVE_INTERVAL seconds and on exit, and
+# /metrics on any worker reports the totals of all of them
+METRICS_SAVE_INTERVAL = float(os.environ.get('METRICS_SAVE_INTERVAL', 5))
+SHARED_METRICS = create_shared_metrics(METRICS, os.environ.get('METRICS_STORE_URL'), METRICS_SAVE_INTERVAL)
+METRICS_WRITER_PID = None
+
+# Sessions and exam results are kept server-side; the cookie only carries an
+# opaque signed ID. Use sqlite:///path.db to share them between workers.
+SESSION_STORE_URL = os.environ.get('SESSION_STORE_URL', 'memory://')
+# Seconds a session (and the exam in it) stays valid
+SESSION_TTL = 24 * 3600
+app.session_interface = ServerSideSessionInterface(
+    create_store(SESSION_STORE_URL, 'sessions', max_entries=50000, ttl=SESSION_TTL)
+)
+RESULT_STORE = create_store(
+    os.environ.get('RESULT_STORE_URL', SESSION_STORE_URL), 'results', max_entries=50000, ttl=SESSION_TTL
+)
+
+# Per-client mastery records (seen, wrong and mastered bitsets of about 200
+# bytes), keyed by client_id and updated by every scored exam
+MASTERY_STORE = create_store(
+    os.environ.get('MASTERY_STORE_URL', SESSION_STORE_URL), 'mastery',
+    max_entries=int(os.environ.get('MASTERY_MAX_CLIENTS', 100000)), ttl=180 * 24 * 3600
+)
+# Stable question keys of every bank a mastery record was saved with, by
+# keys_version, so records can be remapped after questions move
+MASTERY_BANK_KEYS = create_store(
+    os.environ.get('MASTERY_STORE_URL', SESSION_STORE_URL), 'mastery_banks', max_entries=1000, ttl=180 * 24 * 3600
+)
+
+# Question bank versions. The current bank is reloaded when its files
+# change; exams and rooms stay on the version they started with. An old
+# version is kept for SESSION_TTL after it stops being current, since any
+# worker may serve a session started on it, and as long as a room uses it;
+# only the BANK_MAX_SUPERSEDED most recently replaced are kept for sessions.
+BANKS = BankRegistry(ttl=SESSION_TTL, max_superseded=int(os.environ.get('BANK_MAX_SUPERSEDED', 3)))
+# Seconds between checks of the bank files for changes (0 disables)
+BANK_RELOAD_INTERVAL = float(os.environ.get('BANK_RELOAD_INTERVAL', 5))
 
-# Global dictionary to store active games and their state
-GAMES = {}
-# Structure:
+# Active games and their state, behind a storage interface so several
+# workers can share them (GAME_STORE_URL=sqlite:///games.db). Read a room with
+# GAMES.get(code); change it inside `with GAMES.update(code) as game:`.
+GAMES = create_game_store(os.environ.get('GAME_STORE_URL', 'memory://'))
+# Structure of each room:
 # GAMES = {
 #   room_code: {
 #       'host': session_id,
-#       'players': { session_id: { 'name': str, 'score': int, 'time': float, 'finished': bool } },
-#       'questions': [...],
+#       'players': { client_id: { 'pid': int, 'name': str, 'score': int, 'time': float, 'finished': bool } },
+#       'seats': [client_id, ...],           # pid -> client_id
+#       'answers': { client_id: bytearray }, # synced answers, one byte per question
+#       'leaderboard': Leaderboard,          # ranks pids by (-score, time)
+#       'changed': set of pids, 'moves': [[pid, old_rank, new_rank], ...]  # since last broadcast
+#       'seed': int, 'question_list': str,  # the shuffled questions are rebuilt from these
 #       'started': bool,
 #       'start_time': datetime,
-#       'end_time': datetime or None
+#       'end_time': datetime or None,       # set once every player finished
 #   },
 #   ...
 # }
 
-# Example short sound bytes (replace with your own or use real MP3 bytes)
-CORRECT_SOUND = b"\x49\x44\x33..."  # TODO: Replace with real MP3 bytes
-WRONG_SOUND = b"\x49\x44\x33..."    # TODO: Replace with real MP3 bytes
-TOGGLE_SOUND = b"\x49\x44\x33..."   # TODO: Replace with real MP3 bytes
+# Reverse index: socket sid -> (room_code, client_id), kept current by
+# create_room, join_room and rejoin_room so disconnects never scan GAMES
+SID_INDEX = {}
+
+# Shuffle plans shared by every request rendering or scoring the same exam
+PLAN_CACHE = PlanCache(max_bytes=int(os.environ.get('PLAN_CACHE_MAX_BYTES', 8 * 1024 * 1024)))
+
+# Per-question attempt, correct and option pick counts, fed by every scored
+# submission; sqlite:///path.db shares the totals between workers and flushes
+# every ITEM_STATS_FLUSH_INTERVAL seconds
+ITEM_STATS = create_item_stats(
+    os.environ.get('ITEM_STATS_URL', 'memory://'),
+    flush_interval=float(os.environ.get('ITEM_STATS_FLUSH_INTERVAL', 10))
+)
+ITEM_STATS_FLUSHER_PID = None
+# Item statistics reveal the answer keys, so /item_stats is only served
+# with this token as a bearer token
+ITEM_STATS_TOKEN = os.environ.get('ITEM_STATS_TOKEN')
+
+# Stylesheets and scripts under static/, read and compressed once at
+# startup and served from content-hashed URLs (see asset_url)
+STATIC_ASSETS = StaticAssets(app.static_folder)
+
+# Question bank files; convert_questions.py writes both
+QUESTIONS_JSON = 'questions.json'
+QUESTIONS_BINARY = 'questions.bank'
+
+def read_question_bank():
+    """Open the binary bank if it was built from this questions.json, else parse the JSON"""
+    try:
+        source = file_source(QUESTIONS_JSON)
+        bank = QuestionBank.from_binary(QUESTIONS_BINARY)
+        # The exact size and mtime the JSON had when the bank was written;
+        # a newer-looking bank is not enough (file times tie and go backwards)
+        if bank.source == source:
+            return bank
+    except (OSError, ValueError, struct.error):
+        pass
+    with open(QUESTIONS_JSON, 'r', encoding='utf-8') as file:
+        return QuestionBank(json.load(file))
+
+def bank_files_mtime():
+    """Latest modification time of the bank files, or None if none exist"""
+    mtimes = []
+    for path in (QUESTIONS_JSON, QUESTIONS_BINARY):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes, default=None)
 
-# Load questions from JSON file
+def install_bank(bank):
+    """Make ``bank`` the current version; returns False if it already is"""
+    # The bank without answers, served from a content-hashed URL; exams only
+    # send question IDs and option orders into it
+    bank.asset = Asset(
+        json.dumps(bank.public_dict(), ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+        'application/json'
+    )
+    bank.search_index = SearchIndex(bank)
+    if not BANKS.install(bank):
+        return False
+    # Fragments cached for the previous version would keep its questions alive
+    question_json_parts.cache_clear()
+    return True
+
+# Modification time of the bank files the first bank was read from, and the
+# process watching them; workers forked after warm_up() start their own watcher
+BANK_MTIME = None
+BANK_WATCHER_PID = None
+
+def read_initial_bank():
+    """Load and index the bank files unless a bank is already installed"""
+    global BANK_MTIME
+    if BANKS.current is None:
+        BANK_MTIME = bank_files_mtime()
+        install_bank(read_question_bank())
+    return BANKS.current
+
+# Load questions and index them into a QuestionBank
 def load_questions():
-    global QUESTIONS
-    if QUESTIONS is None:
-        with open('questions.json', 'r', encoding='utf-8') as file:
-            QUESTIONS = json.load(file)
-    return QUESTIONS
+    """The current question bank"""
+    global BANK_WATCHER_PID
+    bank = read_initial_bank()
+    if BANK_RELOAD_INTERVAL > 0 and BANK_WATCHER_PID != os.getpid():
+        BANK_WATCHER_PID = os.getpid()
+        socketio.start_background_task(watch_question_bank, BANK_MTIME)
+    return bank
+
+def bank_for(version):
+    """Bank ``version`` if still loaded, else None
+
+    Never falls back to the current bank: an exam planned on another
+    version would be shown and scored against different questions.
+    """
+    load_questions()
+    return BANKS.get(version)
+
+def reload_questions():
+    """Load the bank files again; returns True if a new version was installed"""
+    bank = read_question_bank()
+    if not install_bank(bank):
+        return False
+    app.logger.info('Question bank version %s installed', bank.version)
+    return True
+
+def watch_question_bank(mtime):
+    """Background task: reload the bank when its files change"""
+    while True:
+        socketio.sleep(BANK_RELOAD_INTERVAL)
+        current = bank_files_mtime()
+        if current is not None and current != mtime:
+            mtime = current
+            try:
+                reload_questions()
+            except Exception:
+                # A half-edited file; keep serving the current version
+                app.logger.exception('Question bank reload failed')
+        if len(BANKS) > 1:
+            # Keep old versions only while a room or a session may still use them
+            BANKS.retain_only(GAMES.bank_versions())
+
+@app.route('/bank/<version>.json')
+def question_bank(version):
+    """The answer-free question bank; cached forever under its content hash"""
+    load_questions()
+    for bank in BANKS.banks():
+        if bank.asset.version == version:
+            return send_asset(bank.asset, request)
+    return jsonify({'error': 'Unknown question bank version'}), 404
+
+def exam_plan(questions, bank, start=0, stop=None, include_answers=False):
+    """Bank question IDs and option orders for positions ``start``..``stop``
+
+    Clients look the text up in the cached bank, so a plan is a few bytes
+    per question. Correct answers are only included when asked for.
+    """
+    stop = len(questions) if stop is None else min(stop, len(questions))
+    positions = range(start, stop)
+    # One order lookup per position; option orders come along with it
+    sources = [questions.source(i) for i in positions]
+    plan = {
+        'bank': url_for('question_bank', version=bank.asset.version),
+        'start': start,
+        'order': [question.qid for question, _ in sources],
+        'options': [option_order for _, option_order in sources],
+        'total_questions': len(questions)
+    }
+    if include_answers:
+        plan['answers'] = [option_order.index(int(question['correct_answer'])) for question, option_order in sources]
+    return plan
 
 def get_available_question_lists():
-    questions = load_questions()
-    return {k: len(v) for k, v in questions.items() if isinstance(v, list)}
+    return load_questions().list_sizes()
 
 @app.route('/get_question_lists')
 def get_question_lists():
@@ -67,7 +293,7 @@ def validate_session():
     if session_created:
         try:
             created_time = datetime.fromisoformat(session_created)
-            if datetime.now() - created_time > timedelta(hours=24):
+            if datetime.now() - created_time > timedelta(seconds=SESSION_TTL):
                 return False
         except:
             return False
@@ -81,38 +307,185 @@ def create_new_session():
     session['session_created'] = datetime.now().isoformat()
     session['exam_started'] = False
     session['exam_submitted'] = False
-    session['answers'] = {}
+    session['answer_vector'] = None
     session['total_questions'] = 0
     session['exam_seed'] = None
     session['randomize_questions'] = True
 
-def randomize_questions_and_options(questions, seed=None, randomize_questions=True):
-    """Randomize questions and options while maintaining correct answer tracking"""
-    if seed is not None:
-        random.seed(seed)
-    
-    randomized_questions = []
-    
-    for question in questions:
-        # Create a copy of the question
-        new_question = question.copy()
-        options = list(question['options'])
-        correct_index = int(question['correct_answer'])
-        correct_option = options[correct_index]
-        # Shuffle options and track new correct index
-        option_indices = list(range(len(options)))
-        random.shuffle(option_indices)
-        shuffled_options = [options[i] for i in option_indices]
-        new_correct_index = option_indices.index(correct_index)
-        new_question['options'] = shuffled_options
-        new_question['correct_answer'] = new_correct_index
-        randomized_questions.append(new_question)
-    
-    # Randomize question order if requested
-    if randomize_questions:
-        random.shuffle(randomized_questions)
-    
-    return randomized_questions
+def restart_exam(bank):
+    """Start the session's exam again on ``bank`` with a new seed
+
+    For exams whose bank version is no longer loaded: their answers belong
+    to other questions, so they are dropped.
+    """
+    question_list_key = session.get('question_list', 'list1')
+    if not is_question_list(bank, question_list_key):
+        question_list_key = 'list1'
+    exam_seed = random.randint(1, 1000000)
+    session['exam_seed'] = exam_seed
+    session['bank_version'] = bank.version
+    session['question_list'] = question_list_key
+    session['total_questions'] = len(get_questions_for_list(question_list_key, exam_seed, bank))
+    session['answer_vector'] = None
+    session['exam_submitted'] = False
+
+def exam_expired():
+    """Response for a request about an exam whose bank version is gone"""
+    return jsonify({'error': 'The question bank changed; restart the exam', 'restart': url_for('restart')}), 409
+
+def randomize_questions_and_options(questions, seed=None, randomize_questions=True, list_key=None):
+    """Randomize questions and options while maintaining correct answer tracking
+
+    Returns a lazy view over ``questions``. When ``list_key`` and ``seed`` are
+    given the shuffle plan is cached, so the same exam is only shuffled once.
+    """
+    if list_key is None or seed is None:
+        plan = build_shuffle_plan(questions, seed, randomize_questions)
+    else:
+        plan = PLAN_CACHE.get_or_build(
+            (list_key, seed, bool(randomize_questions)),
+            questions,
+            seed,
+            randomize_questions
+        )
+    return ShuffledQuestions(questions, plan)
+
+# Keeps the random120 selection independent of the exam's shuffle
+RANDOM120_SALT = 3
+
+def get_questions_for_list(question_list_key, seed, bank=None):
+    """Resolve the source questions for a list key (before shuffling)"""
+    bank = bank or load_questions()
+    if question_list_key == 'random120':
+        # The first 120 entries of a seeded permutation of the pool; the
+        # pool spans global IDs 0..n-1, so the entries are question IDs
+        pool = get_all_questions_for_random120(bank)
+        ids = Permutation(len(pool), derive_seed(seed, RANDOM120_SALT), length=120)
+        return BankView(bank.questions, ids)
+    if question_list_key == 'all_questions':
+        return get_all_questions(bank)
+    if question_list_key.startswith(TOPIC_PREFIX):
+        return BankView(bank.questions, topic_ids(bank, question_list_key[len(TOPIC_PREFIX):]))
+    if question_list_key.startswith(SET_PREFIX):
+        return BankView(bank.questions, decode_ids(question_list_key[len(SET_PREFIX):], len(bank.questions)))
+    return bank.view(question_list_key)
+
+# Practice exams picked from a client's mastery record are lists named
+# 'set:<encoded question IDs>', so they rebuild the same however the record
+# changes afterwards
+SET_PREFIX = 'set:'
+MASTERY_MODES = ('mistakes', 'unseen', 'review')
+MASTERY_EXAM_SIZE = int(os.environ.get('MASTERY_EXAM_SIZE', 50))
+
+# keys_version -> when this process last stored that bank's keys; they are
+# stored again daily so they never expire before the records using them
+MASTERY_KEYS_SAVED = {}
+
+def client_mastery(client_id, bank):
+    """Mastery record of ``client_id``, indexed by ``bank``'s question IDs"""
+    keys_version, bits = unpack_record(MASTERY_STORE.get(client_id))
+    if keys_version is None or keys_version == bank.keys_version:
+        # Records saved before they carried their bank were indexed like it
+        return Mastery(len(bank.questions), bits)
+    old_bank = next((b for b in BANKS.banks() if b.keys_version == keys_version), None)
+    if old_bank is not None:
+        old_keys = old_bank.question_keys
+    else:
+        stored = MASTERY_BANK_KEYS.get(keys_version.hex())
+        if stored is None:
+            # The bank it was indexed by is unknown: its bits cannot be placed
+            return Mastery(len(bank.questions))
+        old_keys = unpack_keys(stored)
+    return remap(bits, old_keys, bank.question_keys)
+
+def save_mastery(client_id, bank, mastery):
+    """Store a record indexed by ``bank``, and ``bank``'s keys for remapping it"""
+    if time.time() - MASTERY_KEYS_SAVED.get(bank.keys_version, 0) > 24 * 3600:
+        MASTERY_BANK_KEYS.put(bank.keys_version.hex(), pack_keys(bank.question_keys))
+        MASTERY_KEYS_SAVED[bank.keys_version] = time.time()
+    MASTERY_STORE.put(client_id, pack_record(mastery, bank.keys_version))
+
+def record_mastery(client_id, bank, questions, vector):
+    """Count one scored exam in its client's mastery record"""
+    if not client_id or not isinstance(client_id, str):
+        return
+    try:
+        mastery = client_mastery(client_id, bank)
+        qids = (questions.qid(pos) for pos in range(len(questions)))
+        record_answers(mastery, qids, vector, questions.answer_key(), UNANSWERED)
+        save_mastery(client_id, bank, mastery)
+    except Exception:
+        # Like item statistics, never worth failing a submission over
+        app.logger.exception('Recording mastery failed')
+
+def practice_list_key(bank, mode, client_id, seed, list_key=None, count=MASTERY_EXAM_SIZE):
+    """List key of a practice exam ``mode`` for ``client_id``, or None if it is empty"""
+    pool = bank.lists[list_key] if list_key else get_all_questions(bank).ids
+    ids = select(client_mastery(client_id, bank), pool, mode, count, seed)
+    return SET_PREFIX + encode_ids(ids) if ids else None
+
+@app.route('/mastery')
+def mastery():
+    """Counts of ?client_id='s seen, wrong and mastered questions"""
+    client_id = request.args.get('client_id')
+    if not client_id:
+        return jsonify({'error': 'client_id is required'}), 400
+    bank = load_questions()
+    record = client_mastery(client_id, bank)
+    return jsonify(dict(record.counts(), questions=len(bank.questions), modes=MASTERY_MODES))
+
+# Topic exams are lists named 'topic:<query>': the best matches of the query,
+# in bank order, looked up again from the search index whenever needed
+TOPIC_PREFIX = 'topic:'
+TOPIC_EXAM_MAX = int(os.environ.get('TOPIC_EXAM_MAX', 100))
+SEARCH_LIMIT_MAX = 50
+
+def topic_key(query):
+    """List key of a topic exam for ``query``"""
+    return TOPIC_PREFIX + ' '.join(fold(query).split())
+
+def topic_ids(bank, query):
+    """Question IDs of a topic exam, in bank order"""
+    return tuple(sorted(qid for qid, _ in bank.search_index.search(query, TOPIC_EXAM_MAX)))
+
+def is_question_list(bank, question_list_key):
+    """Whether ``question_list_key`` names a non-empty list of ``bank``"""
+    if question_list_key in ('random120', 'all_questions'):
+        return True
+    if isinstance(question_list_key, str) and question_list_key.startswith(TOPIC_PREFIX):
+        return bool(topic_ids(bank, question_list_key[len(TOPIC_PREFIX):]))
+    return question_list_key in bank
+
+@app.route('/search')
+def search():
+    """Questions matching ?q= (optionally in ?list=), best first, without answers"""
+    query = request.args.get('q', '')
+    list_key = request.args.get('list')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), SEARCH_LIMIT_MAX)
+    bank = load_questions()
+    if list_key and list_key not in bank:
+        return jsonify({'error': 'Unknown question list'}), 404
+    matches = bank.search_index.search(query, limit, bank.lists[list_key] if list_key else None)
+    results = []
+    for qid, relevance in matches:
+        question = bank.questions[qid]
+        results.append({'qid': qid, 'list': question.list_key, 'number': question.number,
+                        'text': question.text, 'score': round(relevance, 3)})
+    return jsonify({
+        'query': query,
+        'results': results,
+        'exam_url': url_for('start_exam', topic=query) if results else None
+    })
+
+def exam_questions(question_list_key, seed, randomize_questions=True, bank=None):
+    """Shuffled questions of an exam, from ``bank`` (the current one by default)"""
+    bank = bank or load_questions()
+    return randomize_questions_and_options(
+        get_questions_for_list(question_list_key, seed, bank),
+        seed,
+        randomize_questions,
+        list_key=(bank.version, question_list_key)
+    )
 
 @app.route('/')
 def index():
@@ -129,9 +502,10 @@ def index():
     
     # Store only essential data in session
     session['exam_started'] = True
-    session['answers'] = {}
+    session['answer_vector'] = None
     session['total_questions'] = len(questions)
     session['exam_seed'] = exam_seed
+    session['bank_version'] = questions.version
     session['randomize_questions'] = True  # Default to true
     
     return redirect(url_for('exam'))
@@ -145,19 +519,83 @@ def start_exam():
     
     # Load questions to ensure they're available
     questions = load_questions()
-    
+
     # Generate a random seed for consistent randomization
     exam_seed = random.randint(1, 1000000)
+
+    # ?topic= starts a practice exam of the questions matching a search,
+    # ?mode= one picked from the client's mastery record (optionally ?list=)
+    question_list_key = 'list1'
+    topic = request.args.get('topic')
+    mode = request.args.get('mode')
+    client_id = request.args.get('client_id') or session.get('client_id')
+    if topic:
+        question_list_key = topic_key(topic)
+        if not is_question_list(questions, question_list_key):
+            return jsonify({'error': 'No questions match this topic'}), 404
+    elif mode:
+        list_key = request.args.get('list')
+        if mode not in MASTERY_MODES or not client_id or (list_key and list_key not in questions.lists):
+            return jsonify({'error': 'Invalid practice mode'}), 400
+        question_list_key = practice_list_key(questions, mode, client_id, exam_seed, list_key)
+        if question_list_key is None:
+            return jsonify({'error': 'No questions for this mode yet'}), 404
     
     # Store only essential data in session
     session['exam_started'] = True
-    session['answers'] = {}
-    session['total_questions'] = len(questions)
+    session['answer_vector'] = None
+    session['total_questions'] = len(get_questions_for_list(question_list_key, exam_seed, questions))
     session['exam_seed'] = exam_seed
+    session['bank_version'] = questions.version
     session['randomize_questions'] = True  # Default to true
+    session['question_list'] = question_list_key
+    session['client_id'] = client_id
+    # A new exam, even after submitting the last one in this session
+    session['exam_submitted'] = False
     
     return redirect(url_for('exam'))
 
+# Streamed exam pages yield to other greenlets every this many questions and
+# are written in chunks of about this many characters
+STREAM_YIELD_EVERY = 25
+STREAM_CHUNK_SIZE = 16 * 1024
+
+@lru_cache(maxsize=4096)
+def question_json_parts(question):
+    """HTML-safe JSON for a bank question's number, text and each option"""
+    return (
+        htmlsafe_json_dumps(question.number),
+        htmlsafe_json_dumps(question.text),
+        tuple(htmlsafe_json_dumps(option) for option in question.options)
+    )
+
+def exam_question_fragments(questions):
+    """Comma-separated JSON fragments of an exam's questions, one at a time"""
+    for pos in range(len(questions)):
+        question, option_order = questions.source(pos)
+        number, text, options = question_json_parts(question)
+        yield Markup('%s{"number":%s,"text":%s,"options":[%s],"correct_answer":%d}' % (
+            ',' if pos else '',
+            number,
+            text,
+            ','.join(options[i] for i in option_order),
+            questions.correct_answer(pos)
+        ))
+        if pos % STREAM_YIELD_EVERY == STREAM_YIELD_EVERY - 1:
+            socketio.sleep(0)
+
+def buffered(chunks, size=STREAM_CHUNK_SIZE):
+    """Join small template chunks into writes of about ``size`` characters"""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
 @app.route('/exam')
 def exam():
     """Main exam page that loads all questions"""
@@ -170,35 +608,31 @@ def exam():
         all_questions = load_questions()
         exam_seed = random.randint(1, 1000000)
         session['exam_started'] = True
-        session['answers'] = {}
+        session['answer_vector'] = None
         session['total_questions'] = len(all_questions.get('list1', []))
         session['exam_seed'] = exam_seed
+        session['bank_version'] = all_questions.version
         session['randomize_questions'] = True  # Default to true
         session['question_list'] = 'list1'
 
-    all_questions = load_questions()
+    # The bank version the exam started on, so a reload cannot change it
+    bank = bank_for(session.get('bank_version'))
+    if bank is None:
+        # Too old to be served: start the same list again on the current bank
+        bank = load_questions()
+        restart_exam(bank)
+
     exam_seed = session.get('exam_seed')
     randomize_questions = session.get('randomize_questions', True)
     question_list_key = session.get('question_list', 'list1')
-    if question_list_key == 'random120':
-        questions = get_all_questions_for_random120()
-        random.seed(exam_seed)
-        questions = random.sample(questions, min(120, len(questions)))
-    elif question_list_key == 'all_questions':
-        questions = get_all_questions()
-    else:
-        questions = all_questions.get(question_list_key, [])
-
-    randomized_questions = randomize_questions_and_options(
-        questions,
-        exam_seed,
-        randomize_questions
-    )
+    randomized_questions = exam_questions(question_list_key, exam_seed, randomize_questions, bank)
 
-    return render_template('exam.html',
-                         questions=randomized_questions,
+    # Streamed so the first bytes go out before long lists are rendered
+    return Response(buffered(stream_template('exam.html',
+                         questions=exam_question_fragments(randomized_questions),
                          total_questions=len(randomized_questions),
-                         randomize_questions=randomize_questions)
+                         randomize_questions=randomize_questions,
+                         socketio_transports=SOCKETIO_TRANSPORTS)), mimetype='text/html')
 
 @app.route('/update_randomization', methods=['POST'])
 def update_randomization():
@@ -211,10 +645,35 @@ def update_randomization():
 
     data = request.json
     room_code = request.args.get('room_code')
-    if room_code and room_code in GAMES:
-        GAMES[room_code]['randomize_questions'] = data.get('randomize_questions', True)
-    else:
-        session['randomize_questions'] = data.get('randomize_questions', True)
+    game = None
+    reordered = {}
+    if room_code:
+        with GAMES.update(room_code) as game:
+            if game is not None:
+                randomize = bool(data.get('randomize_questions', True))
+                changed = game['started'] and randomize != game.get('randomize_questions', True)
+                before = game_questions(game) if changed else None
+                if changed and before is None:
+                    return jsonify({'error': 'The room\'s question bank is no longer loaded'}), 409
+                game['randomize_questions'] = randomize
+                if changed:
+                    # Synced answers are stored by position; move them with
+                    # their questions and tell every player to fetch the new order
+                    reorder_answers(game, before, game_questions(game))
+                    for client_id, player in game['players'].items():
+                        if player.get('sid'):
+                            reordered[player['sid']] = {
+                                'randomize_questions': randomize,
+                                'answers': answered(player_answers(game, client_id))
+                            }
+    for sid, payload in reordered.items():
+        socketio.emit('questions_reordered', payload, to=sid)
+    if game is None:
+        randomize = data.get('randomize_questions', True)
+        if randomize != session.get('randomize_questions', True):
+            # Synced answers are stored by position, which the order changes
+            session['answer_vector'] = None
+        session['randomize_questions'] = randomize
 
     return jsonify({'success': True})
 
@@ -231,59 +690,64 @@ def submit_exam():
     if session.get('exam_submitted'):
         return jsonify({'error': 'Exam already submitted'}), 400
 
-    # Get answers from request
-    answers = request.json.get('answers', {})
+    # Either the whole answers dict, or just the checksum of the answers
+    # already synced through /sync_answer
+    data = request.json or {}
+    answers = data.get('answers')
 
     # Validate answers format
-    if not isinstance(answers, dict):
+    if answers is not None and not isinstance(answers, dict):
         return jsonify({'error': 'Invalid answers format'}), 400
 
     # Regenerate questions using the same seed and settings for consistent scoring
-    all_questions = load_questions()
     exam_seed = session.get('exam_seed')
     randomize_questions = session.get('randomize_questions', True)
     question_list_key = session.get('question_list', 'list1')
-    questions = all_questions.get(question_list_key, [])
 
     if not exam_seed:
         return jsonify({'error': 'Invalid exam session'}), 400
 
-    randomized_questions = randomize_questions_and_options(
-        questions,
-        exam_seed,
-        randomize_questions
-    )
+    # The bank version the exam started on, so a reload cannot change it
+    bank = bank_for(session.get('bank_version'))
+    if bank is None:
+        return exam_expired()
+    randomized_questions = exam_questions(question_list_key, exam_seed, randomize_questions, bank)
 
-    correct_answers = 0
     total_questions = len(randomized_questions)
 
-    # Score the exam (robust to key and type issues)
-    for idx, question in enumerate(randomized_questions):
-        user_answer = answers.get(str(idx))
-        if user_answer is None:
-            user_answer = answers.get(idx)
-        if user_answer is not None:
-            try:
-                if int(user_answer) == int(question['correct_answer']):
-                    correct_answers += 1
-            except Exception:
-                pass
+    # Score the packed answers against the exam's answer key
+    vector = session_answers(total_questions)
+    if answers is not None:
+        merge_answers(vector, answer_vector(answers, total_questions))
+    elif data.get('checksum') != checksum(vector):
+        return jsonify({'error': 'Answers out of sync', 'answers': answered(vector)}), 409
+    vector = bytes(vector)
+    correct_answers = score(vector, randomized_questions.answer_key())
+    record_item_stats(bank, randomized_questions, [vector])
+    record_mastery(session.get('client_id') or data.get('client_id'), bank, randomized_questions, vector)
 
     score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
 
     # Mark exam as submitted to prevent duplicate submissions
     session['exam_submitted'] = True
 
-    # Store results in session for potential review
-    session['exam_results'] = {
+    # Store results server-side for potential review; the questions can be
+    # rebuilt from the list key, seed and randomization flag
+    result_id = uuid.uuid4().hex
+    RESULT_STORE.put(result_id, json.dumps({
         'session_id': session.get('session_id'),
         'correct_answers': correct_answers,
         'total_questions': total_questions,
         'score_percentage': score_percentage,
-        'answers': answers,
-        'questions': randomized_questions,
+        'answer_vector': vector.hex(),
+        'question_list': question_list_key,
+        'exam_seed': exam_seed,
+        'randomize_questions': randomize_questions,
+        'bank_version': bank.version,
+        'bank_layout': bank.layout,
         'submitted_at': datetime.now().isoformat()
-    }
+    }))
+    session['result_id'] = result_id
 
     return jsonify({
         'correct_answers': correct_answers,
@@ -291,17 +755,189 @@ def submit_exam():
         'score_percentage': score_percentage
     })
 
+def session_answers(total_questions):
+    """The solo exam's synced answers as a bytearray of ``total_questions``"""
+    vector = bytearray(session.get('answer_vector') or b'')
+    if len(vector) != total_questions:
+        vector = bytearray(answer_vector({}, total_questions))
+    return vector
+
+@app.route('/sync_answer', methods=['POST'])
+def sync_answer():
+    """Record one solo answer as it is given; the first answer is final"""
+    if not validate_session():
+        return jsonify({'error': 'Invalid session'}), 400
+
+    if not session.get('exam_started') or session.get('exam_submitted') or not session.get('exam_seed'):
+        return jsonify({'error': 'No exam started'}), 400
+
+    data = request.json or {}
+    try:
+        index = int(data.get('index'))
+        option = int(data.get('option'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid answer'}), 400
+
+    bank = bank_for(session.get('bank_version'))
+    if bank is None:
+        return exam_expired()
+    questions = exam_questions(session.get('question_list', 'list1'), session['exam_seed'],
+                               session.get('randomize_questions', True), bank)
+    vector = session_answers(len(questions))
+    answer = record_answer(vector, index, option)
+    if answer is None:
+        return jsonify({'error': 'Invalid answer'}), 400
+    session['answer_vector'] = bytes(vector)
+    return jsonify({'index': index, 'answer': answer})
+
+def item_stats_flusher():
+    """Background task: write pending item statistics every flush interval"""
+    while True:
+        socketio.sleep(ITEM_STATS.flush_interval)
+        try:
+            ITEM_STATS.flush()
+        except Exception:
+            app.logger.exception('Flushing item statistics failed')
+
+def start_item_stats_flusher():
+    """Start this process's item statistics flusher once"""
+    global ITEM_STATS_FLUSHER_PID
+    if ITEM_STATS.flush_interval > 0 and ITEM_STATS_FLUSHER_PID != os.getpid():
+        ITEM_STATS_FLUSHER_PID = os.getpid()
+        socketio.start_background_task(item_stats_flusher)
+
+def record_item_stats(bank, questions, vectors):
+    """Count scored answer vectors of one exam in the item statistics"""
+    if not vectors:
+        return
+    start_item_stats_flusher()
+    try:
+        ITEM_STATS.record(bank, questions, vectors)
+    except Exception:
+        # Statistics must never cost a player their submission
+        app.logger.exception('Recording item statistics failed')
+
+def item_stats_report(bank, list_key=None, flagged=False, min_answers=None):
+    """Statistics of every question of ``bank`` (or one list), from the counters"""
+    stats = ITEM_STATS.totals(bank)
+    ids = bank.view(list_key).ids if list_key else range(len(bank.questions))
+    options = {} if min_answers is None else {'min_answers': min_answers}
+    questions = []
+    for qid in ids:
+        report = question_report(bank.questions[qid], stats.question(qid), **options)
+        if report['flags'] or not flagged:
+            questions.append(report)
+    return {'bank_version': bank.version, 'submissions': stats.submissions, 'questions': questions}
+
+@app.route('/item_stats')
+def item_stats():
+    """Per-question statistics: ?version=, ?list=, ?flagged=1, ?min_answers="""
+    expected = f'Bearer {ITEM_STATS_TOKEN}'
+    if not ITEM_STATS_TOKEN or not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+        return jsonify({'error': 'Not found'}), 404
+    version = request.args.get('version')
+    bank = BANKS.get(version) if version else load_questions()
+    if bank is None:
+        return jsonify({'error': 'Unknown bank version'}), 404
+    list_key = request.args.get('list')
+    if list_key and list_key not in bank:
+        return jsonify({'error': 'Unknown question list'}), 404
+    min_answers = request.args.get('min_answers', type=int)
+    return jsonify(item_stats_report(bank, list_key, request.args.get('flagged') == '1', min_answers))
+
+@app.cli.command('item-stats')
+@click.option('--list', 'list_key', help='Only questions of this list.')
+@click.option('--all', 'show_all', is_flag=True, help='Every question, not just flagged ones.')
+def item_stats_command(list_key, show_all):
+    """Print per-question statistics of the current bank."""
+    report = item_stats_report(load_questions(), list_key, flagged=not show_all)
+    click.echo(f"Bank {report['bank_version']}: {report['submissions']} submissions")
+    for question in report['questions']:
+        rate = '-' if question['correct_rate'] is None else f"{question['correct_rate']:.0%}"
+        click.echo(f"{question['list']} #{question['number']}: {question['answered']} answers, {rate} correct, "
+                   f"picks {question['picks']} {' '.join(question['flags'])}")
+
+def result_layout(record):
+    """Layout of the bank a stored result was taken on, or None if unknown"""
+    if record.get('bank_layout'):
+        return record['bank_layout']
+    bank = BANKS.get(record.get('bank_version'))
+    return bank.layout if bank is not None else None
+
+def regrade_results(dry_run=False):
+    """Rescore stored results against the current answer keys
+
+    Only results taken on a bank with the current layout (the same
+    questions in the same places, whatever their answers) are rescored;
+    any other result would be scored against different questions, so it
+    is skipped and listed instead. Results are grouped by exam (list, seed
+    and randomization), so each answer key is built once and its
+    submissions are scored in one batch.
+    """
+    bank = load_questions()
+    exams = {}
+    skipped = []
+    for result_id, stored in RESULT_STORE.items():
+        record = json.loads(stored)
+        if result_layout(record) != bank.layout:
+            skipped.append(result_id)
+            continue
+        exam_key = (record.get('question_list', 'list1'), record.get('exam_seed'), record.get('randomize_questions', True))
+        exams.setdefault(exam_key, []).append((result_id, record))
+
+    total = changed = 0
+    for (question_list_key, exam_seed, randomize_questions), records in exams.items():
+        key = exam_questions(question_list_key, exam_seed, randomize_questions, bank).answer_key()
+        scorable, vectors = [], []
+        for result_id, record in records:
+            if record['total_questions'] != len(key):
+                skipped.append(result_id)
+                continue
+            scorable.append((result_id, record))
+            if 'answer_vector' in record:
+                vectors.append(bytes.fromhex(record['answer_vector']))
+            else:
+                # Results stored before answers were packed
+                vectors.append(answer_vector(record.get('answers', {}), len(key)))
+        for (result_id, record), correct in zip(scorable, score_many(vectors, key)):
+            total += 1
+            if correct == record['correct_answers']:
+                continue
+            changed += 1
+            record['correct_answers'] = correct
+            record['score_percentage'] = (correct / len(key)) * 100 if key else 0
+            record['bank_version'] = bank.version
+            record['bank_layout'] = bank.layout
+            record['regraded_at'] = datetime.now().isoformat()
+            if not dry_run:
+                RESULT_STORE.put(result_id, json.dumps(record))
+    return {'results': total, 'exams': len(exams), 'changed': changed, 'skipped': skipped}
+
+@app.cli.command('regrade')
+@click.option('--dry-run', is_flag=True, help='Report changed scores without saving them.')
+def regrade_command(dry_run):
+    """Rescore stored exam results after an answer key fix."""
+    stats = regrade_results(dry_run)
+    click.echo(f"Regraded {stats['results']} results from {stats['exams']} exams; "
+               f"{stats['changed']} scores {'would change' if dry_run else 'changed'}")
+    if stats['skipped']:
+        click.echo(f"Skipped {len(stats['skipped'])} results taken on other questions:")
+        for result_id in stats['skipped']:
+            click.echo(f'  {result_id}')
+
 @app.route('/results')
 def results():
     """Show exam results page"""
     if not validate_session():
         return redirect(url_for('index'))
     
-    if not session.get('exam_submitted') or not session.get('exam_results'):
+    result_id = session.get('result_id')
+    stored = RESULT_STORE.get(result_id) if result_id else None
+    if not session.get('exam_submitted') or stored is None:
         return redirect(url_for('index'))
     
     # Validate that results belong to current session
-    results = session.get('exam_results')
+    results = json.loads(stored)
     if results.get('session_id') != session.get('session_id'):
         return redirect(url_for('index'))
     
@@ -327,45 +963,32 @@ def get_questions_data():
         return jsonify({'error': 'No exam started'}), 400
 
     room_code = request.args.get('room_code')
-    if room_code and room_code in GAMES:
-        game = GAMES[room_code]
-        if game['question_list'] == 'random120':
-            questions = get_all_questions_for_random120()
-            exam_seed = game['seed']
-            random.seed(exam_seed)
-            questions = random.sample(questions, min(120, len(questions)))
-        else:
-            questions = load_questions().get(game['question_list'], [])
-            exam_seed = game['seed']
-        randomize_questions = game.get('randomize_questions', True)
+    game = GAMES.get(room_code) if room_code else None
+    if game is not None:
+        # Room members get the room's plan without correct answers
+        questions = game_questions(game)
+        if questions is None:
+            return jsonify({'error': 'The room\'s question bank is no longer loaded'}), 409
+        plan = exam_plan(questions, room_bank(game))
+        plan['randomize_questions'] = game.get('randomize_questions', True)
+        return jsonify(plan)
     else:
-        all_questions = load_questions()
         exam_seed = session.get('exam_seed')
         randomize_questions = session.get('randomize_questions', True)
         question_list_key = session.get('question_list', 'list1')
-        if question_list_key == 'random120':
-            questions = get_all_questions_for_random120()
-            random.seed(exam_seed)
-            questions = random.sample(questions, min(120, len(questions)))
-        elif question_list_key == 'all_questions':
-            questions = get_all_questions()
-        else:
-            questions = all_questions.get(question_list_key, [])
 
     if not exam_seed:
         return jsonify({'error': 'Invalid exam session'}), 400
 
-    randomized_questions = randomize_questions_and_options(
-        questions,
-        exam_seed,
-        randomize_questions
-    )
+    # The bank version the exam started on, so a reload cannot change it
+    bank = bank_for(session.get('bank_version'))
+    if bank is None:
+        return exam_expired()
+    randomized_questions = exam_questions(question_list_key, exam_seed, randomize_questions, bank)
 
-    return jsonify({
-        'questions': randomized_questions,
-        'total_questions': len(randomized_questions),
-        'randomize_questions': randomize_questions
-    })
+    plan = exam_plan(randomized_questions, bank, include_answers=True)
+    plan['randomize_questions'] = randomize_questions
+    return jsonify(plan)
 
 def generate_room_code(length=6):
     chars = string.ascii_uppercase + string.digits
@@ -374,58 +997,165 @@ def generate_room_code(length=6):
         if code not in GAMES:
             return code
 
-def get_all_questions_for_random120():
-    questions = load_questions()
-    all_questions = []
-    for k in ['list1', 'list2', 'list3', 'list4', 'list5', 'list6']:
-        all_questions.extend(questions.get(k, []))
-    return all_questions
+def get_all_questions_for_random120(bank=None):
+    """Pool that random120 samples from (a view, not a copy)"""
+    return (bank or load_questions()).view('random120')
 
-def get_all_questions():
-    """Get all questions from all lists combined"""
-    questions = load_questions()
-    all_questions = []
-    for k in ['list1', 'list2', 'list3', 'list4', 'list5', 'list6']:
-        all_questions.extend(questions.get(k, []))
-    return all_questions
+def get_all_questions(bank=None):
+    """Get all questions from all lists combined (a view, not a copy)"""
+    return (bank or load_questions()).view('all_questions')
+
+def room_bank(game):
+    """Question bank version a room was created with, or None if it is gone"""
+    return bank_for(game.get('bank_version'))
+
+def game_questions(game):
+    """Shuffled questions of a room, rebuilt from its bank, list key and seed
+
+    None if the room's bank version is not loaded in this process.
+    """
+    bank = room_bank(game)
+    if bank is None:
+        return None
+    return exam_questions(game['question_list'], game['seed'], game.get('randomize_questions', True), bank)
+
+def reorder_answers(game, before, after):
+    """Move every player's synced answers from their positions in ``before`` to ``after``"""
+    order = after.plan.order
+    position = {order[pos]: pos for pos in range(len(order))}
+    for client_id in game['players']:
+        vector = player_answers(game, client_id)
+        moved = bytearray([UNANSWERED]) * len(vector)
+        for pos, option in enumerate(vector):
+            if option != UNANSWERED:
+                moved[position[before.plan.order[pos]]] = option
+        vector[:] = moved
+
+def seat_player(game, room_code, client_id, name, session_id):
+    """Give a new player the next seat (pid) in a game, or reuse their seat"""
+    player = game['players'].get(client_id)
+    if player is None:
+        pid = len(game['seats'])
+        game['seats'].append(client_id)
+        player = {'pid': pid, 'name': name, 'score': 0, 'time': 0, 'finished': False}
+        game['players'][client_id] = player
+        game['leaderboard'].add(pid)
+    bind_sid(room_code, client_id, player, session_id)
+    return player
+
+def remove_player(game, client_id):
+    """Free a player's seat and record the rank change for the next broadcast"""
+    player = game['players'].pop(client_id)
+    game.get('answers', {}).pop(client_id, None)
+    pid = player['pid']
+    game['seats'][pid] = None
+    game['changed'].discard(pid)
+    old_rank = game['leaderboard'].remove(pid)
+    game['moves'].append([pid, old_rank + 1, None])
+
+def bind_sid(room_code, client_id, player, session_id):
+    """Point a seat at a socket and keep SID_INDEX in step"""
+    old_sid = player.get('sid')
+    if old_sid and old_sid != session_id:
+        SID_INDEX.pop(old_sid, None)
+    player['sid'] = session_id
+    player['connected'] = True
+    SID_INDEX[session_id] = (room_code, client_id)
+
+def leave_previous_room(session_id, room_code):
+    """Release this socket's seat in another room before it takes a new one"""
+    previous = SID_INDEX.get(session_id)
+    if previous is not None and previous[0] != room_code:
+        release_sid(session_id)
+
+def release_sid(session_id):
+    """Detach a socket from its seat in O(1) using SID_INDEX
+
+    Lobby seats are freed (reassigning the host or deleting an empty room).
+    Seats in a started game are kept so the player can reconnect with the
+    same client_id.
+    """
+    entry = SID_INDEX.pop(session_id, None)
+    if entry is None:
+        return
+    room_code, client_id = entry
+    player_left = None
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None or player.get('sid') != session_id:
+            return
+        if game['started']:
+            player['sid'] = None
+            player['connected'] = False
+        else:
+            remove_player(game, client_id)
+            if not game['players']:
+                GAMES.delete(room_code)
+            else:
+                if game['host'] == client_id:
+                    game['host'] = next(iter(game['players']))
+                player_left = {
+                    'players': room_players(game),
+                    'question_list': game['question_list'],
+                    'total_questions': game['total_questions'],
+                    'host_pid': game['players'][game['host']]['pid']
+                }
+    leave_room(room_code, sid=session_id)
+    if player_left is not None:
+        emit('player_left', player_left, room=room_code)
+
+def join_error(game, question_list_key):
+    """Reason a player may not join ``game``, or None"""
+    if game is None:
+        return 'رمز الغرفة غير صحيح.'
+    if game['started']:
+        return 'الامتحان قد بدأ بالفعل، لا يمكن الانضمام الآن.'
+    # random120, all_questions and topic rooms only accept players who picked the same list
+    special = question_list_key in ('random120', 'all_questions') or str(question_list_key).startswith(TOPIC_PREFIX)
+    if special and game['question_list'] != question_list_key:
+        return 'قائمة الأسئلة لا تطابق الغرفة.'
+    return None
 
 @socketio.on('create_room')
 def handle_create_room(data):
     name = data.get('name', 'مجهول')
     client_id = data.get('client_id')
     session_id = request.sid
-    room_code = generate_room_code()
     question_list_key = data.get('question_list', 'list1')
-    all_questions = load_questions()
-    if question_list_key == 'random120':
-        questions = get_all_questions_for_random120()
-        seed = random.randint(1, 1000000)
-        random.seed(seed)
-        questions = random.sample(questions, min(120, len(questions)))
-    elif question_list_key == 'all_questions':
-        questions = get_all_questions()
-        seed = random.randint(1, 1000000)
-    else:
-        if question_list_key not in all_questions:
-            question_list_key = 'list1'
-        questions = all_questions[question_list_key]
-        seed = random.randint(1, 1000000)
-    randomized_questions = randomize_questions_and_options(questions, seed, True)
-    GAMES[room_code] = {
+    bank = load_questions()
+    start_room_sweeper()
+    if isinstance(question_list_key, str) and question_list_key.startswith(TOPIC_PREFIX):
+        question_list_key = topic_key(question_list_key[len(TOPIC_PREFIX):])
+    if not is_question_list(bank, question_list_key):
+        question_list_key = 'list1'
+    seed = random.randint(1, 1000000)
+    BANKS.pin(bank.version)
+    total_questions = len(get_questions_for_list(question_list_key, seed, bank))
+    game = {
         'host': client_id,
-        'players': {
-            client_id: {'name': name, 'score': 0, 'time': 0, 'finished': False, 'sid': session_id}
-        },
-        'questions': randomized_questions,
+        'players': {},
+        'seats': [],
+        'answers': {},
+        'leaderboard': Leaderboard(total_questions),
+        'changed': set(),
+        'moves': [],
         'started': False,
         'start_time': None,
         'end_time': None,
         'seed': seed,
+        'bank_version': bank.version,
         'question_list': question_list_key,
-        'total_questions': len(randomized_questions)
+        'total_questions': total_questions
     }
+    leave_previous_room(session_id, None)
+    # Another worker may take the same code between generating and adding it
+    while True:
+        room_code = generate_room_code()
+        player = seat_player(game, room_code, client_id, name, session_id)
+        if GAMES.add(room_code, game):
+            break
     join_room(room_code)
-    emit('room_created', {'room_code': room_code, 'players': GAMES[room_code]['players'], 'question_list': question_list_key, 'total_questions': len(randomized_questions)}, room=session_id)
+    emit('room_created', {'room_code': room_code, 'players': room_players(game), 'question_list': question_list_key, 'total_questions': total_questions, 'pid': player['pid'], 'rank': game['leaderboard'].rank(player['pid']) + 1}, room=session_id)
 
 @socketio.on('join_room')
 def handle_join_room(data):
@@ -434,66 +1164,343 @@ def handle_join_room(data):
     client_id = data.get('client_id')
     session_id = request.sid
     question_list_key = data.get('question_list', None)
-    if room_code not in GAMES:
-        emit('error', {'message': 'رمز الغرفة غير صحيح.'}, room=session_id)
-        return
-    if GAMES[room_code]['started']:
-        emit('error', {'message': 'الامتحان قد بدأ بالفعل، لا يمكن الانضمام الآن.'}, room=session_id)
+    error = join_error(GAMES.get(room_code), question_list_key)
+    if error is None:
+        leave_previous_room(session_id, room_code)
+        with GAMES.update(room_code) as game:
+            error = join_error(game, question_list_key)
+            if error is None:
+                player = seat_player(game, room_code, client_id, name, session_id)
+                joined = {'room_code': room_code, 'pid': player['pid'], 'rank': game['leaderboard'].rank(player['pid']) + 1}
+                player_joined = {'players': room_players(game), 'question_list': game['question_list'], 'total_questions': game['total_questions']}
+    if error is not None:
+        emit('error', {'message': error}, room=session_id)
         return
-    if question_list_key and question_list_key == 'random120':
-        # Only allow if the room was created with random120
-        if GAMES[room_code]['question_list'] != 'random120':
-            emit('error', {'message': 'قائمة الأسئلة لا تطابق الغرفة.'}, room=session_id)
-            return
-    elif question_list_key and question_list_key == 'all_questions':
-        # Only allow if the room was created with all_questions
-        if GAMES[room_code]['question_list'] != 'all_questions':
-            emit('error', {'message': 'قائمة الأسئلة لا تطابق الغرفة.'}, room=session_id)
-            return
-    GAMES[room_code]['players'][client_id] = GAMES[room_code]['players'].get(client_id, {'name': name, 'score': 0, 'time': 0, 'finished': False})
-    GAMES[room_code]['players'][client_id]['sid'] = session_id
     join_room(room_code)
-    emit('player_joined', {'players': GAMES[room_code]['players'], 'question_list': GAMES[room_code]['question_list'], 'total_questions': GAMES[room_code]['total_questions']}, room=room_code)
+    emit('room_joined', joined, room=session_id)
+    emit('player_joined', player_joined, room=room_code)
 
 @socketio.on('start_game')
 def handle_start_game(data):
     room_code = data.get('room_code')
     client_id = data.get('client_id')
     session_id = request.sid
-    if room_code not in GAMES or GAMES[room_code]['host'] != client_id:
+    with GAMES.update(room_code) as game:
+        allowed = game is not None and game['host'] == client_id
+        if allowed:
+            game['started'] = True
+            game['start_time'] = datetime.now().isoformat()
+    if not allowed:
         emit('error', {'message': 'غير مصرح لك ببدء الامتحان.'}, room=session_id)
         return
-    GAMES[room_code]['started'] = True
-    GAMES[room_code]['start_time'] = datetime.now().isoformat()
+    # Only metadata goes out here; players fetch questions in pages from
+    # /room_questions and the correct answers stay on the server
     emit('game_started', {
-        'questions': GAMES[room_code]['questions'],
-        'start_time': GAMES[room_code]['start_time'],
-        'question_list': GAMES[room_code]['question_list'],
-        'total_questions': GAMES[room_code]['total_questions']
+        'room_code': room_code,
+        'start_time': game['start_time'],
+        'question_list': game['question_list'],
+        'total_questions': game['total_questions'],
+        'page_size': ROOM_PAGE_SIZE,
+        'randomize_questions': game.get('randomize_questions', True)
     }, room=room_code)
 
+@app.route('/room_questions/<room_code>')
+def room_questions(room_code):
+    """A page of a started room's plan, without answers"""
+    game = GAMES.get(room_code.upper())
+    if game is None or not game['started']:
+        return jsonify({'error': 'Room not found or not started'}), 404
+    questions = game_questions(game)
+    if questions is None:
+        return jsonify({'error': 'The room\'s question bank is no longer loaded'}), 409
+    randomize = game.get('randomize_questions', True)
+    if request.args.get('randomize', int(randomize), type=int) != int(randomize):
+        return jsonify({'error': 'The room\'s question order has changed', 'randomize_questions': randomize}), 409
+    start = max(request.args.get('start', 0, type=int), 0)
+    count = min(max(request.args.get('count', ROOM_PAGE_SIZE, type=int), 1), ROOM_MAX_PAGE_SIZE)
+    response = jsonify(exam_plan(questions, room_bank(game), start, start + count))
+    # A started room's order only changes with its randomize flag, which
+    # clients put in the URL, so a page never goes stale in the cache
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@socketio.on('check_answer')
+def handle_check_answer(data):
+    """Record a player's first answer to a question and reveal the correct option"""
+    room_code = data.get('room_code')
+    client_id = data.get('client_id')
+    try:
+        index = int(data.get('index'))
+        option = int(data.get('option'))
+    except (TypeError, ValueError):
+        return {'error': 'invalid answer'}
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None or not game['started'] or not 0 <= index < game['total_questions']:
+            return {'error': 'invalid answer'}
+        vector = player_answers(game, client_id)
+        if player.get('submitted'):
+            # Finalized answers can still be looked up, but not added to
+            answer = vector[index] if vector[index] != UNANSWERED else None
+        else:
+            # The first answer is final, so checking cannot be used to probe
+            answer = record_answer(vector, index, option)
+    questions = game_questions(game) if answer is not None else None
+    if questions is None:
+        return {'error': 'invalid answer'}
+    return {'index': index, 'answer': answer, 'correct_answer': questions.correct_answer(index)}
+
+def player_answers(game, client_id):
+    """A player's synced answers: a bytearray with one byte per question"""
+    vectors = game.setdefault('answers', {})
+    vector = vectors.get(client_id)
+    if vector is None:
+        # Rooms created before answers were packed kept a dict on the player
+        legacy = game['players'][client_id].pop('answers', {})
+        vector = vectors[client_id] = bytearray(answer_vector(legacy, game['total_questions']))
+    return vector
+
+def close_answers(game, player):
+    """Stop accepting a player's answers; returns their finish time in seconds"""
+    player['submitted'] = True
+    return (datetime.now() - datetime.fromisoformat(game['start_time'])).total_seconds()
+
+def record_score(game, player, correct, finish_time):
+    """Store a scored submission and re-rank the player"""
+    player['score'] = correct
+    player['time'] = finish_time
+    player['finished'] = True
+    player['progress'] = game['total_questions']
+    old_rank, new_rank = game['leaderboard'].update(player['pid'], correct, finish_time)
+    game['moves'].append([player['pid'], old_rank + 1, new_rank + 1])
+    game['changed'].add(player['pid'])
+    if game['end_time'] is None and all(p['finished'] for p in game['players'].values()):
+        # Starts the room's finished TTL
+        game['end_time'] = datetime.now().isoformat()
+
+# Room events may send players and leaderboard rows as positional arrays
+# (ROOM_WIRE_FORMAT=compact): [pid, rank, score, time, finished, progress]
+# rows without names, which travel only with the player list
+# ([pid, name, score, time, finished, progress]) and are looked up by pid
+COMPACT_ROOM_EVENTS = os.environ.get('ROOM_WIRE_FORMAT', 'json') == 'compact'
+
+def room_players(game):
+    """Players of a room as sent in room events"""
+    if not COMPACT_ROOM_EVENTS:
+        return game['players']
+    return [
+        [p['pid'], p['name'], p['score'], round(p['time'], 1), int(p['finished']), p.get('progress', 0)]
+        for p in sorted(game['players'].values(), key=lambda p: p['pid'])
+    ]
+
+def leaderboard_row(game, pid, rank):
+    p = game['players'][game['seats'][pid]]
+    if COMPACT_ROOM_EVENTS:
+        return [pid, rank + 1, p['score'], round(p['time'], 1), int(p['finished']), p.get('progress', 0)]
+    return {
+        'pid': pid,
+        'rank': rank + 1,
+        'name': p['name'],
+        'score': p['score'],
+        'time': p['time'],
+        'finished': p['finished'],
+        'progress': p.get('progress', 0)
+    }
+
+def build_leaderboard_update(game):
+    """Top K rows plus the rows that changed since the last broadcast
+
+    ``moves`` lists [pid, old_rank, new_rank] for every rank change so each
+    client can keep its own rank current without receiving every row.
+    """
+    board = game['leaderboard']
+    top = board.top(LEADERBOARD_TOP_K)
+    shown = set(top)
+    payload = {
+        'top': [leaderboard_row(game, pid, rank) for rank, pid in enumerate(top)],
+        'changed': [
+            leaderboard_row(game, pid, board.rank(pid))
+            for pid in game['changed'] if pid not in shown and pid in board
+        ],
+        'moves': game['moves'],
+        'size': len(board),
+        'total_questions': game['total_questions']
+    }
+    game['changed'] = set()
+    game['moves'] = []
+    return payload
+
+def send_leaderboard(room_code):
+    """Broadcast the current leaderboard to a room (used by the scheduler)"""
+    with GAMES.update(room_code) as game:
+        if game is None:
+            return
+        payload = build_leaderboard_update(game)
+    socketio.emit('leaderboard_update', payload, to=room_code)
+
+# Questions are served to room members in pages of this size
+ROOM_PAGE_SIZE = int(os.environ.get('ROOM_PAGE_SIZE', 20))
+ROOM_MAX_PAGE_SIZE = 100
+
+# Number of leading rows included in every leaderboard_update
+LEADERBOARD_TOP_K = int(os.environ.get('LEADERBOARD_TOP_K', 10))
+
+# Progress updates only mark the room dirty; the scheduler sends at most one
+# leaderboard_update per room per LEADERBOARD_INTERVAL seconds
+LEADERBOARD_BROADCASTS = BroadcastScheduler(
+    socketio,
+    send_leaderboard,
+    interval=float(os.environ.get('LEADERBOARD_INTERVAL', 1.0))
+)
+
+@app.route('/broadcast_stats')
+def broadcast_stats():
+    return jsonify(LEADERBOARD_BROADCASTS.stats())
+
+# Rooms are deleted ROOM_IDLE_TTL seconds after their last update or
+# ROOM_FINISHED_TTL seconds after every player finished; above ROOM_MAX rooms
+# the least recently updated go first. Each process that hosts rooms sweeps
+# every ROOM_SWEEP_INTERVAL seconds (0 disables).
+ROOM_IDLE_TTL = float(os.environ.get('ROOM_IDLE_TTL', 2 * 3600))
+ROOM_FINISHED_TTL = float(os.environ.get('ROOM_FINISHED_TTL', 15 * 60))
+ROOM_MAX = int(os.environ.get('ROOM_MAX', 10000))
+ROOM_SWEEP_INTERVAL = float(os.environ.get('ROOM_SWEEP_INTERVAL', 30))
+ROOM_SWEEPER_PID = None
+ROOMS_SWEPT = METRICS.counter('rooms_swept_total', 'Idle, finished or excess rooms deleted by the sweeper')
+
+def sweep_rooms():
+    """Delete expired rooms and tell their players; returns the room codes"""
+    codes = GAMES.sweep(ROOM_IDLE_TTL, ROOM_FINISHED_TTL, ROOM_MAX)
+    for room_code in codes:
+        LEADERBOARD_BROADCASTS.discard(room_code)
+        socketio.emit('room_closed', {'room_code': room_code}, to=room_code)
+        socketio.close_room(room_code)
+    if codes:
+        ROOMS_SWEPT.inc(amount=len(codes))
+        app.logger.info('Swept %d rooms', len(codes))
+    return codes
+
+def room_sweeper():
+    """Background task: sweep rooms every ROOM_SWEEP_INTERVAL seconds"""
+    while True:
+        socketio.sleep(ROOM_SWEEP_INTERVAL)
+        try:
+            sweep_rooms()
+        except Exception:
+            app.logger.exception('Sweeping rooms failed')
+
+def start_room_sweeper():
+    """Start this process's sweeper once"""
+    global ROOM_SWEEPER_PID
+    if ROOM_SWEEP_INTERVAL > 0 and ROOM_SWEEPER_PID != os.getpid():
+        ROOM_SWEEPER_PID = os.getpid()
+        socketio.start_background_task(room_sweeper)
+
+def score_submissions(items):
+    """Score a batch of queued submissions: one update and broadcast per room"""
+    rooms = {}
+    for room_code, client_id, finish_time in items:
+        rooms.setdefault(room_code, []).append((client_id, finish_time))
+    SCORING_BATCH_SIZES.observe(len(items))
+    for room_code, submissions in rooms.items():
+        with GAMES.update(room_code) as game:
+            if game is None:
+                continue
+            # A retried batch may hold players scored before it failed
+            submissions = [(c, t) for c, t in submissions
+                           if c in game['players'] and not game['players'][c]['finished']]
+            if not submissions:
+                continue
+            # Every player of a room shares one answer key
+            questions = game_questions(game)
+            if questions is None:
+                raise LookupError(f"Bank version {game.get('bank_version')} of room {room_code} is not loaded")
+            vectors = [bytes(player_answers(game, c)) for c, _ in submissions]
+            scores = score_many(vectors, questions.answer_key())
+            for (client_id, finish_time), correct in zip(submissions, scores):
+                record_score(game, game['players'][client_id], correct, finish_time)
+            payload = build_leaderboard_update(game)
+        bank = room_bank(game)
+        record_item_stats(bank, questions, vectors)
+        for (client_id, _), vector in zip(submissions, vectors):
+            record_mastery(client_id, bank, questions, vector)
+        # Supersedes any pending progress broadcast for this room
+        LEADERBOARD_BROADCASTS.discard(room_code)
+        socketio.emit('leaderboard_update', payload, to=room_code)
+
+def fail_submissions(items, final=False):
+    """Tell players the scoring queue gave up on their submissions
+
+    After transient errors the submission is reopened and the player asked
+    to send it again.  After a final one, such as the room's bank version
+    being gone, resending cannot help: it stays closed and the player is
+    told it could not be scored.
+    """
+    rooms = {}
+    for room_code, client_id, _ in items:
+        rooms.setdefault(room_code, []).append(client_id)
+    for room_code, client_ids in rooms.items():
+        pids = []
+        with GAMES.update(room_code) as game:
+            if game is None:
+                continue
+            for client_id in client_ids:
+                player = game['players'].get(client_id)
+                if player is not None and not player['finished']:
+                    player['submitted'] = final
+                    pids.append(player['pid'])
+        if pids:
+            failure = {'room_code': room_code, 'pids': pids, 'retry_after': None if final else SCORING_RETRY_AFTER}
+            if final:
+                failure['message'] = 'تعذر تصحيح إجاباتك في هذه الغرفة.'
+            socketio.emit('scoring_failed', failure, to=room_code)
+
+# Submissions are acknowledged at once and scored in batches by background
+# tasks; a full queue asks clients to retry after SCORING_RETRY_AFTER seconds.
+# Failed batches are retried item by item; database and network errors up
+# to SCORING_MAX_RETRIES times, then the submission is reopened and its
+# player told to send it again.  Other errors (a room whose bank version is
+# gone) are final and the player is told the submission failed
+SCORING_BATCH_SIZES = METRICS.histogram('scoring_batch_size', 'Submissions scored per batch', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+SCORING_QUEUE = ScoringQueue(
+    socketio,
+    score_submissions,
+    maxsize=int(os.environ.get('SCORING_QUEUE_SIZE', 1000)),
+    batch_size=int(os.environ.get('SCORING_BATCH_SIZE', 100)),
+    workers=int(os.environ.get('SCORING_WORKERS', 1)),
+    delay=float(os.environ.get('SCORING_BATCH_DELAY', 0.05)),
+    observe_wait=METRICS.histogram('scoring_queue_wait_seconds', 'Time submissions wait to be scored').observe,
+    on_failure=fail_submissions,
+    max_retries=int(os.environ.get('SCORING_MAX_RETRIES', 3)),
+    retry_on=(sqlite3.OperationalError, OSError)
+)
+SCORING_RETRY_AFTER = 1.0
+
+def scoring_busy():
+    return {'error': 'busy', 'retry_after': SCORING_RETRY_AFTER}
+
+def queue_submission(room_code, client_id, finish_time):
+    """Queue a closed submission for scoring, reopening it if the queue is full"""
+    if SCORING_QUEUE.put((room_code, client_id, finish_time)):
+        return {'queued': True}
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is not None:
+            player['submitted'] = False
+    return scoring_busy()
+
 @socketio.on('progress_update')
 def handle_progress_update(data):
     room_code = data.get('room_code')
     current_index = data.get('current_index', 0)
     client_id = data.get('client_id')
-    session_id = request.sid
-    if room_code not in GAMES or client_id not in GAMES[room_code]['players']:
-        return
-    GAMES[room_code]['players'][client_id]['progress'] = current_index
-    # Broadcast updated leaderboard
-    leaderboard = [
-        {
-            'name': p['name'],
-            'score': p['score'],
-            'time': p['time'],
-            'finished': p['finished'],
-            'progress': p.get('progress', 0)
-        }
-        for p in GAMES[room_code]['players'].values()
-    ]
-    leaderboard.sort(key=lambda x: (-x['score'], x['time']))
-    emit('leaderboard_update', {'leaderboard': leaderboard}, room=room_code)
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None:
+            return
+        player['progress'] = current_index
+        game['changed'].add(player['pid'])
+    LEADERBOARD_BROADCASTS.mark_dirty(room_code)
 
 @socketio.on('submit_answers')
 def handle_submit_answers(data):
@@ -502,55 +1509,126 @@ def handle_submit_answers(data):
     client_id = data.get('client_id')
     session_id = request.sid
 
-    if room_code not in GAMES or client_id not in GAMES[room_code]['players']:
-        emit('error', {'message': 'حدث خطأ في إرسال الإجابات.'}, room=session_id)
-        return
-    player = GAMES[room_code]['players'][client_id]
-    if player.get('submitted'):
-        emit('error', {'message': 'لقد أرسلت إجاباتك بالفعل.'}, room=session_id)
+    if not SCORING_QUEUE.admit():
+        return scoring_busy()
+    error = None
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None:
+            error = 'حدث خطأ في إرسال الإجابات.'
+        elif player.get('submitted'):
+            error = 'لقد أرسلت إجاباتك بالفعل.'
+        else:
+            # Answers already checked during the exam are final
+            vector = player_answers(game, client_id)
+            merge_answers(vector, answer_vector(answers, len(vector)))
+            finish_time = close_answers(game, player)
+    if error is not None:
+        emit('error', {'message': error}, room=session_id)
+        return {'error': error}
+    return queue_submission(room_code, client_id, finish_time)
+
+@socketio.on('finalize_answers')
+def handle_finalize_answers(data):
+    """Finish a player's exam with the answers already synced by check_answer
+
+    The client sends the checksum of its own answer vector instead of the
+    answers. On a mismatch nothing is scored and the server's answers are
+    returned, so the client can fall back to submit_answers.
+    """
+    room_code = data.get('room_code')
+    client_id = data.get('client_id')
+    session_id = request.sid
+
+    if not SCORING_QUEUE.admit():
+        return scoring_busy()
+    error = mismatch = None
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None or not game['started']:
+            error = 'حدث خطأ في إرسال الإجابات.'
+        elif player.get('submitted'):
+            error = 'لقد أرسلت إجاباتك بالفعل.'
+        else:
+            vector = player_answers(game, client_id)
+            if data.get('checksum') != checksum(vector):
+                mismatch = answered(vector)
+            else:
+                finish_time = close_answers(game, player)
+    if error is not None:
+        emit('error', {'message': error}, room=session_id)
+        return {'error': error}
+    if mismatch is not None:
+        return {'error': 'out of sync', 'answers': mismatch}
+    return queue_submission(room_code, client_id, finish_time)
+
+@socketio.on('rejoin_room')
+def handle_rejoin_room(data):
+    """Restore a player's seat after a reconnect, looked up by client_id"""
+    room_code = (data.get('room_code') or '').upper().strip()
+    client_id = data.get('client_id')
+    name = data.get('name')
+    session_id = request.sid
+    leave_previous_room(session_id, room_code)
+    player_joined = None
+    with GAMES.update(room_code) as game:
+        player = game['players'].get(client_id) if game else None
+        if player is None and game is not None and not game['started'] and name:
+            # A lobby seat is freed on disconnect; give it back to a player
+            # who was in the room on this page, but never seat anyone mid-exam
+            player = seat_player(game, room_code, client_id, name, session_id)
+            player_joined = {'players': room_players(game), 'question_list': game['question_list'], 'total_questions': game['total_questions']}
+        elif player is not None:
+            bind_sid(room_code, client_id, player, session_id)
+        if player is not None:
+            rejoined = {
+                'room_code': room_code,
+                'pid': player['pid'],
+                'rank': game['leaderboard'].rank(player['pid']) + 1,
+                'name': player['name'],
+                'is_host': game['host'] == client_id,
+                'started': game['started'],
+                'players': room_players(game),
+                'question_list': game['question_list'],
+                'total_questions': game['total_questions'],
+                'page_size': ROOM_PAGE_SIZE,
+                'randomize_questions': game.get('randomize_questions', True),
+                'answers': answered(player_answers(game, client_id))
+            }
+    if player is None:
+        emit('rejoin_failed', {'room_code': room_code}, room=session_id)
         return
-    questions = GAMES[room_code]['questions']
-    correct = 0
-    for idx, q in enumerate(questions):
-        user_answer = answers.get(str(idx))
-        if user_answer is not None and int(user_answer) == int(q['correct_answer']):
-            correct += 1
-    finish_time = (datetime.now() - datetime.fromisoformat(GAMES[room_code]['start_time'])).total_seconds()
-    player['score'] = correct
-    player['time'] = finish_time
-    player['finished'] = True
-    player['progress'] = len(questions)
-    player['submitted'] = True
-    # Broadcast leaderboard update
-    leaderboard = [
-        {
-            'name': p['name'],
-            'score': p['score'],
-            'time': p['time'],
-            'finished': p['finished'],
-            'progress': p.get('progress', 0)
-        }
-        for p in GAMES[room_code]['players'].values()
-    ]
-    leaderboard.sort(key=lambda x: (-x['score'], x['time']))
-    emit('leaderboard_update', {'leaderboard': leaderboard, 'total_questions': GAMES[room_code]['total_questions']}, room=room_code)
+    join_room(room_code)
+    if player_joined is not None:
+        emit('player_joined', player_joined, room=room_code)
+    emit('rejoined', rejoined, room=session_id)
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    session_id = request.sid
-    # Remove player from all rooms
-    for room_code, game in list(GAMES.items()):
-        if session_id in game['players']:
-            leave_room(room_code)
-            del game['players'][session_id]
-            # If host left, assign new host or delete game if empty
-            if game['host'] == session_id:
-                if game['players']:
-                    game['host'] = next(iter(game['players']))
-                else:
-                    del GAMES[room_code]
-                    continue
-            emit('player_left', {'players': game['players']}, room=room_code)
+    release_sid(request.sid)
+
+@app.template_global()
+def asset_url(filename):
+    """Versioned URL of a file under static/; cached by browsers forever"""
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        return url_for('static', filename=filename)
+    return url_for('static_asset', version=asset.version, filename=filename)
+
+@app.route('/assets/<version>/<path:filename>')
+def static_asset(version, filename):
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        return jsonify({'error': 'Unknown asset'}), 404
+    if version != asset.version:
+        # A page from before a deploy; send it to the current content
+        return redirect(asset_url(filename))
+    return send_asset(asset, request)
+
+# Example short sound bytes (replace with your own or use real MP3 bytes)
+CORRECT_SOUND = b"\x49\x44\x33..."  # TODO: Replace with real MP3 bytes
+WRONG_SOUND = b"\x49\x44\x33..."    # TODO: Replace with real MP3 bytes
+TOGGLE_SOUND = b"\x49\x44\x33..."   # TODO: Replace with real MP3 bytes
 
 @app.route('/sound/correct')
 def sound_correct():
@@ -564,6 +1642,130 @@ def sound_wrong():
 def sound_toggle():
     return send_file(BytesIO(TOGGLE_SOUND), mimetype='audio/mpeg', as_attachment=False, download_name='toggle.mp3')
 
+def room_player_counts():
+    counts = []
+    for room_code in GAMES.room_codes():
+        game = GAMES.get(room_code)
+        if game is not None:
+            counts.append(len(game['players']))
+    return counts
+
+def current_bank_bytes():
+    bank = BANKS.current
+    asset = getattr(bank, 'asset', None)
+    return asset.nbytes() if asset is not None else 0
+
+METRICS.gauge('games', 'Rooms in the game store', lambda: len(GAMES))
+METRICS.gauge('players', 'Players seated in all rooms', lambda: sum(room_player_counts()))
+METRICS.gauge('room_players_max', 'Players in the largest room', lambda: max(room_player_counts(), default=0))
+METRICS.gauge('bound_sockets', 'Player sockets bound to a room in this process', lambda: len(SID_INDEX))
+METRICS.gauge('bank_questions', 'Questions in the current bank', lambda: len(BANKS.current) if BANKS.current else 0)
+METRICS.gauge('bank_asset_bytes', 'Public bank JSON and its compressed variants', current_bank_bytes)
+METRICS.gauge('bank_versions', 'Question bank versions still loaded', lambda: len(BANKS))
+METRICS.gauge('plan_cache_bytes', 'Approximate memory held by cached shuffle plans', lambda: PLAN_CACHE.nbytes)
+METRICS.gauge('plan_cache_entries', 'Cached shuffle plans', lambda: len(PLAN_CACHE))
+METRICS.gauge('plan_cache_hits_total', 'Shuffle plan cache hits', lambda: PLAN_CACHE.hits, kind='counter')
+METRICS.gauge('plan_cache_misses_total', 'Shuffle plan cache misses', lambda: PLAN_CACHE.misses, kind='counter')
+METRICS.gauge('plan_cache_evictions_total', 'Shuffle plans evicted', lambda: PLAN_CACHE.evictions, kind='counter')
+METRICS.gauge('search_index_bytes', 'Postings of the current bank\'s search index',
+              lambda: BANKS.current.search_index.nbytes() if BANKS.current else 0)
+METRICS.gauge('static_asset_bytes', 'Static assets and their compressed variants', STATIC_ASSETS.nbytes)
+METRICS.gauge('question_json_cache_entries', 'Question JSON fragments cached for /exam',
+              lambda: question_json_parts.cache_info().currsize)
+METRICS.gauge('scoring_queue_depth', 'Submissions waiting to be scored', lambda: len(SCORING_QUEUE))
+METRICS.gauge('scoring_queue_max_depth', 'Deepest the scoring queue has been', lambda: SCORING_QUEUE.max_depth)
+METRICS.gauge('scoring_enqueued_total', 'Submissions queued for scoring', lambda: SCORING_QUEUE.enqueued, kind='counter')
+METRICS.gauge('scoring_rejected_total', 'Submissions turned away by a full queue',
+              lambda: SCORING_QUEUE.rejected, kind='counter')
+METRICS.gauge('scoring_retried_total', 'Submissions queued again after a failed attempt',
+              lambda: SCORING_QUEUE.retried, kind='counter')
+METRICS.gauge('scoring_failed_total', 'Submissions given up on and sent back to their players',
+              lambda: SCORING_QUEUE.failed, kind='counter')
+METRICS.gauge('item_stats_bytes', 'Item statistics counters held in this process', ITEM_STATS.nbytes)
+METRICS.gauge('leaderboard_broadcasts_total', 'Coalesced leaderboard broadcasts sent',
+              lambda: LEADERBOARD_BROADCASTS.broadcasts, kind='counter')
+
+@app.route('/metrics')
+def metrics():
+    text = SHARED_METRICS.render() if SHARED_METRICS is not None else METRICS.render()
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+def metrics_writer():
+    """Background task: save this worker's counters every METRICS_SAVE_INTERVAL seconds"""
+    while True:
+        socketio.sleep(METRICS_SAVE_INTERVAL)
+        try:
+            SHARED_METRICS.save()
+        except Exception:
+            app.logger.exception('Saving metrics failed')
+
+@app.before_request
+def start_metrics_writer():
+    """Start this process's metrics writer once"""
+    global METRICS_WRITER_PID
+    if SHARED_METRICS is not None and METRICS_WRITER_PID != os.getpid():
+        METRICS_WRITER_PID = os.getpid()
+        socketio.start_background_task(metrics_writer)
+
+def shutdown():
+    """Save what this process would otherwise lose on exit (gunicorn's
+    worker_exit, or atexit when run directly)"""
+    try:
+        ITEM_STATS.flush()
+    except Exception:
+        app.logger.exception('Flushing item statistics failed')
+    if SHARED_METRICS is not None and METRICS_WRITER_PID == os.getpid():
+        try:
+            SHARED_METRICS.save()
+        except Exception:
+            app.logger.exception('Saving metrics failed')
+
+atexit.register(shutdown)
+
+# Set by warm_up(); workers forked afterwards inherit it
+WARM_UP = {'ready': False, 'seconds': None, 'frozen_objects': 0}
+
+def warm_up(freeze=True):
+    """Do the first request's work up front, ideally once in the gunicorn
+    master before it forks (see gunicorn.conf.py)
+
+    Loads and indexes the bank and its compressed JSON, renders every
+    question's JSON fragments, compiles the templates and runs one exam of
+    each list through shuffling and scoring.  With ``freeze`` the objects
+    made so far are moved out of the garbage collector's reach, so the
+    collector in forked workers never writes to the pages they share.
+    Does not start the bank watcher; each process starts its own.
+    """
+    if WARM_UP['ready']:
+        return WARM_UP
+    start = time.perf_counter()
+    bank = read_initial_bank()
+    for question in bank.questions:
+        question_json_parts(question)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    for list_key in bank.views:
+        # Throwaway seed and no cache entry: this only exercises the code paths
+        questions = randomize_questions_and_options(get_questions_for_list(list_key, 0, bank), 0)
+        score(bytes(len(questions)), questions.answer_key())
+    if freeze:
+        gc.freeze()
+    WARM_UP.update(ready=True, seconds=round(time.perf_counter() - start, 3),
+                   frozen_objects=gc.get_freeze_count())
+    app.logger.info('Warmed up in %.3fs (bank %s)', WARM_UP['seconds'], bank.version)
+    return WARM_UP
+
+@app.route('/readyz')
+def readyz():
+    """200 once the bank is loaded and warm, 503 until then"""
+    if not WARM_UP['ready'] or BANKS.current is None:
+        return jsonify({'ready': False}), 503
+    return jsonify({'ready': True, 'bank_version': BANKS.current.version, 'warm_up_seconds': WARM_UP['seconds'],
+                    'frozen_objects': WARM_UP['frozen_objects']})
+
+METRICS.gauge('ready', 'Whether warm-up has finished in this process', lambda: int(WARM_UP['ready']))
+METRICS.gauge('warm_up_seconds', 'Time warm-up took', lambda: WARM_UP['seconds'] or 0)
+
 # Ensure static files are served (Flask does this by default from /static)
 # If you want to customize, uncomment below:
 # from flask import send_from_directory
@@ -574,6 +1776,8 @@ def sound_toggle():
 if __name__ == '__main__':
     # Get port from environment variable or use default
     port = int(os.environ.get('PORT', 5000))
-    
+
+    warm_up()
+
     # Run the app
     socketio.run(app, host='0.0.0.0', port=port, debug=False)
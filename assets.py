@@ -0,0 +1,100 @@
+"""
+Immutable, content-hashed response bodies.
+
+An asset is built once from its bytes: the version is a hash of the
+content, so its URL changes whenever the content does and browsers may
+cache it forever.  Compressed variants are prepared up front (gzip, and
+brotli when the ``brotli`` package is installed) so serving an asset never
+compresses on the request path.  :class:`StaticAssets` does the same for
+the files under ``static/`` (stylesheets and scripts).
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+# Responses for versioned URLs never change
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+# Media types worth compressing; audio and images already are
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class Asset:
+    """A response body with its content hash and precompressed variants"""
+
+    __slots__ = ('body', 'mimetype', 'version', 'encodings')
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        # encoding -> compressed body, best first
+        self.encodings = {}
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=11)
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+
+    def etag(self, encoding=None):
+        """Entity tag of the variant sent with ``encoding`` (None = identity)"""
+        return f'{self.version}-{encoding}' if encoding else self.version
+
+    def nbytes(self):
+        return len(self.body) + sum(len(data) for data in self.encodings.values())
+
+
+class StaticAssets:
+    """Every file under ``directory`` as an asset, built once at startup.
+
+    Files are addressed by their path relative to the directory (e.g.
+    ``css/base.css``) and served from URLs carrying their version.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.assets = {}
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, directory).replace(os.sep, '/')
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                with open(path, 'rb') as file:
+                    self.assets[filename] = Asset(file.read(), mimetype)
+
+    def get(self, filename):
+        return self.assets.get(filename)
+
+    def nbytes(self):
+        return sum(asset.nbytes() for asset in self.assets.values())
+
+
+def send_asset(asset, request):
+    """Response for ``asset`` honouring Accept-Encoding, If-None-Match and Range"""
+    encoding = None
+    for name in asset.encodings:
+        if name in request.accept_encodings:
+            encoding = name
+            break
+    body = asset.encodings[encoding] if encoding else asset.body
+
+    response = Response(body, mimetype=asset.mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(asset.etag(encoding))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # 304 for a matching If-None-Match; 206 for a Range of the identity body
+    # (resumed or seeking downloads)
+    return response.make_conditional(request, accept_ranges=encoding is None, complete_length=len(body))
@@ -0,0 +1,83 @@
+"""
+Versions of the question bank.
+
+The bank can be reloaded while the app runs.  Every loaded bank is
+registered under its content version; exams and rooms remember the
+version they started with and keep being served and scored from it.  A
+version stays loaded while it is current, for ``ttl`` seconds after it
+stops being current (every session on it started before then, so none
+outlives that), and while a live room is pinned to it.  At most
+``max_superseded`` versions are kept for sessions, the most recently
+replaced ones, so a run of quick edits does not pile up copies; exams on
+an older one start again on the current bank.  A version no longer kept
+is freed once nothing else references it.
+"""
+
+import threading
+import time
+import weakref
+
+
+class BankRegistry:
+    """The current question bank plus older versions still in use"""
+
+    def __init__(self, ttl=24 * 3600, max_superseded=3):
+        self.current = None
+        self.ttl = ttl
+        self.max_superseded = max_superseded
+        self._banks = weakref.WeakValueDictionary()
+        # Strong references keeping versions alive: superseded versions
+        # with the time they may go, and the versions of live rooms
+        self._superseded = {}
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._banks)
+
+    def install(self, bank):
+        """Make ``bank`` current; returns False if that version already is"""
+        with self._lock:
+            if self.current is not None and self.current.version == bank.version:
+                return False
+            if self.current is not None:
+                self._superseded[self.current.version] = (self.current, time.time() + self.ttl)
+            # A version installed again is current, not superseded
+            self._superseded.pop(bank.version, None)
+            # Oldest first; rooms keep theirs through their pins
+            while len(self._superseded) > self.max_superseded:
+                del self._superseded[next(iter(self._superseded))]
+            self._banks[bank.version] = bank
+            self.current = bank
+        return True
+
+    def get(self, version):
+        """Bank ``version`` if it is still loaded, else None"""
+        return self._banks.get(version) if version else None
+
+    def pin(self, version):
+        """Keep ``version`` loaded until the next :meth:`retain_only`"""
+        bank = self.get(version)
+        if bank is not None:
+            with self._lock:
+                self._pinned[version] = bank
+
+    def retain_only(self, versions):
+        """Pin exactly ``versions`` (those of live rooms), releasing others,
+        and release superseded versions whose ``ttl`` has run out"""
+        pinned = {}
+        for version in versions:
+            bank = self.get(version)
+            if bank is not None:
+                pinned[version] = bank
+        now = time.time()
+        with self._lock:
+            self._pinned = pinned
+            self._superseded = {version: entry for version, entry in self._superseded.items() if entry[1] >= now}
+
+    def banks(self):
+        """Every bank still loaded"""
+        return list(self._banks.values())
+
+    def versions(self):
+        return list(self._banks.keys())
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Local load test for the exam app.
+
+Drives the app in-process (Flask and Socket.IO test clients, no network):
+
+* HTTP: many sessions each run ``/`` -> ``/exam`` -> ``/get_questions_data``
+  -> ``/sync_answer`` per answer -> ``/submit_exam``
+* Socket.IO: N rooms x M players each run ``create_room`` / ``join_room`` ->
+  ``start_game`` -> ``progress_update`` -> ``check_answer`` per answer ->
+  ``finalize_answers``
+
+and reports p50/p95/p99 latency per route and event, messages fanned out
+and bytes per event, and memory growth (tracemalloc).  Results are saved as
+JSON; pass ``--compare`` an earlier file to print the differences.
+
+In-process runs go one request at a time and score and broadcast by hand,
+so they measure handler cost, not the server.  ``--concurrent`` starts the
+real server (gunicorn with ``gunicorn.conf.py``, so eventlet and the
+background scoring and broadcast tasks) on localhost, or uses ``--url``,
+and runs the same flows with ``--clients`` simultaneous clients over real
+sockets: HTTP keep-alive connections and Socket.IO over websockets.  Room
+events are then timed until their reply arrives, and ``scored`` is the
+time from a player's finalize to the leaderboard update that shows it
+finished.
+
+Usage:
+    python benchmark.py --sessions 200 --rooms 20 --players 10
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --concurrent --clients 100 --workers 1
+
+Rooms and sessions stay in memory for the whole run, so run it with the
+default ``memory://`` stores and no SOCKETIO_MESSAGE_QUEUE (or, with
+``--workers`` above 1, with the shared stores of the README).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latency samples, fan-out and bytes per route or event name"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.messages = defaultdict(int)
+        self.bytes_in = defaultdict(int)
+        self.bytes_out = defaultdict(int)
+        self.errors = defaultdict(int)
+        # Concurrent runs record from many threads
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0, messages=0):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.bytes_in[name] += bytes_in
+            self.bytes_out[name] += bytes_out
+            self.messages[name] += messages
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+    def summary(self):
+        result = {}
+        for name, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            count = len(samples)
+            result[name] = {
+                'count': count,
+                'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+                'bytes_in_per_event': round(self.bytes_in[name] / count, 1),
+                'bytes_out_per_event': round(self.bytes_out[name] / count, 1),
+                'messages_per_event': round(self.messages[name] / count, 2),
+                'errors': self.errors.get(name, 0)
+            }
+        return result
+
+
+def json_size(value):
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def memory_snapshot():
+    current, peak = tracemalloc.get_traced_memory()
+    return {'current_kb': round(current / 1024, 1), 'peak_kb': round(peak / 1024, 1)}
+
+
+def run_http(app, recorder, sessions, question_list):
+    """Each session takes one solo exam, syncing every correct answer"""
+    for _ in range(sessions):
+        client = app.test_client()
+
+        start = time.perf_counter()
+        client.get('/')
+        recorder.add('GET /', time.perf_counter() - start)
+        with client.session_transaction() as session:
+            session['question_list'] = question_list
+
+        start = time.perf_counter()
+        response = client.get('/exam')
+        size = len(response.get_data())
+        recorder.add('GET /exam', time.perf_counter() - start, bytes_out=size)
+
+        start = time.perf_counter()
+        response = client.get('/get_questions_data')
+        plan = response.get_json()
+        recorder.add('GET /get_questions_data', time.perf_counter() - start, bytes_out=len(response.get_data()))
+
+        answers = plan.get('answers', [])
+        for index, option in enumerate(answers):
+            payload = {'index': index, 'option': option}
+            start = time.perf_counter()
+            response = client.post('/sync_answer', json=payload)
+            recorder.add('POST /sync_answer', time.perf_counter() - start,
+                         bytes_in=json_size(payload), bytes_out=len(response.get_data()))
+
+        payload = {'checksum': zlib.crc32(bytes(answers))}
+        start = time.perf_counter()
+        response = client.post('/submit_exam', json=payload)
+        recorder.add('POST /submit_exam', time.perf_counter() - start,
+                     bytes_in=json_size(payload), bytes_out=len(response.get_data()))
+
+
+def drain(clients):
+    """Messages received by ``clients`` since the last drain: (count, bytes)"""
+    count = size = 0
+    for client in clients:
+        for message in client.get_received():
+            count += 1
+            size += json_size(message.get('args'))
+    return count, size
+
+
+def emit(recorder, name, client, clients, payload, callback=False):
+    """Emit one event and record its latency, payload and fan-out"""
+    start = time.perf_counter()
+    result = client.emit(name, payload, callback=callback)
+    elapsed = time.perf_counter() - start
+    messages, size = drain(clients)
+    recorder.add(name, elapsed, bytes_in=json_size(payload), bytes_out=size, messages=messages)
+    return result
+
+
+def run_rooms(app_module, recorder, rooms, players, progress_steps, question_list):
+    """N rooms of M players play one game each"""
+    socketio, flask_app = app_module.socketio, app_module.app
+    for room_index in range(rooms):
+        clients = [socketio.test_client(flask_app) for _ in range(players)]
+        client_ids = [f'bench-{room_index}-{i}' for i in range(players)]
+        host = clients[0]
+
+        payload = {'name': 'host', 'client_id': client_ids[0], 'question_list': question_list}
+        start = time.perf_counter()
+        host.emit('create_room', payload)
+        elapsed = time.perf_counter() - start
+        received = host.get_received()
+        recorder.add('create_room', elapsed, bytes_in=json_size(payload),
+                     bytes_out=sum(json_size(m.get('args')) for m in received), messages=len(received))
+        room_code = next(m['args'][0]['room_code'] for m in received if m['name'] == 'room_created')
+        for client, client_id in zip(clients[1:], client_ids[1:]):
+            emit(recorder, 'join_room', client, clients,
+                 {'name': client_id, 'room_code': room_code, 'client_id': client_id, 'question_list': question_list})
+        emit(recorder, 'start_game', host, clients, {'room_code': room_code, 'client_id': client_ids[0]})
+
+        questions = app_module.game_questions(app_module.GAMES.get(room_code))
+        for step in range(progress_steps):
+            for client, client_id in zip(clients, client_ids):
+                emit(recorder, 'progress_update', client, clients,
+                     {'room_code': room_code, 'current_index': step, 'client_id': client_id})
+            # Coalesced broadcasts normally go out from a background task
+            start = time.perf_counter()
+            app_module.LEADERBOARD_BROADCASTS.flush()
+            messages, size = drain(clients)
+            recorder.add('leaderboard_flush', time.perf_counter() - start, bytes_out=size, messages=messages)
+
+        for i, (client, client_id) in enumerate(zip(clients, client_ids)):
+            # Player i gets the first (i mod total) questions right
+            correct = i % (len(questions) + 1)
+            vector = bytearray([255]) * len(questions)
+            for pos in range(correct):
+                vector[pos] = questions.correct_answer(pos)
+                emit(recorder, 'check_answer', client, clients,
+                     {'room_code': room_code, 'client_id': client_id, 'index': pos, 'option': vector[pos]},
+                     callback=True)
+            emit(recorder, 'finalize_answers', client, clients,
+                 {'room_code': room_code, 'client_id': client_id, 'checksum': zlib.crc32(bytes(vector))},
+                 callback=True)
+
+        # Queued submissions are normally scored by a background task
+        start = time.perf_counter()
+        app_module.SCORING_QUEUE.drain()
+        messages, size = drain(clients)
+        recorder.add('scoring_batch', time.perf_counter() - start, bytes_out=size, messages=messages)
+
+        for i, client in enumerate(clients):
+            start = time.perf_counter()
+            client.disconnect()
+            elapsed = time.perf_counter() - start
+            messages, size = drain(clients[i + 1:])
+            recorder.add('disconnect', elapsed, bytes_out=size, messages=messages)
+
+
+class HTTPSession:
+    """One browser: a keep-alive connection and its cookies"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = {}
+
+    def request(self, method, path, payload=None):
+        """``(status, body)`` of one request; redirects are not followed"""
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, data
+
+    def close(self):
+        self.conn.close()
+
+
+class SocketClient:
+    """Just enough of a Socket.IO client: the default namespace over one
+    websocket (Engine.IO 4), events, acks and pings"""
+
+    def __init__(self, host, port):
+        import simple_websocket
+        self.ws = simple_websocket.Client.connect(f'ws://{host}:{port}/socket.io/?EIO=4&transport=websocket')
+        self.events = queue.Queue()
+        self.acks = {}
+        self.next_ack = 0
+        self.received = 0
+        self.received_bytes = 0
+        self._lock = threading.Lock()
+        opening = self.ws.receive(timeout=30)
+        if not opening or opening[0] != '0':
+            raise ConnectionError(f'Unexpected Engine.IO handshake: {opening!r}')
+        self.ws.send('40')
+        self.connected = threading.Event()
+        threading.Thread(target=self._read, daemon=True).start()
+        if not self.connected.wait(30):
+            raise ConnectionError('Socket.IO connect timed out')
+
+    def _read(self):
+        while True:
+            try:
+                message = self.ws.receive()
+            except Exception:
+                message = None
+            if message is None:
+                self.events.put((None, None))
+                return
+            if isinstance(message, bytes):
+                # Binary attachments of a placeholder packet already counted
+                continue
+            if message == '2':
+                self.ws.send('3')
+            elif message.startswith('40'):
+                self.connected.set()
+            elif message.startswith('42') or message.startswith('45'):
+                with self._lock:
+                    self.received += 1
+                    self.received_bytes += len(message.encode('utf-8'))
+                name, *args = json.loads(message[message.index('['):])
+                self.events.put((name, args[0] if args else None))
+            elif message.startswith('43'):
+                ack_id = int(message[2:message.index('[')])
+                slot = self.acks.pop(ack_id, None)
+                if slot is not None:
+                    slot.put(json.loads(message[message.index('['):]))
+
+    def emit(self, name, data):
+        self.ws.send('42' + json.dumps([name, data]))
+
+    def call(self, name, data, timeout=30):
+        """Emit with an ack and return the handler's reply"""
+        slot = queue.Queue(maxsize=1)
+        with self._lock:
+            ack_id = self.next_ack
+            self.next_ack += 1
+        self.acks[ack_id] = slot
+        self.ws.send(f'42{ack_id}' + json.dumps([name, data]))
+        reply = slot.get(timeout=timeout)
+        return reply[0] if reply else None
+
+    def wait_for(self, name, timeout=30):
+        """Data of the next ``name`` event; earlier events are dropped"""
+        deadline = time.monotonic() + timeout
+        while True:
+            event, data = self.events.get(timeout=max(0.0, deadline - time.monotonic()))
+            if event == name:
+                return data
+            if event is None:
+                raise ConnectionError('Socket closed')
+            if event == 'error':
+                raise RuntimeError(data)
+
+    def traffic(self):
+        """Events received and their bytes since the last call"""
+        with self._lock:
+            counts = self.received, self.received_bytes
+            self.received = self.received_bytes = 0
+        return counts
+
+    def close(self):
+        self.ws.close()
+
+
+def timed(recorder, name, call, bytes_in=0):
+    """Run ``call()`` and record its latency, or an error under ``name``"""
+    start = time.perf_counter()
+    try:
+        result = call()
+    except Exception:
+        recorder.error(name)
+        raise
+    recorder.add(name, time.perf_counter() - start, bytes_in=bytes_in)
+    return result
+
+
+def http_exam(host, port, recorder):
+    """One solo exam over a real connection, syncing an answer per question"""
+    client = HTTPSession(host, port)
+
+    def request(method, path, payload=None):
+        name = f'{method} {path}'
+        start = time.perf_counter()
+        try:
+            status, body = client.request(method, path, payload)
+        except Exception:
+            recorder.error(name)
+            raise
+        recorder.add(name, time.perf_counter() - start,
+                     bytes_in=json_size(payload) if payload is not None else 0, bytes_out=len(body))
+        if status >= 400:
+            recorder.error(name)
+        return body
+
+    try:
+        request('GET', '/start_exam')
+        request('GET', '/exam')
+        answers = json.loads(request('GET', '/get_questions_data')).get('answers', [])
+        for index, option in enumerate(answers):
+            request('POST', '/sync_answer', {'index': index, 'option': option})
+        request('POST', '/submit_exam', {'checksum': zlib.crc32(bytes(answers))})
+    finally:
+        client.close()
+
+
+def room_player(host, port, recorder, room, index, progress_steps, question_list):
+    """One player of a concurrent room; player 0 hosts it"""
+    client_id = f"bench-{room['index']}-{index}"
+    client = SocketClient(host, port)
+    try:
+        if index == 0:
+            payload = {'name': 'host', 'client_id': client_id, 'question_list': question_list}
+            created = timed(recorder, 'create_room',
+                            lambda: (client.emit('create_room', payload), client.wait_for('room_created'))[1])
+            room['code'], pid = created['room_code'], created['pid']
+            room['created'].set()
+        elif not room['created'].wait(60):
+            raise TimeoutError('Room was not created')
+        room_code = room['code']
+        if index > 0:
+            payload = {'name': client_id, 'room_code': room_code, 'client_id': client_id,
+                       'question_list': question_list}
+            joined = timed(recorder, 'join_room',
+                           lambda: (client.emit('join_room', payload), client.wait_for('room_joined'))[1])
+            pid = joined['pid']
+        # Every player is seated before the host starts the game
+        room['joined'].wait(60)
+        if index == 0:
+            payload = {'room_code': room_code, 'client_id': client_id}
+            started = timed(recorder, 'start_game',
+                            lambda: (client.emit('start_game', payload), client.wait_for('game_started'))[1])
+        else:
+            started = client.wait_for('game_started', timeout=60)
+        total = started['total_questions']
+
+        for step in range(progress_steps):
+            client.emit('progress_update', {'room_code': room_code, 'current_index': step, 'client_id': client_id})
+
+        # Player i answers the first (i mod total) questions with option 0
+        vector = bytearray([255]) * total
+        for pos in range(index % (total + 1)):
+            payload = {'room_code': room_code, 'client_id': client_id, 'index': pos, 'option': 0}
+            reply = timed(recorder, 'check_answer', lambda: client.call('check_answer', payload),
+                          bytes_in=json_size(payload))
+            vector[pos] = reply['answer']
+        payload = {'room_code': room_code, 'client_id': client_id, 'checksum': zlib.crc32(bytes(vector))}
+        start = time.perf_counter()
+        reply = timed(recorder, 'finalize_answers', lambda: client.call('finalize_answers', payload),
+                      bytes_in=json_size(payload))
+        if reply and reply.get('queued'):
+            while not shows_finished(client.wait_for('leaderboard_update'), pid):
+                pass
+            recorder.add('scored', time.perf_counter() - start)
+        messages, size = client.traffic()
+        recorder.add('received_per_player', 0.0, bytes_out=size, messages=messages)
+    finally:
+        client.close()
+
+
+def shows_finished(update, pid):
+    """Whether a leaderboard update has player ``pid`` finished (json or compact rows)"""
+    for row in update.get('top', []) + update.get('changed', []):
+        if isinstance(row, dict):
+            if row['pid'] == pid:
+                return bool(row['finished'])
+        elif row[0] == pid:
+            return bool(row[4])
+    return False
+
+
+def run_room_concurrently(host, port, recorder, room_index, players, progress_steps, question_list):
+    """Play one room with every player on its own thread and socket"""
+    room = {'index': room_index, 'code': None, 'created': threading.Event(), 'joined': threading.Barrier(players)}
+
+    def player(index):
+        try:
+            room_player(host, port, recorder, room, index, progress_steps, question_list)
+        except Exception as e:
+            recorder.error(f'player: {type(e).__name__}')
+        finally:
+            # A failed player must not hold the rest of its room back
+            room['created'].set()
+            room['joined'].abort()
+
+    threads = []
+    for index in range(players):
+        thread = threading.Thread(target=player, args=(index,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+
+def start_server(port, workers):
+    """gunicorn on localhost:``port``, returned once /readyz answers 200"""
+    env = dict(os.environ, WORKERS=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'Server exited with code {server.returncode}')
+        try:
+            client = HTTPSession('127.0.0.1', port)
+            status, _ = client.request('GET', '/readyz')
+            client.close()
+            if status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Server did not become ready')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_concurrent(args, recorder):
+    """The HTTP and room flows against a real server, ``args.clients`` at a time"""
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        server = start_server(port, args.workers)
+    try:
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            for future in [pool.submit(http_exam, host, port, recorder) for _ in range(args.sessions)]:
+                try:
+                    future.result()
+                except Exception as e:
+                    recorder.error(f'session: {type(e).__name__}')
+        # Whole rooms at a time, so about args.clients sockets are open at once
+        with ThreadPoolExecutor(max_workers=max(1, args.clients // args.players)) as pool:
+            list(pool.map(
+                lambda index: run_room_concurrently(host, port, recorder, index, args.players,
+                                                    args.progress_steps, args.list),
+                range(args.rooms)
+            ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+
+
+def compare(current, previous):
+    """Print p50/p95/p99 changes against an earlier result file"""
+    print(f"\nCompared with {previous.get('started_at')}:")
+    old_events = previous.get('events', {})
+    for name, stats in current['events'].items():
+        old = old_events.get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            before, after = old[key], stats[key]
+            delta = (after - before) / before * 100 if before else 0.0
+            changes.append(f'{key[:3]} {before:.2f}->{after:.2f}ms ({delta:+.0f}%)')
+        print(f'   • {name}: ' + ', '.join(changes))
+    old_memory = previous.get('memory', {}).get('after', {}).get('current_kb')
+    if old_memory and 'after' in current['memory']:
+        print(f"   • memory after run: {old_memory}KB -> {current['memory']['after']['current_kb']}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local load test for the exam app.')
+    parser.add_argument('--sessions', type=int, default=100, help='solo exam sessions over HTTP')
+    parser.add_argument('--rooms', type=int, default=10, help='Socket.IO rooms')
+    parser.add_argument('--players', type=int, default=10, help='players per room')
+    parser.add_argument('--progress-steps', type=int, default=5, help='progress updates per player')
+    parser.add_argument('--list', default='list1', help='question list to use')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to save the results')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--concurrent', action='store_true',
+                        help='run against the real server with simultaneous clients')
+    parser.add_argument('--clients', type=int, default=50, help='simultaneous clients with --concurrent')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers started with --concurrent')
+    parser.add_argument('--url', help='with --concurrent, a running server to use instead of starting one')
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    started_at = datetime.now().isoformat()
+    if args.concurrent:
+        start = time.perf_counter()
+        run_concurrent(args, recorder)
+        elapsed = time.perf_counter() - start
+        memory, rooms_left = {}, None
+    else:
+        tracemalloc.start()
+        import app as app_module
+        app_module.load_questions()
+        memory = {'baseline': memory_snapshot()}
+
+        start = time.perf_counter()
+        run_http(app_module.app, recorder, args.sessions, args.list)
+        memory['after_http'] = memory_snapshot()
+        run_rooms(app_module, recorder, args.rooms, args.players, args.progress_steps, args.list)
+        memory['after'] = memory_snapshot()
+        elapsed = time.perf_counter() - start
+        rooms_left = len(app_module.GAMES)
+
+    result = {
+        'started_at': started_at,
+        'python': platform.python_version(),
+        'config': vars(args),
+        'duration_s': round(elapsed, 3),
+        'memory': memory,
+        'memory_growth_kb': round(memory['after']['current_kb'] - memory['baseline']['current_kb'], 1) if memory else None,
+        'rooms_left': rooms_left,
+        'events': recorder.summary(),
+        'errors': dict(recorder.errors)
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2)
+
+    print(f"{'event':<26}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'msgs/ev':>9}{'B out/ev':>10}")
+    for name, stats in result['events'].items():
+        print(f"{name:<26}{stats['count']:>7}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+              f"{stats['messages_per_event']:>9.2f}{stats['bytes_out_per_event']:>10.0f}")
+    if memory:
+        print(f"\nMemory growth: {result['memory_growth_kb']}KB (peak {memory['after']['peak_kb']}KB) in {result['duration_s']}s")
+    else:
+        print(f"\n{args.clients} clients against {args.url or f'{args.workers} worker(s)'} in {result['duration_s']}s")
+    if recorder.errors:
+        print('Errors: ' + ', '.join(f'{name} x{count}' for name, count in sorted(recorder.errors.items())))
+    print(f"Saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare(result, json.load(file))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Per-room broadcast coalescing.
+
+Handlers mark a room dirty instead of emitting straight away.  A background
+task flushes dirty rooms once per interval, so a burst of events in one room
+collapses into a single broadcast.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastScheduler:
+    """Send at most one broadcast per room per ``interval`` seconds"""
+
+    def __init__(self, socketio, send, interval=1.0):
+        self.socketio = socketio
+        # send(room) performs the actual broadcast for a room
+        self.send = send
+        self.interval = interval
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._running = False
+        # Counters
+        self.events = 0
+        self.coalesced = 0
+        self.broadcasts = 0
+        self.flushes = 0
+
+    def mark_dirty(self, room):
+        """Schedule a broadcast for ``room`` on the next tick"""
+        with self._lock:
+            self.events += 1
+            if room in self._dirty:
+                self.coalesced += 1
+            else:
+                self._dirty.add(room)
+            start = not self._running
+            self._running = True
+        if start:
+            self.socketio.start_background_task(self._run)
+
+    def discard(self, room):
+        """Drop a pending broadcast, e.g. after the room was sent a fresher one"""
+        with self._lock:
+            if room in self._dirty:
+                self._dirty.discard(room)
+                self.coalesced += 1
+
+    def flush(self):
+        """Broadcast every dirty room now"""
+        with self._lock:
+            rooms, self._dirty = self._dirty, set()
+            self.flushes += 1
+        for room in rooms:
+            try:
+                self.send(room)
+                self.broadcasts += 1
+            except Exception:
+                logger.exception('Broadcast to room %s failed', room)
+        return len(rooms)
+
+    def _run(self):
+        # Tick while there is work; stop when a tick finds nothing dirty and
+        # let the next mark_dirty() start the task again
+        while True:
+            self.socketio.sleep(self.interval)
+            if not self.flush():
+                with self._lock:
+                    if not self._dirty:
+                        self._running = False
+                        return
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'events': self.events,
+            'coalesced': self.coalesced,
+            'broadcasts': self.broadcasts,
+            'flushes': self.flushes,
+            'pending_rooms': len(self._dirty)
+        }
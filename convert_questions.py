@@ -1,122 +1,255 @@
 #!/usr/bin/env python3
 """
-Script to convert formatted questions from text file to JSON format.
-Usage: python convert_questions.py
+Compile per-list question sources into the question bank.
+
+Usage:
+    python convert_questions.py [SOURCE_DIR]          # compile questions/*.txt
+    python convert_questions.py --force [SOURCE_DIR]  # recompile every list
+    python convert_questions.py --split [SOURCE_DIR]  # write sources from questions.json
+    python convert_questions.py --from-json           # only rebuild questions.bank
+
+Each ``SOURCE_DIR/<list_key>.txt`` holds one list (``list1.txt`` ...
+``list6.txt``).  A manifest of source hashes is kept next to the output, so
+only lists whose source changed are parsed again; the others are reused
+from the previous ``questions.json``.  The outputs are ``questions.json``
+(the dict of lists the app reads) and ``questions.bank``, a binary bank
+that ``load_questions`` opens without a JSON parse.
 """
 
+import argparse
+import hashlib
 import json
+import os
 import re
+import sys
+
+from question_bank import LIST_KEYS, file_source, ordered_list_keys, write_binary_bank
+
+SOURCE_DIR = 'questions'
+OUTPUT_JSON = 'questions.json'
+OUTPUT_BANK = 'questions.bank'
+MANIFEST = 'questions.manifest.json'
+
+
+class CompileError(Exception):
+    """Raised with every problem found in the sources"""
+
+    def __init__(self, problems):
+        super().__init__('\n'.join(problems))
+        self.problems = problems
 
-def convert_questions_to_json(input_file, output_file):
+
+def parse_questions(lines, source='<text>'):
     """
-    Convert formatted questions from text file to JSON format.
-    
+    Parse formatted questions into dicts, validating each one.
+
     Expected input format:
     1. Question text...
        - Option 1*
        - Option 2
        - Option 3
-    
-    Output format:
-    [
-        {
-            "number": 1,
-            "text": "Question text...",
-            "options": ["Option 1", "Option 2", "Option 3"],
-            "correct_answer": 0
-        }
-    ]
+
+    The option marked with ``*`` is the correct answer. Lines that are
+    neither a question nor an option continue the previous question text.
     """
-    
     questions = []
-    current_question = None
-    question_number = 0
-    
-    try:
-        with open(input_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-    except FileNotFoundError:
-        print(f"Error: File '{input_file}' not found!")
-        return []
-    
-    for line in lines:
+    problems = []
+    current = None
+    starts = []
+
+    for line_number, line in enumerate(lines, 1):
         line = line.strip()
         if not line:
             continue
-            
-        # Check if this is a new question (starts with number and dot)
+
+        # A new question starts with its number and a dot
         question_match = re.match(r'^(\d+)\.\s*(.+)$', line)
         if question_match:
-            # Save previous question if exists
-            if current_question:
-                questions.append(current_question)
-            
-            # Start new question
-            question_number = int(question_match.group(1))
-            question_text = question_match.group(2).strip()
-            current_question = {
-                "number": question_number,
-                "text": question_text,
+            current = {
+                "number": int(question_match.group(1)),
+                "text": question_match.group(2).strip(),
                 "options": [],
                 "correct_answer": None
             }
+            questions.append(current)
+            starts.append(line_number)
+            continue
+
+        if current is None:
+            problems.append(f'{source}:{line_number}: text before the first question')
             continue
-        
-        # Check if this is an option (starts with dash)
+
+        # Options start with a dash; a trailing asterisk marks the answer
         option_match = re.match(r'^-\s*(.+)$', line)
-        if option_match and current_question:
+        if option_match:
             option_text = option_match.group(1).strip()
-            # Remove asterisk if present and mark as correct answer
             if option_text.endswith('*'):
                 option_text = option_text[:-1].strip()
-                current_question["correct_answer"] = len(current_question["options"])
-            current_question["options"].append(option_text)
-    
-    # Add the last question
-    if current_question:
-        questions.append(current_question)
-    
-    # Write to JSON file
-    try:
-        with open(output_file, 'w', encoding='utf-8') as file:
-            json.dump(questions, file, ensure_ascii=False, indent=3)
-        print(f"✅ Successfully converted {len(questions)} questions to {output_file}")
-    except Exception as e:
-        print(f"❌ Error writing to {output_file}: {e}")
-        return []
-    
+                if current["correct_answer"] is not None:
+                    problems.append(f'{source}:{line_number}: question {current["number"]} has more than one answer marked')
+                current["correct_answer"] = len(current["options"])
+            current["options"].append(option_text)
+        elif current["options"]:
+            problems.append(f'{source}:{line_number}: text after the options of question {current["number"]}')
+        else:
+            current["text"] = f'{current["text"]} {line}'
+
+    seen = set()
+    for question, line_number in zip(questions, starts):
+        if question["number"] in seen:
+            problems.append(f'{source}:{line_number}: question number {question["number"]} is repeated')
+        seen.add(question["number"])
+        if len(question["options"]) < 2:
+            problems.append(f'{source}:{line_number}: question {question["number"]} has fewer than two options')
+        if question["correct_answer"] is None:
+            problems.append(f'{source}:{line_number}: question {question["number"]} has no correct answer (mark it with *)')
+
+    if problems:
+        raise CompileError(problems)
     return questions
 
+
+def format_questions(questions):
+    """Inverse of :func:`parse_questions`: one list as source text"""
+    lines = []
+    for index, question in enumerate(questions, 1):
+        number = question.get("number") or index
+        lines.append(f'{number}. {question["text"].strip()}')
+        for option_index, option in enumerate(question["options"]):
+            marker = '*' if option_index == int(question["correct_answer"]) else ''
+            lines.append(f'   - {option.strip()}{marker}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+
+
+def write_outputs(lists, output_json, output_bank):
+    # Write next to the target and rename, so the app never reads a
+    # half-written file
+    with open(output_json + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(lists, file, ensure_ascii=False, indent=3)
+    # The rename keeps the size and mtime the bank records
+    write_binary_bank(lists, output_bank + '.tmp', file_source(output_json + '.tmp'))
+    os.replace(output_json + '.tmp', output_json)
+    os.replace(output_bank + '.tmp', output_bank)
+
+
+def write_bank_from_json(input_json=OUTPUT_JSON, output_bank=OUTPUT_BANK):
+    """Rebuild only the binary bank of ``input_json``"""
+    try:
+        source = file_source(input_json)
+    except FileNotFoundError:
+        raise CompileError([f'{input_json} not found'])
+    lists = load_json(input_json, None)
+    if lists is None or file_source(input_json) != source:
+        raise CompileError([f'{input_json} changed while it was read'])
+    write_binary_bank(lists, output_bank + '.tmp', source)
+    os.replace(output_bank + '.tmp', output_bank)
+
+
+def compile_questions(source_dir=SOURCE_DIR, output_json=OUTPUT_JSON, output_bank=OUTPUT_BANK,
+                      manifest_path=MANIFEST, force=False):
+    """Compile ``source_dir`` into the outputs; returns the keys that were rebuilt"""
+    sources = sorted(name for name in os.listdir(source_dir) if name.endswith('.txt'))
+    if not sources:
+        raise CompileError([f'{source_dir}: no .txt sources found'])
+
+    manifest = load_json(manifest_path, {}).get('lists', {})
+    previous = load_json(output_json, {})
+    lists, entries, rebuilt, problems = {}, {}, [], []
+
+    for name in sources:
+        list_key = name[:-len('.txt')]
+        path = os.path.join(source_dir, name)
+        digest = file_hash(path)
+        entries[list_key] = {'source': name, 'hash': digest}
+        if not force and manifest.get(list_key, {}).get('hash') == digest and list_key in previous:
+            lists[list_key] = previous[list_key]
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                lists[list_key] = parse_questions(file, source=path)
+        except CompileError as e:
+            problems.extend(e.problems)
+            continue
+        rebuilt.append(list_key)
+
+    if problems:
+        raise CompileError(problems)
+
+    lists = {key: lists[key] for key in ordered_list_keys(lists)}
+    for key, items in lists.items():
+        entries[key]['count'] = len(items)
+    outputs_missing = not (os.path.exists(output_json) and os.path.exists(output_bank))
+    if rebuilt or outputs_missing or set(lists) != set(previous):
+        write_outputs(lists, output_json, output_bank)
+    with open(manifest_path, 'w', encoding='utf-8') as file:
+        json.dump({'lists': entries}, file, indent=2, sort_keys=True)
+    return rebuilt
+
+
+def split_questions(source_dir=SOURCE_DIR, input_json=OUTPUT_JSON):
+    """Write one source file per list of ``input_json`` (to start a source dir)"""
+    lists = load_json(input_json, None)
+    if lists is None:
+        raise CompileError([f'{input_json} not found'])
+    os.makedirs(source_dir, exist_ok=True)
+    for list_key in ordered_list_keys(lists):
+        with open(os.path.join(source_dir, f'{list_key}.txt'), 'w', encoding='utf-8') as file:
+            file.write(format_questions(lists[list_key]))
+    return ordered_list_keys(lists)
+
+
 def main():
-    """Main function to run the conversion"""
-    input_file = "formatted_questions.txt"
-    output_file = "questions.json"
-    
-    print("🔄 Converting questions from text to JSON format...")
-    print(f"📖 Input file: {input_file}")
-    print(f"📄 Output file: {output_file}")
-    print("-" * 50)
-    
-    questions = convert_questions_to_json(input_file, output_file)
-    
-    if questions:
-        print(f"\n📊 Conversion Summary:")
-        print(f"   • Total questions: {len(questions)}")
-        print(f"   • Questions with correct answers: {sum(1 for q in questions if q['correct_answer'] is not None)}")
-        print(f"   • Questions without correct answers: {sum(1 for q in questions if q['correct_answer'] is None)}")
-        
-        # Show first few questions as example
-        print(f"\n📝 First 3 questions preview:")
-        for i, q in enumerate(questions[:3]):
-            print(f"\n   Question {q['number']}:")
-            print(f"   Text: {q['text'][:50]}...")
-            print(f"   Options: {len(q['options'])} options")
-            print(f"   Correct answer: {q['correct_answer']} ({q['options'][q['correct_answer']] if q['correct_answer'] is not None else 'Not set'})")
-        
-        print(f"\n✅ Conversion completed successfully!")
-        print(f"🎯 You can now run the Flask app with: python app.py")
-    else:
-        print("❌ Conversion failed!")
+    """Main function to run the compiler"""
+    parser = argparse.ArgumentParser(description='Compile question sources into the question bank.')
+    parser.add_argument('source_dir', nargs='?', default=SOURCE_DIR)
+    parser.add_argument('--force', action='store_true', help='recompile every list')
+    parser.add_argument('--split', action='store_true', help=f'write per-list sources from {OUTPUT_JSON}')
+    parser.add_argument('--from-json', action='store_true', help=f'only rebuild {OUTPUT_BANK} from {OUTPUT_JSON}')
+    args = parser.parse_args()
+
+    try:
+        if args.split:
+            keys = split_questions(args.source_dir)
+            print(f"✅ Wrote {len(keys)} source files to {args.source_dir}/")
+            return 0
+        if args.from_json:
+            write_bank_from_json()
+            print(f"✅ Wrote {OUTPUT_BANK} from {OUTPUT_JSON}")
+            return 0
+
+        print(f"🔄 Compiling {args.source_dir}/ into {OUTPUT_JSON} and {OUTPUT_BANK}")
+        rebuilt = compile_questions(args.source_dir, force=args.force)
+    except CompileError as e:
+        print("❌ Compilation failed:")
+        for problem in e.problems:
+            print(f"   • {problem}")
+        return 1
+
+    lists = load_json(OUTPUT_JSON, {})
+    print("\n📊 Compilation Summary:")
+    for list_key in ordered_list_keys(lists):
+        state = 'rebuilt' if list_key in rebuilt else 'unchanged'
+        print(f"   • {list_key}: {len(lists[list_key])} questions ({state})")
+    unknown = [key for key in lists if key not in LIST_KEYS]
+    if unknown:
+        print(f"   ⚠️  Not part of the combined views: {', '.join(unknown)}")
+    print("\n✅ Compilation completed successfully!")
+    return 0
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Storage for live game rooms.
+
+Handlers read rooms with ``GAMES.get(code)`` and change them inside
+``with GAMES.update(code) as game:`` so the same code works with either
+backend:
+
+* ``memory://``            - rooms live in this process (one worker)
+* ``sqlite:///path/to.db`` - rooms are pickled into a SQLite file in WAL
+                             mode and every update is one IMMEDIATE
+                             transaction, so several workers can share them
+
+Both remember when each room was last updated and when it finished (its
+``end_time`` was set), so :meth:`sweep` can drop idle and finished rooms
+and, above a room cap, the least recently updated ones.  They also keep
+the bank version of every room as it is added, so :meth:`bank_versions`
+never has to read the rooms themselves.
+"""
+
+import pickle
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from sqlite_connection import SQLiteConnection
+
+
+class MemoryGameStore:
+    """Rooms kept in a dict in this process, least recently updated first"""
+
+    def __init__(self):
+        self._rooms = OrderedDict()
+        # room_code -> [last update, time it finished or None]
+        self._times = {}
+        # bank version -> rooms on it
+        self._versions = Counter()
+
+    def __contains__(self, room_code):
+        return room_code in self._rooms
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def get(self, room_code):
+        return self._rooms.get(room_code)
+
+    def add(self, room_code, game):
+        """Insert a new room; returns False if the code is already taken"""
+        if room_code in self._rooms:
+            return False
+        self._rooms[room_code] = game
+        self._times[room_code] = [time.time(), None]
+        self._versions[game.get('bank_version')] += 1
+        return True
+
+    @contextmanager
+    def update(self, room_code):
+        """Yield the room (or None) for changes; they are live immediately"""
+        game = self._rooms.get(room_code)
+        yield game
+        if game is not None and room_code in self._rooms:
+            self._rooms.move_to_end(room_code)
+            times = self._times[room_code]
+            times[0] = time.time()
+            if times[1] is None and game.get('end_time') is not None:
+                times[1] = times[0]
+
+    def delete(self, room_code):
+        game = self._rooms.pop(room_code, None)
+        self._times.pop(room_code, None)
+        if game is not None:
+            version = game.get('bank_version')
+            self._versions[version] -= 1
+            if not self._versions[version]:
+                del self._versions[version]
+
+    def room_codes(self):
+        return list(self._rooms)
+
+    def bank_versions(self):
+        """Bank versions of every room"""
+        return set(self._versions)
+
+    def sweep(self, idle_ttl, finished_ttl, max_rooms=None):
+        """Delete rooms idle for ``idle_ttl`` seconds, finished for
+        ``finished_ttl``, then the least recently updated above ``max_rooms``;
+        returns the deleted room codes"""
+        now = time.time()
+        expired = [
+            code for code, (updated, finished) in self._times.items()
+            if updated < now - idle_ttl or (finished is not None and finished < now - finished_ttl)
+        ]
+        if max_rooms is not None:
+            excess = len(self._rooms) - len(expired) - max_rooms
+            if excess > 0:
+                gone = set(expired)
+                expired.extend([code for code in self._rooms if code not in gone][:excess])
+        for code in expired:
+            self.delete(code)
+        return expired
+
+
+class SQLiteGameStore:
+    """Rooms pickled into a SQLite table shared by every worker on the box"""
+
+    def __init__(self, path):
+        self.path = path
+        self._connect = SQLiteConnection(path, setup=self._create_table).connect
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS games '
+            '(room_code TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL, finished REAL, '
+            'bank_version TEXT)'
+        )
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(games)')]
+        if 'finished' not in columns:
+            # Tables created before rooms were swept
+            conn.execute('ALTER TABLE games ADD COLUMN finished REAL')
+        if 'bank_version' not in columns:
+            # Tables created before bank versions were kept; read each room once
+            conn.execute('ALTER TABLE games ADD COLUMN bank_version TEXT')
+            rows = conn.execute('SELECT room_code, data FROM games').fetchall()
+            conn.executemany('UPDATE games SET bank_version = ? WHERE room_code = ?',
+                             [(pickle.loads(data).get('bank_version'), code) for code, data in rows])
+        conn.execute('CREATE INDEX IF NOT EXISTS games_updated ON games (updated)')
+        conn.execute('CREATE INDEX IF NOT EXISTS games_bank_version ON games (bank_version)')
+
+    def __contains__(self, room_code):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT 1 FROM games WHERE room_code = ?', (room_code,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def get(self, room_code):
+        """Snapshot of a room; changes to it are not saved"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT data FROM games WHERE room_code = ?', (room_code,)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def add(self, room_code, game):
+        with self._connect() as conn:
+            try:
+                conn.execute(
+                    'INSERT INTO games (room_code, data, updated, bank_version) VALUES (?, ?, ?, ?)',
+                    (room_code, pickle.dumps(game, pickle.HIGHEST_PROTOCOL), time.time(), game.get('bank_version'))
+                )
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    @contextmanager
+    def update(self, room_code):
+        """Yield the room (or None) inside a write transaction and save it"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT data FROM games WHERE room_code = ?', (room_code,)
+                ).fetchone()
+                game = pickle.loads(row[0]) if row else None
+                yield game
+                if game is not None:
+                    now = time.time()
+                    conn.execute(
+                        'UPDATE games SET data = ?, updated = ?, finished = COALESCE(finished, ?) '
+                        'WHERE room_code = ?',
+                        (pickle.dumps(game, pickle.HIGHEST_PROTOCOL), now,
+                         now if game.get('end_time') is not None else None, room_code)
+                    )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def delete(self, room_code):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM games WHERE room_code = ?', (room_code,))
+
+    def room_codes(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute('SELECT room_code FROM games')]
+
+    def bank_versions(self):
+        """Bank versions of every room, read from the index alone"""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute('SELECT DISTINCT bank_version FROM games')}
+
+    def sweep(self, idle_ttl, finished_ttl, max_rooms=None):
+        """Delete rooms idle for ``idle_ttl`` seconds, finished for
+        ``finished_ttl``, then the least recently updated above ``max_rooms``;
+        returns the room codes this call deleted"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                expired = [row[0] for row in conn.execute(
+                    'SELECT room_code FROM games WHERE updated < ? OR finished < ?',
+                    (now - idle_ttl, now - finished_ttl)
+                )]
+                if max_rooms is not None:
+                    total = conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+                    excess = total - len(expired) - max_rooms
+                    if excess > 0:
+                        gone = set(expired)
+                        for (code,) in conn.execute('SELECT room_code FROM games ORDER BY updated'):
+                            if excess <= 0:
+                                break
+                            if code not in gone:
+                                expired.append(code)
+                                excess -= 1
+                conn.executemany('DELETE FROM games WHERE room_code = ?', [(code,) for code in expired])
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return expired
+
+
+def create_game_store(url):
+    """Create a game store from ``memory://`` or ``sqlite:///path.db``"""
+    if not url or url.startswith('memory://'):
+        return MemoryGameStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteGameStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported game store URL: {url}')
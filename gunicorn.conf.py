@@ -0,0 +1,49 @@
+"""
+Gunicorn settings (the Procfile runs ``gunicorn -c gunicorn.conf.py app:app``).
+
+The app is imported and warmed up once in the master, then the workers are
+forked and share its memory copy-on-write.  Following the ``gc.freeze``
+recipe, the collector is off in the master so it leaves no freed holes in
+the shared pages, everything is frozen right before the fork, and each
+worker turns the collector back on.
+"""
+
+import gc
+import os
+
+# Green the threading module before the app is preloaded, so the locks it
+# creates are green ones; the workers patch everything else themselves, and
+# patching sockets and os here would break the master's signal handling
+import eventlet
+eventlet.monkey_patch(thread=True)
+
+gc.disable()
+
+worker_class = 'eventlet'
+workers = int(os.environ.get('WORKERS', 1))
+preload_app = True
+
+
+def when_ready(server):
+    # After the app is loaded and before any worker is forked
+    import app
+    app.warm_up()
+    # Counters start over with the server, as they would without a shared store
+    if app.SHARED_METRICS is not None:
+        app.SHARED_METRICS.clear()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    # Without preload_app each worker warms up on its own
+    import app
+    app.warm_up()
+    app.start_metrics_writer()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()
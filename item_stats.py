@@ -0,0 +1,239 @@
+"""
+Per-question statistics fed by every scored submission.
+
+Each bank version gets one flat array of counters.  Question ``qid`` owns
+the slots from ``offsets[qid]``: how often it was shown, answered and
+answered correctly, then one pick count per option.  Options are counted
+in the bank's own order, mapped back from each exam's shuffle, so picks
+from every exam add up.  Recording a submission is one pass over its
+answer vector, and a report reads the counters without looking at any
+stored result.
+
+Two backends share the interface:
+
+* ``memory://``            - counters live in this process
+* ``sqlite:///path/to.db`` - increments are batched in memory and added to
+                             a SQLite table by :meth:`flush`, which the app
+                             calls every ``flush_interval`` seconds and on
+                             exit, so workers share one set of totals and
+                             the totals survive restarts
+"""
+
+import threading
+import time
+from array import array
+
+from scoring import UNANSWERED
+from sqlite_connection import SQLiteConnection
+
+# Counter slots of a question, followed by one slot per option
+SHOWN, ANSWERED, CORRECT, PICKS = 0, 1, 2, 3
+
+# Slot holding the number of submissions in the SQLite table
+SUBMISSIONS_SLOT = -1
+
+# Flags need at least this many answers to mean anything
+MIN_ANSWERS = 20
+TOO_EASY = 0.95
+TOO_HARD = 0.25
+# A wrong option picked by fewer answers than this is not distracting anyone
+WEAK_DISTRACTOR = 0.02
+
+
+class ItemStats:
+    """Counters for every question of one bank version"""
+
+    def __init__(self, bank):
+        self.version = bank.version
+        self.offsets = array('L')
+        total = 0
+        for question in bank.questions:
+            self.offsets.append(total)
+            total += PICKS + len(question.options)
+        self.offsets.append(total)
+        self.counts = array('Q', bytes(8 * total))
+        self.submissions = 0
+
+    def record(self, exam, vectors):
+        """Count answer ``vectors`` of ``exam`` (shuffled questions with qids)"""
+        # Resolve the shuffle once for every vector of the same exam
+        positions = []
+        for pos in range(len(exam)):
+            question, option_order = exam.source(pos)
+            positions.append((self.offsets[question.qid], option_order, int(question.correct_answer)))
+        counts = self.counts
+        for vector in vectors:
+            self.submissions += 1
+            for (base, option_order, correct), option in zip(positions, vector):
+                counts[base + SHOWN] += 1
+                if option == UNANSWERED or option >= len(option_order):
+                    continue
+                source_option = option_order[option]
+                counts[base + ANSWERED] += 1
+                counts[base + PICKS + source_option] += 1
+                if source_option == correct:
+                    counts[base + CORRECT] += 1
+
+    def question(self, qid):
+        """Counters of question ``qid``"""
+        base, end = self.offsets[qid], self.offsets[qid + 1]
+        return {
+            'shown': self.counts[base + SHOWN],
+            'answered': self.counts[base + ANSWERED],
+            'correct': self.counts[base + CORRECT],
+            'picks': self.counts[base + PICKS:end].tolist()
+        }
+
+    def nbytes(self):
+        return self.counts.itemsize * len(self.counts) + self.offsets.itemsize * len(self.offsets)
+
+
+def question_report(question, counters, min_answers=MIN_ANSWERS):
+    """Counters of one question with its correct rate and quality flags"""
+    answered = counters['answered']
+    picks = counters['picks']
+    correct_rate = counters['correct'] / answered if answered else None
+    flags = []
+    if answered >= min_answers:
+        if correct_rate >= TOO_EASY:
+            flags.append('too_easy')
+        elif correct_rate <= TOO_HARD:
+            flags.append('too_hard')
+        wrong = [option for option in range(len(picks)) if option != question.correct_answer]
+        if any(picks[option] / answered < WEAK_DISTRACTOR for option in wrong):
+            flags.append('weak_distractor')
+        if any(picks[option] > picks[question.correct_answer] for option in wrong):
+            # More people chose a wrong option than the key: check the key
+            flags.append('distractor_beats_key')
+    return {
+        'qid': question.qid,
+        'list': question.list_key,
+        'number': question.number,
+        'correct_answer': question.correct_answer,
+        'shown': counters['shown'],
+        'answered': answered,
+        'correct': counters['correct'],
+        'correct_rate': None if correct_rate is None else round(correct_rate, 4),
+        'skip_rate': round(1 - answered / counters['shown'], 4) if counters['shown'] else None,
+        'picks': picks,
+        'flags': flags
+    }
+
+
+class MemoryItemStats:
+    """Item statistics kept in this process"""
+
+    # Nothing is pending, so nothing needs flushing
+    flush_interval = 0
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _for(self, bank):
+        stats = self._stats.get(bank.version)
+        if stats is None:
+            stats = self._stats[bank.version] = ItemStats(bank)
+        return stats
+
+    def record(self, bank, exam, vectors):
+        with self._lock:
+            self._for(bank).record(exam, vectors)
+
+    def totals(self, bank):
+        """An :class:`ItemStats` with the totals for ``bank``"""
+        with self._lock:
+            stats = self._for(bank)
+            copy = ItemStats.__new__(ItemStats)
+            copy.version, copy.offsets = stats.version, stats.offsets
+            copy.counts, copy.submissions = array('Q', stats.counts), stats.submissions
+            return copy
+
+    def flush(self):
+        pass
+
+    def nbytes(self):
+        return sum(stats.nbytes() for stats in self._stats.values())
+
+
+class SQLiteItemStats:
+    """Item statistics totalled in a SQLite table shared by every worker"""
+
+    def __init__(self, path, flush_interval=10.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        # version -> ItemStats holding increments not yet written
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._connect = SQLiteConnection(path, setup=self._create_table, lock=self._lock).connect
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS item_counts '
+            '(version TEXT NOT NULL, slot INTEGER NOT NULL, count INTEGER NOT NULL, '
+            'PRIMARY KEY (version, slot))'
+        )
+
+    def record(self, bank, exam, vectors):
+        with self._lock:
+            stats = self._pending.get(bank.version)
+            if stats is None:
+                stats = self._pending[bank.version] = ItemStats(bank)
+            stats.record(exam, vectors)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """Add the pending increments to the table"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            rows = []
+            for version, stats in self._pending.items():
+                rows.append((version, SUBMISSIONS_SLOT, stats.submissions))
+                rows.extend((version, slot, count) for slot, count in enumerate(stats.counts) if count)
+            with self._connect() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany(
+                        'INSERT INTO item_counts (version, slot, count) VALUES (?, ?, ?) '
+                        'ON CONFLICT (version, slot) DO UPDATE SET count = count + excluded.count',
+                        rows
+                    )
+                    conn.execute('COMMIT')
+                except Exception:
+                    # Keep the increments for the next flush
+                    conn.execute('ROLLBACK')
+                    raise
+            self._pending = {}
+
+    def totals(self, bank):
+        """An :class:`ItemStats` with the totals of every worker for ``bank``"""
+        stats = ItemStats(bank)
+        with self._lock:
+            self.flush()
+            with self._connect() as conn:
+                rows = conn.execute(
+                    'SELECT slot, count FROM item_counts WHERE version = ?', (bank.version,)
+                ).fetchall()
+        for slot, count in rows:
+            if slot == SUBMISSIONS_SLOT:
+                stats.submissions = count
+            elif slot < len(stats.counts):
+                stats.counts[slot] = count
+        return stats
+
+    def nbytes(self):
+        return sum(stats.nbytes() for stats in self._pending.values())
+
+
+def create_item_stats(url, flush_interval=10.0):
+    """Create item statistics from a URL such as ``memory://`` or ``sqlite:///stats.db``"""
+    if not url or url.startswith('memory://'):
+        return MemoryItemStats()
+    if url.startswith('sqlite:///'):
+        return SQLiteItemStats(url[len('sqlite:///'):], flush_interval=flush_interval)
+    raise ValueError(f'Unsupported item stats URL: {url}')
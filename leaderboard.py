@@ -0,0 +1,107 @@
+"""
+Incrementally ranked leaderboard.
+
+Players are ordered by score (highest first), then time (fastest first),
+then seat number.  A Fenwick tree over score buckets counts how many
+players sit above a score, and each bucket keeps its players sorted by
+(time, seat), so ranking a player or moving them after a submission
+costs O(log n) instead of re-sorting the whole room.
+"""
+
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    """Ranks seats (small integer player IDs) by (-score, time, seat)"""
+
+    def __init__(self, max_score=0):
+        self._tree = [0] * (max_score + 2)
+        self._buckets = {}      # score -> sorted [(time, pid), ...]
+        self._scores = []       # sorted distinct scores present
+        self._entries = {}      # pid -> (score, time)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, pid):
+        return pid in self._entries
+
+    # Fenwick tree over scores (index = score + 1)
+    def _tree_add(self, score, delta):
+        if score + 1 >= len(self._tree):
+            self._grow(score)
+        i = score + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_at_or_below(self, score):
+        i = min(score + 1, len(self._tree) - 1)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self, score):
+        entries = list(self._entries.values())
+        self._tree = [0] * (max(score + 2, 2 * len(self._tree)))
+        for entry_score, _ in entries:
+            i = entry_score + 1
+            while i < len(self._tree):
+                self._tree[i] += 1
+                i += i & -i
+
+    def _insert(self, pid, score, time):
+        bucket = self._buckets.get(score)
+        if bucket is None:
+            bucket = self._buckets[score] = []
+            insort(self._scores, score)
+        insort(bucket, (time, pid))
+        self._tree_add(score, 1)
+        self._entries[pid] = (score, time)
+
+    def _delete(self, pid):
+        score, time = self._entries.pop(pid)
+        bucket = self._buckets[score]
+        del bucket[bisect_left(bucket, (time, pid))]
+        if not bucket:
+            del self._buckets[score]
+            del self._scores[bisect_left(self._scores, score)]
+        self._tree_add(score, -1)
+
+    def rank(self, pid):
+        """Zero-based rank of ``pid``"""
+        score, time = self._entries[pid]
+        above = len(self._entries) - self._count_at_or_below(score)
+        return above + bisect_left(self._buckets[score], (time, pid))
+
+    def add(self, pid, score=0, time=0):
+        """Seat a player and return their rank"""
+        if pid in self._entries:
+            self._delete(pid)
+        self._insert(pid, score, time)
+        return self.rank(pid)
+
+    def update(self, pid, score, time):
+        """Move a player to a new (score, time); returns (old_rank, new_rank)"""
+        old_rank = self.rank(pid)
+        self._delete(pid)
+        self._insert(pid, score, time)
+        return old_rank, self.rank(pid)
+
+    def remove(self, pid):
+        """Remove a player; returns the rank they held"""
+        old_rank = self.rank(pid)
+        self._delete(pid)
+        return old_rank
+
+    def top(self, k):
+        """Seats of the best ``k`` players, in rank order"""
+        result = []
+        for score in reversed(self._scores):
+            for _, pid in self._buckets[score]:
+                result.append(pid)
+                if len(result) >= k:
+                    return result
+        return result
@@ -0,0 +1,200 @@
+"""
+Per-client mastery of the question bank.
+
+A client's record is three bitsets indexed by global question ID, packed
+side by side in one bytearray (``3 * ceil(questions / 8)`` bytes, about 200
+bytes for the whole bank):
+
+* seen     - answered at least once
+* wrong    - the latest answer was wrong
+* mastered - the latest two answers were right
+
+Recording an answer sets or clears a few bits in place.  Practice exams
+are chosen with whole-bitset operations on the same records (e.g. wrong
+and not mastered), and a chosen set of questions travels as a bitset too,
+so the exam can be rebuilt from its list key alone (see
+:func:`encode_ids`).
+
+Global IDs shift when questions are added or removed, so a stored record
+starts with the ``keys_version`` of the bank it was indexed by.  A record
+read with another bank is remapped through both banks' stable question
+keys (see :func:`remap`); the keys of every bank a record was saved with
+are kept next to the records.
+"""
+
+import base64
+
+from permutations import Permutation
+
+SEEN, WRONG, MASTERED = 0, 1, 2
+
+# Stored records: magic, the bank's 8-byte keys_version, then the bitsets
+RECORD_MAGIC = b'MQ1'
+KEYS_VERSION_SIZE = 8
+KEY_SIZE = 8
+
+
+class Mastery:
+    """Seen, wrong and mastered bits of one client"""
+
+    __slots__ = ('size', 'bits')
+
+    def __init__(self, questions, data=b''):
+        # Bytes per bitset; a record saved for a smaller bank is padded
+        self.size = (questions + 7) // 8
+        old = len(data) // 3
+        self.bits = bytearray(3 * self.size)
+        for kind in (SEEN, WRONG, MASTERED):
+            chunk = data[kind * old:kind * old + min(old, self.size)]
+            self.bits[kind * self.size:kind * self.size + len(chunk)] = chunk
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def _has(self, kind, qid):
+        return self.bits[kind * self.size + (qid >> 3)] >> (qid & 7) & 1
+
+    def _set(self, kind, qid, value):
+        index = kind * self.size + (qid >> 3)
+        if value:
+            self.bits[index] |= 1 << (qid & 7)
+        else:
+            self.bits[index] &= ~(1 << (qid & 7)) & 0xFF
+
+    def record(self, qid, correct):
+        """Count one answer to question ``qid``"""
+        if not 0 <= qid < self.size * 8:
+            return
+        if correct:
+            # Right after a right answer (and not after a wrong one) masters it
+            self._set(MASTERED, qid, self._has(SEEN, qid) and not self._has(WRONG, qid))
+            self._set(WRONG, qid, False)
+        else:
+            self._set(MASTERED, qid, False)
+            self._set(WRONG, qid, True)
+        self._set(SEEN, qid, True)
+
+    def bitset(self, kind):
+        """Bitset ``kind`` as an int (bit ``qid`` set for each question)"""
+        return int.from_bytes(self.bits[kind * self.size:(kind + 1) * self.size], 'little')
+
+    def counts(self):
+        return {name: self.bitset(kind).bit_count()
+                for name, kind in (('seen', SEEN), ('wrong', WRONG), ('mastered', MASTERED))}
+
+
+def pack_record(mastery, keys_version):
+    """Stored form of ``mastery``, indexed by the bank with ``keys_version``"""
+    return RECORD_MAGIC + keys_version + mastery.to_bytes()
+
+
+def unpack_record(data):
+    """``(keys_version, bitsets)`` of a stored record
+
+    ``keys_version`` is None for records saved before they carried it.
+    """
+    data = bytes(data or b'')
+    if not data.startswith(RECORD_MAGIC):
+        return None, data
+    start = len(RECORD_MAGIC) + KEYS_VERSION_SIZE
+    return data[len(RECORD_MAGIC):start], data[start:]
+
+
+def pack_keys(keys):
+    return b''.join(keys)
+
+
+def unpack_keys(data):
+    return [data[i:i + KEY_SIZE] for i in range(0, len(data), KEY_SIZE)]
+
+
+def remap(bits, old_keys, new_keys):
+    """Bitsets ``bits`` indexed by ``old_keys``, re-indexed for ``new_keys``
+
+    Questions missing from the new bank are dropped; new ones start unseen.
+    """
+    old = Mastery(len(old_keys), bits)
+    new = Mastery(len(new_keys))
+    positions = {key: qid for qid, key in enumerate(new_keys)}
+    for kind in (SEEN, WRONG, MASTERED):
+        for qid in ids_of(old.bitset(kind)):
+            if qid < len(old_keys):
+                target = positions.get(old_keys[qid])
+                if target is not None:
+                    new._set(kind, target, True)
+    return new
+
+
+def record_answers(mastery, qids, vector, key, unanswered=255):
+    """Count every answered position of a scored ``vector``"""
+    for qid, option, correct in zip(qids, vector, key):
+        if option != unanswered:
+            mastery.record(qid, option == correct)
+
+
+def mask_of(ids):
+    """Bitset of question IDs"""
+    mask = 0
+    for qid in ids:
+        mask |= 1 << qid
+    return mask
+
+
+def ids_of(mask):
+    """Question IDs in bitset ``mask``, ascending"""
+    ids = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+
+def select(mastery, pool, mode, count, seed):
+    """Up to ``count`` question IDs of ``pool`` (IDs or a range) for an exam ``mode``
+
+    * ``mistakes`` - only questions whose latest answer was wrong
+    * ``unseen``   - never answered first, then wrong, then not yet
+                     mastered, then mastered
+    * ``review``   - questions answered before but not mastered, wrong first
+
+    Within a tier questions are taken in a seeded random order.
+    """
+    if isinstance(pool, range) and pool.step == 1:
+        pool_mask = (1 << pool.stop) - (1 << pool.start)
+    else:
+        pool_mask = mask_of(pool)
+    seen, wrong, mastered = (mastery.bitset(kind) for kind in (SEEN, WRONG, MASTERED))
+    if mode == 'mistakes':
+        tiers = [wrong]
+    elif mode == 'unseen':
+        tiers = [~seen, wrong, seen & ~wrong & ~mastered, mastered]
+    elif mode == 'review':
+        tiers = [wrong, seen & ~wrong & ~mastered]
+    else:
+        raise ValueError(f'Unknown mastery mode: {mode}')
+    chosen = []
+    for tier in tiers:
+        ids = ids_of(tier & pool_mask)
+        order = Permutation(len(ids), seed) if len(ids) > 1 else range(len(ids))
+        for i in range(min(len(ids), count - len(chosen))):
+            chosen.append(ids[order[i]])
+        if len(chosen) >= count:
+            break
+    return sorted(chosen)
+
+
+def encode_ids(ids):
+    """Compact, URL-safe text for a set of question IDs"""
+    mask = mask_of(ids)
+    return base64.urlsafe_b64encode(mask.to_bytes((mask.bit_length() + 7) // 8, 'little')).decode('ascii').rstrip('=')
+
+
+def decode_ids(text, limit):
+    """Question IDs below ``limit`` encoded by :func:`encode_ids` (empty if invalid)"""
+    try:
+        data = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+    except (ValueError, TypeError):
+        return []
+    data = data[:(limit + 7) // 8]
+    return [qid for qid in ids_of(int.from_bytes(data, 'little')) if qid < limit]
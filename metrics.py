@@ -0,0 +1,400 @@
+"""
+Metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts of lists keyed by label values,
+updated in a few microseconds under a lock, so the instrumentation can stay
+on in production.  Gauges are callbacks read only when ``/metrics`` is
+scraped.  Every worker process keeps its own numbers; with several workers
+:class:`SharedMetrics` adds them up through a SQLite file.
+
+:func:`instrument_flask` times every route and :func:`instrument_socketio`
+every Socket.IO handler registered after it, plus the events emitted.
+Payload sizes are read off the packets Socket.IO encodes anyway, so
+nothing is serialized twice.
+"""
+
+import inspect
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import g, request
+from socketio import packet as socketio_packet
+
+from sqlite_connection import SQLiteConnection
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Bucketed observations per label values, with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0]
+            row[index] += 1
+            row[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(row)) for labels, row in self._values.items()]
+        for labels, row in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), row):
+                cumulative += count
+                yield self.name + '_bucket' + _labels(self.labelnames, labels, f'le="{_number(bound)}"'), cumulative
+            yield self.name + '_sum' + _labels(self.labelnames, labels), row[-1]
+            yield self.name + '_count' + _labels(self.labelnames, labels), cumulative
+
+
+class Gauge:
+    """Value read from ``callback`` at scrape time.
+
+    The callback returns a number, or ``(label values, number)`` pairs when
+    the gauge has labels. ``kind='counter'`` exposes a count kept elsewhere
+    (e.g. cache hits) with the right type.
+    """
+
+    def __init__(self, name, help, callback, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if not self.labelnames:
+            yield self.name, value
+            return
+        for labels, item in value:
+            yield self.name + _labels(self.labelnames, labels), item
+
+
+class Registry:
+    """Every metric of this process, rendered for ``/metrics``"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self.prefix + name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help, labelnames, buckets))
+
+    def gauge(self, name, help, callback, labelnames=(), kind='gauge'):
+        return self._add(Gauge(self.prefix + name, help, callback, labelnames, kind))
+
+    def collect(self, gauges=True):
+        """``(name, kind, help, samples)`` of every metric
+
+        ``gauges=False`` leaves out gauges (but not counters kept elsewhere,
+        which are cheap to read).  A broken gauge gets kind None and the
+        error as its help, so it cannot take the whole scrape down.
+        """
+        families = []
+        for metric in self._metrics:
+            if not gauges and metric.kind == 'gauge':
+                continue
+            try:
+                families.append((metric.name, metric.kind, metric.help, list(metric.samples())))
+            except Exception as e:
+                families.append((metric.name, None, type(e).__name__, []))
+        return families
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return render_families(self.collect())
+
+
+def render_families(families):
+    """``(name, kind, help, samples)`` in the Prometheus text exposition format"""
+    lines = []
+    for name, kind, help, samples in families:
+        if kind is None:
+            lines.append(f'# {name} unavailable: {help}')
+            continue
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample, value in samples:
+            lines.append(f'{sample} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class SharedMetrics:
+    """Counters and histograms of every worker, added up through a SQLite file
+
+    Each worker saves its counters and histograms every ``interval``
+    seconds (see :meth:`save`) and when it exits.  A scrape of any worker
+    sums the latest snapshot of every worker, including workers that have
+    exited, so totals never go backwards whichever worker answers.  Gauges
+    are those of the worker that answered; the ones read from shared
+    stores (rooms, players) are the same in every worker.
+    """
+
+    SUMMED = ('counter', 'histogram')
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.interval = interval
+        self._connect = SQLiteConnection(path, setup=self._create_table).connect
+        self._pid = None
+        self._worker = None
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS metrics_snapshots '
+            '(worker TEXT PRIMARY KEY, updated REAL NOT NULL, families TEXT NOT NULL)'
+        )
+
+    def _worker_id(self):
+        # Pids are reused, so a worker is its pid and when it first saved
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._worker = f'{self._pid}-{time.time():.6f}'
+        return self._worker
+
+    def save(self, families=None):
+        """Store this worker's counters and histograms"""
+        if families is None:
+            families = self.registry.collect(gauges=False)
+        families = [family for family in families if family[1] in self.SUMMED or family[1] == 'counter']
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO metrics_snapshots (worker, updated, families) VALUES (?, ?, ?)',
+                (self._worker_id(), time.time(), json.dumps(families, separators=(',', ':')))
+            )
+
+    def clear(self):
+        """Forget every snapshot, e.g. when the server starts"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM metrics_snapshots')
+
+    def render(self):
+        """Every worker's counters and histograms summed, with this worker's gauges"""
+        own = self.registry.collect()
+        self.save(own)
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT families FROM metrics_snapshots WHERE worker != ?', (self._worker,)
+            ).fetchall()
+        # name -> [kind, help, {sample: value}], in this worker's order
+        merged = {name: [kind, help, dict(samples)] for name, kind, help, samples in own}
+        for (data,) in rows:
+            for name, kind, help, samples in json.loads(data):
+                family = merged.setdefault(name, [kind, help, {}])
+                if family[0] not in self.SUMMED:
+                    continue
+                values = family[2]
+                for sample, value in samples:
+                    values[sample] = values.get(sample, 0) + value
+        return render_families((name, kind, help, list(values.items()))
+                               for name, (kind, help, values) in merged.items())
+
+
+def create_shared_metrics(registry, url, interval=5.0):
+    """None for process-local metrics (no URL), or :class:`SharedMetrics` for ``sqlite:///path.db``"""
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SharedMetrics(registry, url[len('sqlite:///'):], interval=interval)
+    raise ValueError(f'Unsupported metrics store URL: {url}')
+
+
+def encoded_size(encoded):
+    """Bytes of a packet Socket.IO has encoded (text, or text plus binary attachments)"""
+    if isinstance(encoded, list):
+        return sum(encoded_size(part) for part in encoded)
+    if isinstance(encoded, str):
+        # ASCII is one byte per character; only other text is encoded again
+        return len(encoded) if encoded.isascii() else len(encoded.encode('utf-8'))
+    return len(encoded)
+
+
+def instrument_flask(app, registry):
+    """Record latency, status and body sizes of every request to ``app``.
+
+    Latency runs until the view returns, so for streamed responses it is the
+    time to the first byte; their size is counted as the body is sent.
+    """
+    requests = registry.counter('http_requests_total', 'HTTP requests by route, method and status',
+                                ('route', 'method', 'status'))
+    latency = registry.histogram('http_request_duration_seconds', 'Time spent in the view',
+                                 ('route', 'method'))
+    size_in = registry.histogram('http_request_size_bytes', 'Request body size',
+                                 ('route',), SIZE_BUCKETS)
+    size_out = registry.histogram('http_response_size_bytes', 'Response body size',
+                                  ('route',), SIZE_BUCKETS)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        latency.observe(time.perf_counter() - start, (route, request.method))
+        requests.inc((route, request.method, str(response.status_code)))
+        size_in.observe(request.content_length or 0, (route,))
+        if response.content_length is not None:
+            size_out.observe(response.content_length, (route,))
+        elif response.is_streamed:
+            response.response = _counted(response.response, size_out, (route,))
+        return response
+
+
+def _counted(chunks, histogram, labels):
+    # Pass a streamed body through, observing its size once it is sent
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        histogram.observe(total, labels)
+
+
+def instrument_socketio(socketio, registry):
+    """Time every handler registered with ``socketio.on`` from now on and
+    count the events emitted through this process"""
+    events = registry.counter('socketio_events_total', 'Socket.IO events handled', ('event',))
+    errors = registry.counter('socketio_event_errors_total', 'Socket.IO handlers that raised', ('event',))
+    latency = registry.histogram('socketio_event_duration_seconds', 'Time spent in the handler', ('event',))
+    size_in = registry.histogram('socketio_event_size_bytes', 'Incoming event packet size',
+                                 ('event',), SIZE_BUCKETS)
+    emits = registry.counter('socketio_emits_total', 'Events emitted, once per emit whatever the fan-out',
+                             ('event',))
+    size_out = registry.histogram('socketio_emit_size_bytes', 'Emitted event packet size, once per encoding',
+                                  ('event',), SIZE_BUCKETS)
+    events_types = (socketio_packet.EVENT, socketio_packet.BINARY_EVENT)
+
+    class MeasuredPacket(socketio.server.packet_class):
+        # Sizes of the packets the server encodes and decodes anyway
+        def encode(self):
+            encoded = super().encode()
+            if self.packet_type in events_types and self.data:
+                size_out.observe(encoded_size(encoded), (self.data[0],))
+            return encoded
+
+        def decode(self, encoded_packet):
+            attachments = super().decode(encoded_packet)
+            if self.packet_type in events_types and self.data:
+                size_in.observe(encoded_size(encoded_packet), (self.data[0],))
+            return attachments
+    socketio.server.packet_class = MeasuredPacket
+
+    def timed(event, handler):
+        labels = (event,)
+        # Pass only the arguments the handler takes, as python-socketio
+        # would (e.g. the disconnect reason to a handler without one)
+        parameters = inspect.signature(handler).parameters.values()
+        if any(p.kind is inspect.Parameter.VAR_POSITIONAL for p in parameters):
+            arity = None
+        else:
+            arity = sum(p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+                        for p in parameters)
+
+        @wraps(handler)
+        def wrapper(*args):
+            args = args[:arity]
+            start = time.perf_counter()
+            try:
+                return handler(*args)
+            except Exception:
+                errors.inc(labels)
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start, labels)
+                events.inc(labels)
+        return wrapper
+
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+
+        def instrumented(handler):
+            decorator(timed(message, handler))
+            return handler
+        return instrumented
+    socketio.on = on
+
+    manager = socketio.server.manager
+    manager_emit = manager.emit
+
+    def emit(event, data, *args, **kwargs):
+        emits.inc((event,))
+        return manager_emit(event, data, *args, **kwargs)
+    manager.emit = emit
@@ -0,0 +1,118 @@
+"""
+Seeded, random-access permutations.
+
+Exams are shuffled with counter-based hashing instead of a shared random
+generator: element ``i`` of a permutation is computed directly from the
+seed and ``i``, so concurrent requests cannot disturb each other's stream
+and "question i of the exam with seed s" costs O(1) without shuffling the
+rest of the exam.
+"""
+
+import sys
+from array import array
+from collections.abc import Sequence
+
+_MASK64 = (1 << 64) - 1
+
+
+def mix(value):
+    """SplitMix64 finalizer: a well-spread 64-bit hash of an integer"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def derive_seed(seed, salt):
+    """Independent 64-bit seed for one use (``salt``) of an exam seed"""
+    return mix(mix(int(seed) & _MASK64) ^ salt)
+
+
+class Permutation(Sequence):
+    """The first ``length`` elements of a seeded permutation of ``range(size)``.
+
+    A four-round Feistel network shuffles the smallest even-bit domain that
+    holds ``size``; values that fall outside ``range(size)`` are encrypted
+    again (cycle walking) until they land inside it.
+    """
+
+    __slots__ = ('size', 'length', '_half_bits', '_half_mask', '_keys', '_tables')
+
+    ROUNDS = 4
+
+    # Round functions are tabulated up to this many bits per half (4 x 64K
+    # entries); a half only spans sqrt(size), so tables stay small
+    MAX_TABLE_BITS = 16
+
+    def __init__(self, size, seed, length=None):
+        self.size = size
+        self.length = size if length is None else min(length, size)
+        half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_bits = half_bits
+        self._half_mask = (1 << half_bits) - 1
+        key = derive_seed(seed, size)
+        self._keys = tuple(mix(key + r) for r in range(self.ROUNDS))
+        self._tables = None
+        if half_bits <= self.MAX_TABLE_BITS:
+            # Same values as mix(key ^ right) & mask, looked up instead of hashed
+            self._tables = tuple(
+                array('I', [mix(key ^ right) & self._half_mask for right in range(1 << half_bits)])
+                for key in self._keys
+            )
+
+    def __len__(self):
+        return self.length
+
+    def _encrypt(self, value):
+        left = value >> self._half_bits
+        right = value & self._half_mask
+        if self._tables is not None:
+            for table in self._tables:
+                left, right = right, left ^ table[right]
+            return (left << self._half_bits) | right
+        for key in self._keys:
+            left, right = right, left ^ (mix(key ^ right) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if start == 0 and step == 1:
+                return self._prefix(stop)
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('permutation index out of range')
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def nbytes(self):
+        """Approximate memory held by this permutation, round tables included"""
+        size = sys.getsizeof(self) + sys.getsizeof(self._keys) + sum(map(sys.getsizeof, self._keys))
+        if self._tables is not None:
+            size += sys.getsizeof(self._tables) + sum(map(sys.getsizeof, self._tables))
+        return size
+
+    def _prefix(self, length):
+        prefix = object.__new__(Permutation)
+        prefix.size = self.size
+        prefix.length = min(length, self.length)
+        prefix._half_bits = self._half_bits
+        prefix._half_mask = self._half_mask
+        prefix._keys = self._keys
+        prefix._tables = self._tables
+        return prefix
+
+
+def small_permutation(count, seed, index):
+    """Seeded shuffle of ``range(count)`` for item ``index`` (e.g. options)"""
+    order = list(range(count))
+    state = mix(seed ^ mix(index))
+    for j in range(count - 1, 0, -1):
+        state = mix(state)
+        i = state % (j + 1)
+        order[j], order[i] = order[i], order[j]
+    return order
@@ -0,0 +1,307 @@
+"""
+In-memory index of the question bank.
+
+The bank is built once from the ``questions.json`` dict of lists.  Every
+question gets a stable global ID (its position across list1..list6), and
+the per-list and combined views are ranges over those IDs, so serving a
+view never copies the questions.
+
+Banks load from the ``questions.json`` dict of lists or from the compact
+binary bank written by ``convert_questions.py`` (see
+:func:`write_binary_bank`), which opens without parsing any JSON.  It
+holds the bank's version hashes and question keys, so opening it hashes
+nothing, and the size and modification time of the JSON file it was
+built from, so a stale one is never used.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+
+# Lists that make up the combined views, in global ID order
+LIST_KEYS = ('list1', 'list2', 'list3', 'list4', 'list5', 'list6')
+
+# Views spanning every list
+COMBINED_VIEWS = ('all_questions', 'random120')
+
+
+def ordered_list_keys(raw_lists):
+    """List keys in global ID order: list1..list6, then any others"""
+    keys = [k for k in LIST_KEYS if k in raw_lists]
+    keys += [k for k, v in raw_lists.items() if k not in LIST_KEYS and isinstance(v, list)]
+    return keys
+
+
+class Question:
+    """One question record; reads like the original dict (``q['text']``)"""
+
+    __slots__ = ('qid', 'list_key', 'number', 'text', 'options', 'correct_answer')
+
+    FIELDS = ('number', 'text', 'options', 'correct_answer')
+
+    def __init__(self, qid, list_key, number, text, options, correct_answer):
+        self.qid = qid
+        self.list_key = list_key
+        self.number = number
+        self.text = text
+        self.options = options
+        self.correct_answer = correct_answer
+
+    def keys(self):
+        return self.FIELDS
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {key: self[key] for key in self.FIELDS}
+
+
+def question_key(question):
+    """8-byte key of a question's list, text and options (not its answer)"""
+    record = json.dumps([question.list_key, question.text, question.options], ensure_ascii=False)
+    return hashlib.sha256(record.encode('utf-8')).digest()[:8]
+
+
+def question_keys(questions):
+    """Stable key of every question, in global ID order
+
+    A question's key is the same in every bank holding it, wherever it
+    sits; the n-th copy of a duplicated question gets a key of its own.
+    """
+    keys, seen = [], {}
+    for question in questions:
+        key = question_key(question)
+        copies = seen[key] = seen.get(key, 0) + 1
+        if copies > 1:
+            key = hashlib.sha256(key + copies.to_bytes(4, 'little')).digest()[:8]
+        keys.append(key)
+    return tuple(keys)
+
+
+class BankView(Sequence):
+    """Read-only sequence of questions selected by a range of global IDs"""
+
+    __slots__ = ('_questions', 'ids')
+
+    def __init__(self, questions, ids):
+        self._questions = questions
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return BankView(self._questions, self.ids[pos])
+        return self._questions[self.ids[pos]]
+
+    def qid(self, pos):
+        """Global ID of the question at position ``pos``"""
+        return self.ids[pos]
+
+
+class QuestionBank:
+    """All questions, indexed by global ID, with per-list and combined views"""
+
+    def __init__(self, raw_lists):
+        self._index(
+            (list_key, (
+                (item.get('number'), item['text'], tuple(item['options']), int(item['correct_answer']))
+                for item in raw_lists[list_key]
+            ))
+            for list_key in ordered_list_keys(raw_lists)
+        )
+
+    @classmethod
+    def from_binary(cls, path):
+        """Load a bank written by :func:`write_binary_bank`
+
+        :attr:`source` is the ``(size, mtime_ns)`` of the JSON file it was
+        built from.
+        """
+        bank = cls.__new__(cls)
+        bank.source, hashes, lists = read_binary_bank(path)
+        bank._index(lists, hashes)
+        return bank
+
+    def _index(self, lists, hashes=None):
+        # lists: iterable of (list_key, iterable of (number, text, options, correct));
+        # hashes: (version, layout, question keys) already worked out, if known
+        questions = []
+        ranges = {}
+        for list_key, records in lists:
+            start = len(questions)
+            for number, text, options, correct_answer in records:
+                questions.append(Question(len(questions), list_key, number, text, options, correct_answer))
+            ranges[list_key] = range(start, len(questions))
+
+        self.questions = tuple(questions)
+        self.lists = ranges
+        if hashes is None:
+            # Per-question keys survive questions being added, removed or
+            # renumbered elsewhere in the bank (see question_keys)
+            hashes = self._content_versions() + (question_keys(self.questions),)
+        self.version, self.layout, self.question_keys = hashes
+        self.keys_version = hashlib.sha256(b''.join(self.question_keys)).digest()[:8]
+
+        combined_end = max((ranges[k].stop for k in LIST_KEYS if k in ranges), default=0)
+        self.views = {key: BankView(self.questions, ids) for key, ids in ranges.items()}
+        for key in COMBINED_VIEWS:
+            self.views[key] = BankView(self.questions, range(0, combined_end))
+
+    def _content_versions(self):
+        # The version changes with any text, option or answer, whatever file
+        # it came from; the layout ignores answers, so banks that only differ
+        # by answer key fixes share it and their exams hold the same questions
+        version, layout = hashlib.sha256(), hashlib.sha256()
+        for q in self.questions:
+            record = json.dumps([q.list_key, q.number, q.text, q.options], ensure_ascii=False)
+            layout.update(record.encode('utf-8'))
+            version.update(f'{record[:-1]}, {q.correct_answer}]'.encode('utf-8'))
+        return version.hexdigest()[:16], layout.hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, list_key):
+        return list_key in self.lists
+
+    def get(self, list_key, default=None):
+        """Dict-style access to a single list, as with the raw JSON"""
+        if list_key in self.lists:
+            return self.views[list_key]
+        return default
+
+    def __getitem__(self, list_key):
+        return self.views[list_key]
+
+    def view(self, key):
+        """View for a list key or combined view name; empty if unknown"""
+        view = self.views.get(key)
+        return view if view is not None else BankView(self.questions, range(0))
+
+    def question(self, qid):
+        return self.questions[qid]
+
+    def list_sizes(self):
+        return {key: len(ids) for key, ids in self.lists.items()}
+
+    def public_dict(self):
+        """The bank without correct answers, for caching on clients.
+
+        ``questions[qid]`` is ``[text, options]`` and ``lists[key]`` is the
+        ``[start, stop)`` range of global IDs making up that list.
+        """
+        return {
+            'lists': {key: [ids.start, ids.stop] for key, ids in self.lists.items()},
+            'questions': [[q.text, list(q.options)] for q in self.questions]
+        }
+
+
+# Binary bank layout (little-endian):
+#   header     magic, size and mtime_ns of the source JSON file, version,
+#              layout, list count, question count, option count
+#   lists      (key offset, key length, first question, question count)
+#   questions  (number or -1, text offset, text length, first option,
+#               option count, correct answer)
+#   options    (text offset, text length)
+#   keys       8-byte stable key per question (see question_keys)
+#   strings    UTF-8 text that the offsets above point into
+BINARY_MAGIC = b'MCQBANK3'
+_HEADER = struct.Struct('<8sQq16s16sIII')
+_LIST = struct.Struct('<IIII')
+_QUESTION = struct.Struct('<iIIIHH')
+_OPTION = struct.Struct('<II')
+_KEY_SIZE = 8
+
+
+def file_source(path):
+    """``(size, mtime_ns)`` of a JSON file, as recorded in binary banks"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_binary_bank(raw_lists, path, source=(0, 0)):
+    """Write the ``questions.json`` dict of lists as a binary bank
+
+    ``source`` is the :func:`file_source` of the JSON file holding
+    ``raw_lists``; a bank is only opened for a file that still matches it.
+    """
+    bank = QuestionBank(raw_lists)
+    strings = bytearray()
+
+    def add_string(text):
+        data = text.encode('utf-8')
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    list_rows, question_rows, option_rows = [], [], []
+    for list_key, ids in bank.lists.items():
+        list_rows.append(_LIST.pack(*add_string(list_key), ids.start, len(ids)))
+    for q in bank.questions:
+        text_offset, text_length = add_string(q.text)
+        question_rows.append(_QUESTION.pack(
+            -1 if q.number is None else int(q.number), text_offset, text_length,
+            len(option_rows), len(q.options), q.correct_answer
+        ))
+        for option in q.options:
+            option_rows.append(_OPTION.pack(*add_string(option)))
+
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(BINARY_MAGIC, source[0], source[1], bank.version.encode('ascii'),
+                                bank.layout.encode('ascii'), len(list_rows), len(question_rows), len(option_rows)))
+        for rows in (list_rows, question_rows, option_rows, bank.question_keys):
+            file.write(b''.join(rows))
+        file.write(strings)
+
+
+def read_binary_bank(path):
+    """Source ``(size, mtime_ns)``, ``(version, layout, question keys)`` and
+    the ``(list_key, records)`` pairs of a binary bank, as ``QuestionBank``
+    indexes them"""
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with data:
+        (magic, size, mtime_ns, version, layout,
+         list_count, question_count, option_count) = _HEADER.unpack_from(data, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f'{path} is not a question bank')
+        lists_at = _HEADER.size
+        questions_at = lists_at + list_count * _LIST.size
+        options_at = questions_at + question_count * _QUESTION.size
+        keys_at = options_at + option_count * _OPTION.size
+        strings_at = keys_at + question_count * _KEY_SIZE
+        # Text is decoded straight out of the mapping, without copying it first
+        view = memoryview(data)
+        try:
+            def text(offset, length):
+                start = strings_at + offset
+                return str(view[start:start + length], 'utf-8')
+
+            options = [text(*row) for row in _OPTION.iter_unpack(view[options_at:keys_at])]
+            questions = [
+                (None if number < 0 else number, text(text_offset, text_length),
+                 tuple(options[first_option:first_option + option_count]), correct_answer)
+                for number, text_offset, text_length, first_option, option_count, correct_answer
+                in _QUESTION.iter_unpack(view[questions_at:options_at])
+            ]
+            keys = tuple(data[at:at + _KEY_SIZE] for at in range(keys_at, strings_at, _KEY_SIZE))
+            lists = [
+                (text(key_offset, key_length), questions[first:first + count])
+                for key_offset, key_length, first, count in _LIST.iter_unpack(view[lists_at:questions_at])
+            ]
+        finally:
+            view.release()
+    return (size, mtime_ns), (version.decode('ascii'), layout.decode('ascii'), keys), lists
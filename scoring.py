@@ -0,0 +1,90 @@
+"""
+Exam scoring on compact vectors.
+
+A submission is packed into ``bytes`` with one byte per exam position (the
+chosen option, or UNANSWERED) and an exam's answer key has the same shape,
+so scoring compares two byte strings instead of looping over dict lookups.
+When numpy is installed, many submissions against one key are scored as a
+single matrix comparison.
+
+During a room exam each answer is synced as it is given into the player's
+``bytearray`` vector (:func:`record_answer`); the final submission only
+carries the :func:`checksum` of the client's copy.
+"""
+
+import zlib
+from operator import eq
+
+try:
+    import numpy
+except ImportError:  # optional
+    numpy = None
+
+# Byte stored for a position without an answer; never equals a key entry
+UNANSWERED = 255
+
+
+def answer_vector(answers, total):
+    """Pack a ``{position: option}`` dict (str or int keys) into bytes"""
+    vector = bytearray([UNANSWERED]) * total
+    for position, option in answers.items():
+        try:
+            position = int(position)
+            option = int(option)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= position < total and 0 <= option < UNANSWERED:
+            vector[position] = option
+    return bytes(vector)
+
+
+def record_answer(vector, position, option):
+    """Store ``option`` at ``position`` of a ``bytearray`` vector unless the
+    position is already answered (the first answer is final); returns the
+    recorded option, or None if either value is out of range"""
+    if not 0 <= position < len(vector) or not 0 <= option < UNANSWERED:
+        return None
+    if vector[position] == UNANSWERED:
+        vector[position] = option
+    return vector[position]
+
+
+def merge_answers(vector, other):
+    """Record every answer of vector ``other`` into ``vector`` (first answer wins)"""
+    for position, option in enumerate(other[:len(vector)]):
+        if option != UNANSWERED and vector[position] == UNANSWERED:
+            vector[position] = option
+    return vector
+
+
+def answered(vector):
+    """The answered positions of a vector as a ``{position: option}`` dict"""
+    return {str(position): option for position, option in enumerate(vector) if option != UNANSWERED}
+
+
+def checksum(vector):
+    """CRC-32 of a vector; clients send it to confirm they synced every answer"""
+    return zlib.crc32(bytes(vector))
+
+
+def _fit(vector, length):
+    """Truncate or pad ``vector`` with UNANSWERED to ``length`` bytes"""
+    if len(vector) == length:
+        return vector
+    return bytes(vector[:length]).ljust(length, bytes([UNANSWERED]))
+
+
+def score(vector, key):
+    """Number of positions where ``vector`` matches ``key``"""
+    return sum(map(eq, _fit(vector, len(key)), key))
+
+
+def score_many(vectors, key):
+    """Scores of several vectors against the same ``key``, in order"""
+    if numpy is None or not vectors or not key:
+        return [score(vector, key) for vector in vectors]
+    length = len(key)
+    matrix = numpy.frombuffer(b''.join(_fit(v, length) for v in vectors), numpy.uint8)
+    matrix = matrix.reshape(len(vectors), length)
+    matches = matrix == numpy.frombuffer(key, numpy.uint8)
+    return matches.sum(axis=1).tolist()
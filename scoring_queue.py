@@ -0,0 +1,183 @@
+"""
+Bounded queue for room submissions.
+
+Socket handlers only validate a submission and enqueue it; background
+tasks take the queue in batches and hand each batch to ``process`` (which
+scores it and broadcasts once per room).  A burst of submissions therefore
+costs each handler a few microseconds, other rooms keep being served
+between batches, and a full queue pushes back on clients instead of
+growing without bound.
+
+A batch that raises is retried one item at a time, so one bad room does
+not fail the others; ``process`` must skip what it already finished, as
+the items of a failed batch may have been partly processed.  An item that
+raises one of ``retry_on`` is queued again, up to ``max_retries`` times,
+then handed to ``on_failure``, which tells its player to resubmit.  Any
+other error is final and the item goes to ``on_failure`` at once.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringQueue:
+    """Submissions waiting to be scored, processed ``batch_size`` at a time"""
+
+    def __init__(self, socketio, process, maxsize=1000, batch_size=100, workers=1, delay=0.05,
+                 observe_wait=None, on_failure=None, max_retries=3, retry_delay=0.5,
+                 retry_on=(Exception,)):
+        self.socketio = socketio
+        # process(items) scores a batch; items are what was passed to put()
+        self.process = process
+        # on_failure(items, final) is called with items given up on; final
+        # when the error was not one worth retrying
+        self.on_failure = on_failure
+        self.max_retries = max_retries
+        # Exceptions that may go away when the item is tried again
+        self.retry_on = retry_on
+        # Seconds a worker waits after a failed attempt
+        self.retry_delay = retry_delay
+        # observe_wait(seconds) is called with each item's time in the queue
+        self.observe_wait = observe_wait
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.workers = workers
+        # Seconds a worker waits after waking so a burst lands in one batch
+        self.delay = delay
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._running = 0
+        # Counters
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.batches = 0
+        self.retried = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def admit(self):
+        """Whether an item would be queued now; counts a rejection if not"""
+        with self._lock:
+            if len(self._items) < self.maxsize:
+                return True
+            self.rejected += 1
+            return False
+
+    def put(self, item):
+        """Queue ``item``; returns False without queueing it if the queue is full"""
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self.rejected += 1
+                return False
+            self._items.append((time.monotonic(), item, 0))
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            start = self._running < self.workers
+            if start:
+                self._running += 1
+        if start:
+            self.socketio.start_background_task(self._run)
+        return True
+
+    def _take(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+        return batch
+
+    def drain(self):
+        """Process every queued item now, batch by batch, retries included;
+        returns the number of items taken"""
+        count = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return count
+            self._process(batch)
+            count += len(batch)
+
+    def _process(self, batch):
+        """Process a batch; returns False if any of it has to be tried again"""
+        now = time.monotonic()
+        try:
+            self.process([item for _, item, _ in batch])
+            error = None
+        except Exception as e:
+            logger.exception('Scoring a batch of %d submissions failed', len(batch))
+            error = e
+        if error is not None:
+            if len(batch) > 1:
+                # Find the items at fault by trying each on its own
+                results = [self._process([entry]) for entry in batch]
+                return all(results)
+            return not self._retry(batch[0], isinstance(error, self.retry_on))
+        waits = [now - queued_at for queued_at, _, _ in batch]
+        with self._lock:
+            self.batches += 1
+            self.processed += len(batch)
+            self.wait_total += sum(waits)
+        if self.observe_wait is not None:
+            for wait in waits:
+                self.observe_wait(wait)
+        return True
+
+    def _retry(self, entry, retryable):
+        # Queue a failed item again (even when full: it was admitted), or
+        # give up on it after max_retries attempts or a final error;
+        # returns whether it was queued again
+        queued_at, item, attempts = entry
+        if retryable and attempts < self.max_retries:
+            with self._lock:
+                self._items.append((queued_at, item, attempts + 1))
+                self.retried += 1
+            return True
+        with self._lock:
+            self.failed += 1
+        if self.on_failure is not None:
+            try:
+                self.on_failure([item], not retryable)
+            except Exception:
+                logger.exception('Reporting a failed submission failed')
+        return False
+
+    def _run(self):
+        # Work while there is something queued; the next put() starts a
+        # worker again once they have all stopped
+        self.socketio.sleep(self.delay)
+        while True:
+            batch = self._take()
+            if not batch:
+                with self._lock:
+                    if not self._items:
+                        self._running -= 1
+                        return
+                continue
+            if self._process(batch):
+                # Let other rooms' handlers run between batches
+                self.socketio.sleep(0)
+            else:
+                self.socketio.sleep(self.retry_delay)
+
+    def stats(self):
+        return {
+            'depth': len(self._items),
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+            'batch_size': self.batch_size,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'batches': self.batches,
+            'retried': self.retried,
+            'failed': self.failed,
+            'mean_wait': self.wait_total / self.processed if self.processed else 0.0
+        }
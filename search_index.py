@@ -0,0 +1,156 @@
+"""
+Inverted index over question text and options.
+
+Built once per bank version (see ``install_bank``).  Text is folded the
+same way for questions and queries: case and accents are dropped, Arabic
+diacritics, tatweel and letter variants (alef, yeh, teh marbuta) are
+unified, the Arabic article is stripped, and English plurals are reduced
+to their singular.  Hyphenated words are indexed whole and by part, so
+"preeclampsia" finds "pre-eclampsia" and "eclampsia" finds both.
+
+Every posting carries its precomputed BM25 weight (question text counts
+twice as much as an option), so a query only adds up the postings of its
+terms: no question is scanned.  The last query term also matches as a
+prefix, for search-as-you-type.
+"""
+
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Weight of a term in the question text relative to one in an option
+TEXT_WEIGHT = 2.0
+# Vocabulary terms a trailing prefix may expand to
+PREFIX_EXPANSIONS = 16
+MIN_PREFIX = 3
+
+STOPWORDS = frozenset(
+    'a an and are as at be by can for from has have in is it its may of on or '
+    'that the this to was were which with what when who'.split()
+)
+
+_WORD = re.compile(r"\w+(?:[-'’]\w+)*")
+_ARABIC_FOLD = str.maketrans({
+    'ـ': None,      # tatweel
+    'ى': 'ي',  # alef maksura -> yeh
+    'ة': 'ه',  # teh marbuta -> heh
+    'ٱ': 'ا',  # alef wasla -> alef
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + d): str(d) for d in range(10)}
+})
+_ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+
+def fold(text):
+    """Case-, accent- and Arabic-variant-insensitive form of ``text``"""
+    # Decomposing splits accents and hamza/madda off their letters
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+    return stripped.translate(_ARABIC_FOLD).casefold()
+
+
+def stem(word):
+    """Light stemming: Arabic article and English plurals"""
+    for prefix in _ARABIC_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            return word[len(prefix):]
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """Index terms of ``text``, in order, stopwords dropped"""
+    result = []
+    for match in _WORD.finditer(fold(text)):
+        word = re.split(r"['’]", match.group())[0]
+        parts = word.split('-')
+        words = [''.join(parts)] + parts if len(parts) > 1 else parts
+        result.extend(stem(w) for w in words if w and w not in STOPWORDS)
+    return result
+
+
+class SearchIndex:
+    """BM25-ranked postings of every term of a bank's questions"""
+
+    def __init__(self, bank):
+        counts = []
+        for question in bank.questions:
+            tf = {}
+            for term in terms(question.text):
+                tf[term] = tf.get(term, 0) + TEXT_WEIGHT
+            for option in question.options:
+                for term in terms(option):
+                    tf[term] = tf.get(term, 0) + 1
+            counts.append(tf)
+
+        total = len(counts)
+        lengths = [sum(tf.values()) for tf in counts]
+        average = sum(lengths) / total if total else 0
+        postings = {}
+        for qid, tf in enumerate(counts):
+            norm = K1 * (1 - B + B * lengths[qid] / average) if average else K1
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((qid, count * (K1 + 1) / (count + norm)))
+
+        # term -> (question IDs, weights), IDs ascending
+        self.postings = {}
+        for term, entries in postings.items():
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.postings[term] = (array('I', [qid for qid, _ in entries]),
+                                   array('f', [weight * idf for _, weight in entries]))
+        self.vocabulary = sorted(self.postings)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def _expand(self, prefix):
+        # Vocabulary terms starting with ``prefix``
+        start = bisect_left(self.vocabulary, prefix)
+        expanded = []
+        for term in self.vocabulary[start:start + PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expanded.append(term)
+        return expanded
+
+    def search(self, query, limit=20, ids=None):
+        """``(qid, score)`` of questions matching every term, best first
+
+        ``ids`` (e.g. a list's range of question IDs) restricts the results.
+        """
+        query_terms = list(dict.fromkeys(terms(query)))
+        if not query_terms:
+            return []
+        scores = None
+        for i, term in enumerate(query_terms):
+            alternatives = [term]
+            if i == len(query_terms) - 1 and len(term) >= MIN_PREFIX:
+                alternatives = [term] + [t for t in self._expand(term) if t != term]
+            matched = {}
+            for alternative in alternatives:
+                posting = self.postings.get(alternative)
+                if posting is None:
+                    continue
+                for qid, weight in zip(*posting):
+                    if matched.get(qid, 0) < weight:
+                        matched[qid] = weight
+            if scores is None:
+                scores = matched
+            else:
+                scores = {qid: score + matched[qid] for qid, score in scores.items() if qid in matched}
+            if not scores:
+                return []
+        results = scores.items() if ids is None else ((q, s) for q, s in scores.items() if q in ids)
+        return sorted(results, key=lambda item: (-item[1], item[0]))[:limit]
+
+    def nbytes(self):
+        return sum(ids.itemsize * len(ids) + weights.itemsize * len(weights)
+                   for ids, weights in self.postings.values())
@@ -0,0 +1,198 @@
+"""
+Server-side storage for sessions and exam results.
+
+Values are kept on the server and the browser only holds a signed, opaque
+ID.  Two backends are provided behind the same small interface:
+
+* ``memory://``            - in-process LRU (single worker, default)
+* ``sqlite:///path/to.db`` - SQLite file shared by every worker on the box
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, TaggedJSONSerializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from sqlite_connection import SQLiteConnection
+
+
+class MemoryStore:
+    """In-process LRU key/value store with per-entry expiry"""
+
+    def __init__(self, max_entries=10000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._items[key] = (value, expires)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def items(self):
+        """Snapshot of every unexpired ``(key, value)`` pair"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires) in self._items.items()
+                    if expires is None or expires >= now]
+
+
+class SQLiteStore:
+    """Key/value store in a SQLite file (WAL mode, safe across processes)"""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path, namespace='store', ttl=None):
+        self.path = path
+        self.table = 'kv_' + ''.join(c for c in namespace if c.isalnum() or c == '_')
+        self.ttl = ttl
+        self._puts = 0
+        self._connect = SQLiteConnection(path, timeout=10, setup=self._create_table).connect
+
+    def _create_table(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)'
+        )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                f'SELECT value, expires FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def put(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)',
+                (key, value, expires)
+            )
+            self._puts += 1
+            if self._puts % self.PURGE_EVERY == 0:
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE expires IS NOT NULL AND expires < ?',
+                    (time.time(),)
+                )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def items(self):
+        """Snapshot of every unexpired ``(key, value)`` pair"""
+        with self._connect() as conn:
+            return conn.execute(
+                f'SELECT key, value FROM {self.table} WHERE expires IS NULL OR expires >= ?',
+                (time.time(),)
+            ).fetchall()
+
+
+def create_store(url, namespace, max_entries=10000, ttl=None):
+    """Create a store from a URL such as ``memory://`` or ``sqlite:///app.db``"""
+    if not url or url.startswith('memory://'):
+        return MemoryStore(max_entries=max_entries, ttl=ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):], namespace=namespace, ttl=ttl)
+    raise ValueError(f'Unsupported store URL: {url}')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session whose data lives in a store; the cookie only carries ``sid``"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by a :func:`create_store` store"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(self.serializer.loads(data), sid=sid)
+        return ServerSideSession(sid=uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified or session.new:
+            self.store.put(session.sid, self.serializer.dumps(dict(session)))
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
@@ -0,0 +1,185 @@
+"""
+Compact shuffle plans for exams.
+
+A plan records how an exam is shuffled without copying any question:
+the order in which source questions are shown, and for each shown
+question the order of its options.  Both are seeded random-access
+permutations, so a plan holds no per-question state and any position can
+be resolved on its own.  Plans are cached so that rendering, reloading
+and scoring the same exam share one answer key.
+"""
+
+import random
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from permutations import Permutation, derive_seed, small_permutation
+
+# Salts keeping the question order and option orders of a seed independent
+ORDER_SALT = 1
+OPTIONS_SALT = 2
+
+
+class ShufflePlan:
+    """Seeded question order and per-question option orders"""
+
+    __slots__ = ('order', 'option_seed', 'answer_key')
+
+    def __init__(self, order, option_seed):
+        # order[pos] -> index of the source question shown at position pos
+        self.order = order
+        self.option_seed = option_seed
+        # Shuffled correct option per position, filled in on first scoring
+        self.answer_key = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def options_at(self, pos, count):
+        """Source option indices, in display order, for position ``pos``
+
+        ``count`` is the number of options of the question shown there. The
+        order depends on the source question, not the position, so toggling
+        question randomization keeps every question's options in place.
+        """
+        return self.options_for(self.order[pos], count)
+
+    def options_for(self, source_index, count):
+        """Option order of source question ``source_index`` (see :meth:`options_at`)"""
+        return small_permutation(count, self.option_seed, source_index)
+
+    def nbytes(self):
+        """Approximate memory held by this plan
+
+        Counts the order's Feistel tables and, whether or not it is filled
+        in yet, the answer key, so the size never changes while cached.
+        """
+        order = self.order.nbytes() if isinstance(self.order, Permutation) else sys.getsizeof(self.order)
+        return sys.getsizeof(self) + sys.getsizeof(self.option_seed) + order + sys.getsizeof(b'') + len(self.order)
+
+
+def build_shuffle_plan(questions, seed=None, randomize_questions=True):
+    """Build the plan for ``questions`` from ``seed`` (a random one if None)"""
+    if seed is None:
+        seed = random.getrandbits(64)
+    count = len(questions)
+    if randomize_questions:
+        order = Permutation(count, derive_seed(seed, ORDER_SALT))
+    else:
+        order = range(count)
+    return ShufflePlan(order, derive_seed(seed, OPTIONS_SALT))
+
+
+class PlanCache:
+    """LRU cache of shuffle plans bounded by approximate memory use"""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._plans = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+            return plan
+
+    def put(self, key, plan):
+        size = plan.nbytes()
+        if size > self.max_bytes:
+            return plan
+        with self._lock:
+            old = self._plans.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes()
+            self._plans[key] = plan
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._plans.popitem(last=False)
+                self._bytes -= evicted.nbytes()
+                self.evictions += 1
+        return plan
+
+    def get_or_build(self, key, questions, seed, randomize_questions):
+        plan = self.get(key)
+        if plan is not None and len(plan) == len(questions):
+            return plan
+        with self._lock:
+            self.misses += 1
+        return self.put(key, build_shuffle_plan(questions, seed, randomize_questions))
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self._bytes = 0
+
+
+class ShuffledQuestions(Sequence):
+    """Read-only view of ``questions`` as shuffled by ``plan``.
+
+    Question dicts are only built when an item is accessed; scoring can use
+    :meth:`correct_answer` without building them at all.
+    """
+
+    __slots__ = ('questions', 'plan')
+
+    def __init__(self, questions, plan):
+        self.questions = questions
+        self.plan = plan
+
+    def __len__(self):
+        return len(self.plan)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        question, option_order = self.source(pos)
+        options = question['options']
+        shuffled = dict(question)
+        shuffled['options'] = [options[i] for i in option_order]
+        shuffled['correct_answer'] = option_order.index(int(question['correct_answer']))
+        return shuffled
+
+    def source(self, pos):
+        """Source question and its option order (source indices) at ``pos``"""
+        source_index = self.plan.order[pos]
+        question = self.questions[source_index]
+        return question, self.plan.options_for(source_index, len(question['options']))
+
+    def correct_answer(self, pos):
+        """Shuffled index of the correct option at position ``pos``"""
+        question, option_order = self.source(pos)
+        return option_order.index(int(question['correct_answer']))
+
+    def answer_key(self):
+        """Correct option of every position as ``bytes``, cached on the plan"""
+        if self.plan.answer_key is None:
+            self.plan.answer_key = bytes(self.correct_answer(pos) for pos in range(len(self)))
+        return self.plan.answer_key
+
+    def qid(self, pos):
+        """Global question ID shown at position ``pos`` (requires a bank view)"""
+        source_index = self.plan.order[pos]
+        if hasattr(self.questions, 'qid'):
+            return self.questions.qid(source_index)
+        return self.questions[source_index].qid
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
@@ -0,0 +1,49 @@
+"""
+SQLite connections shared by the SQLite backends.
+
+Every backend keeps one connection per process.  It is opened on first
+use, not when the backend is created, and opened again in a forked
+worker, so workers forked from a preloading master (see gunicorn.conf.py)
+never share a connection.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteConnection:
+    """This process's connection to a SQLite file in WAL mode"""
+
+    def __init__(self, path, timeout=30, setup=None, lock=None):
+        self.path = path
+        self.timeout = timeout
+        # Called with every new connection, e.g. to create tables
+        self.setup = setup
+        self.lock = lock or threading.RLock()
+        self._conn = None
+        self._pid = None
+        # Connections inherited over a fork; closing one could release
+        # locks that the parent still holds, so they are only kept
+        self._inherited = []
+
+    def get(self):
+        """The connection, opened if needed; the caller holds :attr:`lock`"""
+        pid = os.getpid()
+        if self._conn is None or self._pid != pid:
+            if self._conn is not None:
+                self._inherited.append(self._conn)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self.setup is not None:
+                self.setup(conn)
+            self._conn, self._pid = conn, pid
+        return self._conn
+
+    @contextmanager
+    def connect(self):
+        """Yield the connection while holding :attr:`lock`"""
+        with self.lock:
+            yield self.get()
@@ -0,0 +1,69 @@
+"""
+Socket.IO client manager that fans events out through a SQLite file.
+
+A stand-in for a Redis or AMQP message queue when every worker runs on the
+same box: each emit is appended to a table and every worker polls it for
+rows written by the others.
+"""
+
+import time
+
+import socketio
+
+from sqlite_connection import SQLiteConnection
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """Pub/sub backend for python-socketio using ``sqlite:///path.db``"""
+
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio.db', channel='socketio', write_only=False,
+                 logger=None, poll_interval=0.02, retention=60):
+        if not url.startswith('sqlite:///'):
+            raise ValueError(f'Unsupported message queue URL: {url}')
+        self.path = url[len('sqlite:///'):]
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._connect = SQLiteConnection(self.path, setup=self._create_table).connect
+        self._published = 0
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_messages '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'payload TEXT NOT NULL, created REAL NOT NULL)'
+        )
+
+    def _publish(self, data):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO socketio_messages (channel, payload, created) VALUES (?, ?, ?)',
+                (self.channel, self.json.dumps(data), time.time())
+            )
+            self._published += 1
+            if self._published % 1000 == 0:
+                conn.execute(
+                    'DELETE FROM socketio_messages WHERE created < ?',
+                    (time.time() - self.retention,)
+                )
+
+    def _listen(self):
+        with self._connect() as conn:
+            last_id = conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM socketio_messages'
+            ).fetchone()[0]
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    'SELECT id, payload FROM socketio_messages '
+                    'WHERE channel = ? AND id > ? ORDER BY id',
+                    (self.channel, last_id)
+                ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield payload
+            if not rows:
+                self.server.sleep(self.poll_interval)
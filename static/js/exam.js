@@ -0,0 +1,1090 @@
+// Multiplayer variables
+let socket = io({ transports: JSON.parse(document.currentScript.dataset.transports) });
+let roomCode = localStorage.getItem('room_code') || null;
+let isHost = false;
+let playerName = '';
+let gameStarted = false;
+let multiplayerMode = true; // Always multiplayer for this version
+let resultsShown = false; // Flag to track if results modal has been shown
+let myPid = null; // Seat number assigned by the server
+let myRank = null; // Own leaderboard rank, kept current from 'moves'
+let myRow = null; // Last leaderboard row received for this player
+let questionPageSize = 20; // Room questions are fetched in pages of this size
+let requestedPages = new Set();
+
+// Hide exam UI until game starts
+const examContainer = document.getElementById('examContainer');
+const leaderboardSection = document.getElementById('leaderboardSection');
+const lobbyStepCreateJoin = document.getElementById('lobbyStepCreateJoin');
+const lobbyStepRoom = document.getElementById('lobbyStepRoom');
+const hostControls = document.getElementById('hostControls');
+const waitingMsg = document.getElementById('waitingMsg');
+
+// Persistent client_id for each browser
+function getClientId() {
+    let cid = localStorage.getItem('client_id');
+    if (!cid) {
+        cid = self.crypto?.randomUUID ? self.crypto.randomUUID() : ([1e7] + -1e3 + -4e3 + -8e3 + -1e11).replace(/[018]/g, c => (c ^ crypto.getRandomValues(new Uint8Array(1))[0] & 15 >> c / 4).toString(16));
+        localStorage.setItem('client_id', cid);
+    }
+    return cid;
+}
+const clientId = getClientId();
+
+// Lobby event listeners
+if (document.getElementById('createRoomBtn')) {
+    document.getElementById('createRoomBtn').onclick = function () {
+        playerName = document.getElementById('playerName').value.trim() || 'مجهول';
+        let questionList = document.getElementById('questionListSelect').value || 'list1';
+        if (questionList === 'random120') questionList = 'random120';
+        socket.emit('create_room', { name: playerName, client_id: clientId, question_list: questionList });
+    };
+}
+if (document.getElementById('joinRoomBtn')) {
+    document.getElementById('joinRoomBtn').onclick = function () {
+        playerName = document.getElementById('playerName').value.trim() || 'مجهول';
+        const code = document.getElementById('joinRoomCode').value.trim().toUpperCase();
+        let questionList = document.getElementById('questionListSelect').value || 'list1';
+        if (questionList === 'random120') questionList = 'random120';
+        if (code.length === 6) {
+            roomCode = code;
+            localStorage.setItem('room_code', roomCode);
+            socket.emit('join_room', { name: playerName, room_code: code, client_id: clientId, question_list: questionList });
+        }
+    };
+}
+if (document.getElementById('copyRoomCodeBtn')) {
+    document.getElementById('copyRoomCodeBtn').onclick = function () {
+        navigator.clipboard.writeText(roomCode);
+    };
+}
+
+// With ROOM_WIRE_FORMAT=compact players arrive as
+// [pid, name, score, time, finished, progress] arrays and leaderboard rows as
+// [pid, rank, score, time, finished, progress], names looked up by pid
+const playerNames = {};
+function decodePlayers(players) {
+    if (!Array.isArray(players)) return players;
+    return players.map(([pid, name, score, time, finished, progress]) => {
+        playerNames[pid] = name;
+        return { pid: pid, name: name, score: score, time: time, finished: !!finished, progress: progress };
+    });
+}
+function decodeRow(row) {
+    if (!Array.isArray(row)) return row;
+    const [pid, rank, score, time, finished, progress] = row;
+    return { pid: pid, rank: rank, name: playerNames[pid] || '', score: score, time: time, finished: !!finished, progress: progress };
+}
+
+// Socket.IO events
+socket.on('room_created', function (data) {
+    data.players = decodePlayers(data.players);
+    roomCode = data.room_code;
+    localStorage.setItem('room_code', roomCode);
+    isHost = true;
+    myPid = data.pid;
+    myRank = data.rank;
+    showRoomLobby(data.players, data.question_list, data.total_questions);
+});
+socket.on('room_joined', function (data) {
+    myPid = data.pid;
+    myRank = data.rank;
+});
+socket.on('player_joined', function (data) {
+    data.players = decodePlayers(data.players);
+    showRoomLobby(data.players, data.question_list, data.total_questions);
+    // Show leaderboard immediately with all participants
+    updateLeaderboard(Object.values(data.players).map(p => ({
+        pid: p.pid,
+        name: p.name,
+        score: p.score || 0,
+        time: p.time || 0,
+        finished: p.finished || false,
+        progress: p.progress || 0
+    })));
+});
+socket.on('player_left', function (data) {
+    data.players = decodePlayers(data.players);
+    if (data.host_pid !== undefined) isHost = data.host_pid === myPid;
+    showRoomLobby(data.players, data.question_list, data.total_questions);
+    // Update leaderboard when players leave
+    updateLeaderboard(Object.values(data.players).map(p => ({
+        pid: p.pid,
+        name: p.name,
+        score: p.score || 0,
+        time: p.time || 0,
+        finished: p.finished || false,
+        progress: p.progress || 0
+    })));
+});
+socket.on('game_started', function (data) {
+    beginGame(data.total_questions, data.page_size, null, data.randomize_questions);
+});
+// Reconnects (and page reloads) restore our seat by client_id
+let hasConnected = false;
+socket.on('connect', function () {
+    const code = roomCode || localStorage.getItem('room_code');
+    if (code) {
+        // After a dropped connection we may re-take a freed lobby seat;
+        // on a fresh page load only an existing seat is restored
+        socket.emit('rejoin_room', { room_code: code, client_id: clientId, name: hasConnected ? playerName : null });
+    }
+    hasConnected = true;
+});
+socket.on('rejoined', function (data) {
+    data.players = decodePlayers(data.players);
+    roomCode = data.room_code;
+    myPid = data.pid;
+    myRank = data.rank;
+    isHost = data.is_host;
+    playerName = playerName || data.name;
+    if (!data.started) {
+        showRoomLobby(data.players, data.question_list, data.total_questions);
+    } else if (!gameStarted) {
+        // Page was reloaded mid-exam: start again with the answers the
+        // server already recorded
+        beginGame(data.total_questions, data.page_size, data.answers, data.randomize_questions);
+    }
+});
+// Idle and finished rooms are deleted by the server after a while
+socket.on('room_closed', function (data) {
+    if (data.room_code !== roomCode) return;
+    roomCode = null;
+    localStorage.removeItem('room_code');
+});
+// The server could not score our submission: if it reopened it, send it
+// again; without retry_after it never will be scored
+socket.on('scoring_failed', function (data) {
+    if (data.room_code !== roomCode || !data.pids.includes(myPid)) return;
+    if (data.retry_after == null) {
+        alert(data.message);
+        return;
+    }
+    setTimeout(finishExam, data.retry_after * 1000);
+});
+// Someone in the room toggled question randomization; the server has
+// already moved our answers to the new positions
+socket.on('questions_reordered', function (data) {
+    if (!gameStarted) return;
+    randomizeQuestions = data.randomize_questions;
+    updateRandomizationStatus();
+    reloadRoomQuestions(data.answers);
+});
+socket.on('rejoin_failed', function () {
+    if (!gameStarted) {
+        roomCode = null;
+        localStorage.removeItem('room_code');
+    }
+});
+function beginGame(total, pageSize, answers, randomize) {
+    gameStarted = true;
+    totalQuestions = total;
+    questionPageSize = pageSize || questionPageSize;
+    randomizeQuestions = randomize !== false;
+    updateRandomizationStatus();
+    // Questions are filled in as their pages arrive
+    questions = new Array(total).fill(null);
+    requestedPages = new Set();
+    document.getElementById('multiplayerLobby').style.display = 'none';
+    examContainer.style.display = 'block';
+    leaderboardSection.style.display = 'block';
+    // Reset answers and question index for each user
+    userAnswers = {};
+    Object.keys(answers || {}).forEach(index => {
+        userAnswers[index] = answers[index];
+    });
+    currentQuestionIndex = 0;
+    loadQuestions();
+    showQuestion(0);
+    updateProgress();
+    generateQuestionList();
+    updateNavigationButtons();
+    updateLeaderboard([]);
+
+    // Set total questions display
+    document.getElementById('questionCounterTotal').textContent = totalQuestions;
+}
+// Question banks by URL; the URL changes with the content, so the
+// browser may keep each one forever
+const questionBanks = {};
+function loadBank(url) {
+    if (!questionBanks[url]) {
+        questionBanks[url] = fetch(url).then(response => {
+            if (!response.ok) throw new Error('Could not load question bank');
+            return response.json();
+        });
+        questionBanks[url].catch(() => delete questionBanks[url]);
+    }
+    return questionBanks[url];
+}
+// Build question objects from an exam plan (bank IDs and option orders)
+function planQuestions(bank, plan) {
+    return plan.order.map((qid, i) => {
+        const [text, options] = bank.questions[qid];
+        const question = { text: text, options: plan.options[i].map(option => options[option]) };
+        if (plan.answers) question.correct_answer = plan.answers[i];
+        return question;
+    });
+}
+// Fetch one page of the room's plan (without answers)
+function loadQuestionPage(page) {
+    if (page * questionPageSize >= totalQuestions || requestedPages.has(page)) return;
+    requestedPages.add(page);
+    // The order depends on the room's randomize flag, so it keys the cached page
+    const randomize = randomizeQuestions ? 1 : 0;
+    fetch(`/room_questions/${encodeURIComponent(roomCode)}?start=${page * questionPageSize}&count=${questionPageSize}&randomize=${randomize}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                requestedPages.delete(page);
+                return;
+            }
+            // Drop a page that arrived after the room's order changed
+            if (randomize !== (randomizeQuestions ? 1 : 0)) return;
+            return loadBank(data.bank).then(bank => showQuestionPage(data.start, planQuestions(bank, data)));
+        })
+        .catch(() => requestedPages.delete(page));
+}
+// Fill in the placeholder slides of a loaded page
+function showQuestionPage(start, pageQuestions) {
+    const slides = document.querySelectorAll('.question-slide');
+    pageQuestions.forEach((question, i) => {
+        const index = start + i;
+        if (questions[index]) return;
+        questions[index] = question;
+        slides[index].innerHTML = renderQuestion(question, index);
+        addOptionEventListeners(slides[index]);
+    });
+    if (currentQuestionIndex >= start && currentQuestionIndex < start + pageQuestions.length) {
+        restoreAnswer(currentQuestionIndex);
+    }
+}
+// Start paging the room's questions again in their new order
+function reloadRoomQuestions(answers) {
+    questions = new Array(totalQuestions).fill(null);
+    requestedPages = new Set();
+    userAnswers = {};
+    Object.keys(answers || {}).forEach(index => {
+        userAnswers[index] = answers[index];
+    });
+    const currentIndex = currentQuestionIndex;
+    loadQuestions();
+    showQuestion(currentIndex);
+    generateQuestionList();
+    updateProgress();
+}
+// Make sure the current page is loaded, and the next one once past its middle
+function ensureQuestionPages(index) {
+    const page = Math.floor(index / questionPageSize);
+    loadQuestionPage(page);
+    if (index % questionPageSize >= questionPageSize / 2) loadQuestionPage(page + 1);
+}
+// Room answers are checked on the server; the first answer to a question is final
+function checkAnswer(index, option, withSound) {
+    socket.emit('check_answer', { room_code: roomCode, client_id: clientId, index: index, option: option }, function (result) {
+        if (!result || result.error || !questions[index]) return;
+        questions[index].correct_answer = result.correct_answer;
+        userAnswers[index] = result.answer;
+        showAnswerFeedback(index, result.answer, result.correct_answer);
+        if (withSound && !window.isMuted) {
+            playSound(result.answer === result.correct_answer ? 'correct' : 'wrong');
+        }
+    });
+}
+socket.on('leaderboard_update', function (data) {
+    if (data.total_questions) totalQuestions = data.total_questions;
+    data.top = data.top.map(decodeRow);
+    data.changed = data.changed.map(decodeRow);
+    applyLeaderboardUpdate(data);
+    // If this player finished, show results modal (only if not already shown)
+    const me = myRow;
+    if (me && me.finished && !resultsShown) {
+        resultsShown = true; // Mark as shown
+        showResults({
+            correct_answers: me.score,
+            total_questions: totalQuestions,
+            score_percentage: (me.score / totalQuestions) * 100
+        });
+    }
+});
+socket.on('error', function (data) {
+    alert(data.message);
+});
+
+function showRoomLobby(players, questionList, totalQuestions) {
+    lobbyStepCreateJoin.style.display = 'none';
+    lobbyStepRoom.style.display = 'block';
+    document.getElementById('roomCodeDisplay').textContent = roomCode;
+    // Show selected list
+    let listLabel = document.getElementById('selectedListLabel');
+    if (!listLabel) {
+        listLabel = document.createElement('div');
+        listLabel.id = 'selectedListLabel';
+        listLabel.className = 'mt-2 mb-2';
+        document.getElementById('lobbyStepRoom').prepend(listLabel);
+    }
+    listLabel.innerHTML = `<span class="fw-bold">قائمة الأسئلة المختارة:</span> <span class="badge bg-info">${questionList === 'list1' ? 'اخر 50 سؤال' : questionList === 'list2' ? 'اول 99 سؤال' : questionList === 'list3' ? 'اخر 45 سؤال' : questionList === 'list4' ? '183 سؤال' : questionList === 'list5' ? 'ثاني 100 سؤال' : questionList === 'list6' ? 'ثالث 100 سؤال' : questionList === 'all_questions' ? 'شاااااااامل' : questionList}</span> <span class="fw-bold ms-2">عدد الأسئلة:</span> <span class="badge bg-secondary">${totalQuestions}</span>`;
+    // List players
+    const playersList = document.getElementById('playersList');
+    playersList.innerHTML = '';
+    let i = 1;
+    for (const [sid, player] of Object.entries(players)) {
+        const li = document.createElement('li');
+        li.className = 'list-group-item';
+        li.innerHTML = `<span class="fw-bold">${i++}.</span> ${player.name}`;
+        playersList.appendChild(li);
+    }
+    // Host controls
+    if (isHost) {
+        hostControls.style.display = 'block';
+        waitingMsg.style.display = 'none';
+    } else {
+        hostControls.style.display = 'none';
+        waitingMsg.style.display = 'block';
+    }
+    // Show leaderboard immediately with all participants
+    updateLeaderboard(Object.values(players).map(p => ({
+        pid: p.pid,
+        name: p.name,
+        score: p.score || 0,
+        time: p.time || 0,
+        finished: p.finished || false,
+        progress: p.progress || 0
+    })));
+}
+if (document.getElementById('startGameBtn')) {
+    document.getElementById('startGameBtn').onclick = function () {
+        socket.emit('start_game', { room_code: roomCode, client_id: clientId });
+    };
+}
+
+// Leaderboard updates carry the top rows, the rows that changed and the
+// rank moves since the last update; keep our own rank and row current
+function applyLeaderboardUpdate(data) {
+    (data.moves || []).forEach(([pid, from, to]) => {
+        if (pid === myPid || myRank === null) return;
+        if (from !== null && myRank > from) myRank--;
+        if (to !== null && myRank >= to) myRank++;
+    });
+    data.top.concat(data.changed).forEach(row => {
+        if (row.pid === myPid) {
+            myRow = row;
+            myRank = row.rank;
+        }
+    });
+    const rows = data.top.slice();
+    if (myRow && !rows.some(row => row.pid === myPid)) {
+        rows.push({ ...myRow, rank: myRank });
+    }
+    updateLeaderboard(rows);
+}
+
+function updateLeaderboard(leaderboard) {
+    const tbody = document.getElementById('leaderboardBody');
+    tbody.innerHTML = '';
+    leaderboard.forEach((player, idx) => {
+        const progressPercent = Math.round((player.progress || 0) / totalQuestions * 100);
+        const isMe = myPid !== null && player.pid !== undefined ? player.pid === myPid : player.name === playerName;
+        const rowClass = isMe ? 'table-primary fw-bold' : '';
+        const tr = document.createElement('tr');
+        tr.className = rowClass;
+        const progressBar = `<div class='progress leaderboard-progress-bar' style='height:16px; min-width:80px;'>
+            <div class='progress-bar ${player.finished ? 'bg-success' : ''}' role='progressbar' style='width:${progressPercent}%; transition: width 0.5s;'>
+                <span style='color:#fff; font-size:0.9em;'>${progressPercent}%</span>
+            </div>
+        </div>`;
+        tr.innerHTML = `
+            <td>${player.rank || idx + 1}</td>
+            <td>${player.name} ${isMe ? '<i class=\'fas fa-user\'></i>' : ''}</td>
+            <td>${player.score || 0}</td>
+            <td>${player.finished ? (player.time || 0).toFixed(1) : '-'}</td>
+            <td>${player.finished ? '<span class=\'badge bg-success\'>انتهى</span>' : progressBar}</td>
+        `;
+        tbody.appendChild(tr);
+    });
+}
+
+// CRC-32 (as zlib.crc32) of a byte array
+const crcTable = Array.from({ length: 256 }, (_, n) => {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    return c >>> 0;
+});
+function crc32(bytes) {
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < bytes.length; i++) crc = crcTable[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+// One byte per question: the chosen option, or 255 if unanswered
+function answerVector() {
+    const vector = new Uint8Array(totalQuestions).fill(255);
+    Object.keys(userAnswers).forEach(index => {
+        if (index < totalQuestions) vector[index] = userAnswers[index];
+    });
+    return vector;
+}
+
+// Exam logic integration
+function finishExam() {
+    // Every answer was already synced by checkAnswer; finalize with a checksum
+    // and only send the whole set if the server's copy differs
+    // The score arrives with the next leaderboard_update
+    const codeToSend = roomCode || localStorage.getItem('room_code');
+    socket.emit('finalize_answers', { room_code: codeToSend, client_id: clientId, checksum: crc32(answerVector()) }, function (result) {
+        if (!result) return;
+        if (result.error === 'out of sync') {
+            submitAllAnswers(codeToSend);
+        } else if (result.error === 'busy') {
+            setTimeout(finishExam, (result.retry_after || 1) * 1000);
+        }
+    });
+}
+function submitAllAnswers(code) {
+    socket.emit('submit_answers', { room_code: code, answers: userAnswers, client_id: clientId }, function (result) {
+        if (result && result.error === 'busy') {
+            setTimeout(() => submitAllAnswers(code), (result.retry_after || 1) * 1000);
+        }
+    });
+}
+
+// Hide exam UI until multiplayer game starts
+examContainer.style.display = 'none';
+leaderboardSection.style.display = 'none';
+
+// Global variables
+let currentQuestionIndex = 0;
+let questions = [];
+let userAnswers = {};
+let totalQuestions = 0;
+let incorrectAnswers = [];
+let randomizeQuestions = true;
+
+// Initialize the exam
+document.addEventListener('DOMContentLoaded', function () {
+    // Load server data
+    try {
+        const serverData = JSON.parse(document.getElementById('serverData').textContent);
+        questions = serverData.questions;
+        totalQuestions = serverData.totalQuestions;
+        randomizeQuestions = serverData.randomizeQuestions;
+    } catch (e) {
+        console.error('Error loading server data:', e);
+    }
+
+    loadQuestions();
+    showQuestion(0);
+    updateProgress();
+    generateQuestionList();
+    updateNavigationButtons();
+    setupRandomizationControls();
+    updateRandomizationStatus();
+
+    // Set total questions display
+    document.getElementById('questionCounterTotal').textContent = totalQuestions;
+
+    // Prevent zoom on double tap for mobile
+    let lastTouchEnd = 0;
+    document.addEventListener('touchend', function (event) {
+        const now = (new Date()).getTime();
+        if (now - lastTouchEnd <= 300) {
+            event.preventDefault();
+        }
+        lastTouchEnd = now;
+    }, false);
+
+    // Fetch available question lists and populate the select
+    fetch('/get_question_lists').then(r => r.json()).then(lists => {
+        const select = document.getElementById('questionListSelect');
+        select.innerHTML = '';
+        // Define the desired order and labels
+        const order = [
+            { key: 'list2', label: 'اول 100 سؤال' },
+            { key: 'list5', label: 'ثاني 100 سؤال' },
+            { key: 'list6', label: 'ثالث 100 سؤال' },
+            { key: 'list4', label: '183 سؤال' },
+            { key: 'list3', label: '45 سؤال' },
+            { key: 'list1', label: 'اخر 50 سؤال' }
+        ];
+        order.forEach(({ key, label }) => {
+            if (lists[key] !== undefined) {
+                const count = lists[key];
+                const option = document.createElement('option');
+                option.value = key;
+                option.textContent = `${label} (${count} سؤال)`;
+                select.appendChild(option);
+            }
+        });
+        // Add the random 120 questions option
+        const random120Option = document.createElement('option');
+        random120Option.value = 'random120';
+        random120Option.textContent = '120 سؤال عشوائي';
+        select.appendChild(random120Option);
+        // Add the all questions option
+        const allQuestionsOption = document.createElement('option');
+        allQuestionsOption.value = 'all_questions';
+        allQuestionsOption.textContent = 'شاااااااامل';
+        select.appendChild(allQuestionsOption);
+    });
+});
+
+function setupRandomizationControls() {
+    const randomizeToggle = document.getElementById('randomizeToggle');
+
+    randomizeToggle.addEventListener('click', function () {
+        randomizeQuestions = !randomizeQuestions;
+        updateRandomizationSettings();
+        updateRandomizationStatus();
+    });
+}
+
+function updateRandomizationStatus() {
+    const randomizeToggle = document.getElementById('randomizeToggle');
+    if (randomizeQuestions) {
+        randomizeToggle.classList.add('active');
+        randomizeToggle.classList.remove('inactive');
+    } else {
+        randomizeToggle.classList.add('inactive');
+        randomizeToggle.classList.remove('active');
+    }
+}
+
+function updateRandomizationSettings() {
+    let url = '/update_randomization';
+    if (multiplayerMode && roomCode) {
+        url += `?room_code=${encodeURIComponent(roomCode)}`;
+    }
+    fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            randomize_questions: randomizeQuestions
+        })
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                // Show success feedback
+                showRandomizationFeedback();
+
+                // Rooms page the new order in once the server announces it
+                if (!(multiplayerMode && roomCode)) reloadQuestionsWithNewSettings();
+            } else {
+                // Keep asking for the order the server still has
+                randomizeQuestions = !randomizeQuestions;
+                updateRandomizationStatus();
+            }
+        })
+        .catch(error => {
+            console.error('Error updating randomization settings:', error);
+        });
+}
+
+function reloadQuestionsWithNewSettings() {
+    // Store current question index and answers
+    const currentIndex = currentQuestionIndex;
+    const savedAnswers = { ...userAnswers };
+
+    // Get updated questions data from server
+    fetch('/get_questions_data')
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                console.error('Error:', data.error);
+                return;
+            }
+            return loadBank(data.bank).then(bank => ({ data: data, bank: bank }));
+        })
+        .then(loaded => {
+            if (!loaded) return;
+            const data = loaded.data;
+
+            // Update global variables
+            questions = planQuestions(loaded.bank, data);
+            totalQuestions = data.total_questions;
+            randomizeQuestions = data.randomize_questions;
+
+            // Reload questions in the container
+            loadQuestions();
+
+            // Restore current question and answers
+            currentQuestionIndex = currentIndex;
+            userAnswers = savedAnswers;
+
+            // Show the current question with restored state
+            showQuestion(currentIndex);
+
+            // Update question list
+            generateQuestionList();
+
+            // Update progress
+            updateProgress();
+
+            // Show success message
+            showRandomizationFeedback();
+        })
+        .catch(error => {
+            console.error('Error reloading questions:', error);
+            // Fallback: reload the page
+            window.location.reload();
+        });
+}
+
+function showRandomizationFeedback() {
+    // Create a temporary success message
+    const feedback = document.createElement('div');
+    feedback.className = 'alert alert-success alert-dismissible fade show position-fixed';
+    feedback.style.cssText = 'top: 20px; right: 20px; z-index: 1050; min-width: 300px;';
+    feedback.innerHTML = `
+    <i class="fas fa-check-circle me-2"></i>
+    تم تحديث إعدادات الامتحان بنجاح
+    <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+`;
+
+    document.body.appendChild(feedback);
+
+    // Remove after 3 seconds
+    setTimeout(() => {
+        if (feedback.parentNode) {
+            feedback.parentNode.removeChild(feedback);
+        }
+    }, 3000);
+}
+
+function loadQuestions() {
+    const container = document.getElementById('questionsContainer');
+    container.innerHTML = '';
+
+    questions.forEach((question, index) => {
+        const questionDiv = document.createElement('div');
+        questionDiv.className = 'question-slide';
+        questionDiv.style.display = index === 0 ? 'block' : 'none';
+        questionDiv.innerHTML = renderQuestion(question, index);
+        container.appendChild(questionDiv);
+    });
+
+    // Add event listeners to options
+    addOptionEventListeners(container);
+}
+
+function renderQuestion(question, index) {
+    if (!question) {
+        // Placeholder until the question's page has been fetched
+        return `
+    <div class="question-text text-center text-muted">
+        <i class="fas fa-spinner fa-spin"></i>
+    </div>
+`;
+    }
+    return `
+    <div class="question-text">
+        ${question.text}
+    </div>
+
+    <div class="options-container">
+        ${question.options.map((option, optionIndex) => `
+            <div class="option-item" data-question="${index}" data-option="${optionIndex}" data-correct="${question.correct_answer}">
+                <div class="form-check w-100">
+                    <input class="form-check-input" type="radio" 
+                           name="answer_${index}" id="option_${index}_${optionIndex}" 
+                           value="${optionIndex}">
+                    <label class="form-check-label" for="option_${index}_${optionIndex}">
+                        ${option}
+                    </label>
+                </div>
+            </div>
+        `).join('')}
+    </div>
+`;
+}
+
+function addOptionEventListeners(root) {
+    const options = root.querySelectorAll('.option-item');
+    options.forEach(option => {
+        option.addEventListener('click', function (e) {
+            e.preventDefault();
+            e.stopPropagation();
+
+            const questionIndex = parseInt(this.dataset.question);
+            const optionIndex = parseInt(this.dataset.option);
+
+            // Store the answer
+            userAnswers[questionIndex] = optionIndex;
+
+            // Update navigation buttons
+            updateNavigationButtons();
+
+            // Show next button instead of auto-advancing
+            showNextButton();
+
+            if (gameStarted) {
+                // Lock the question while the server checks the answer
+                this.parentElement.querySelectorAll('.option-item').forEach(opt => {
+                    opt.style.pointerEvents = 'none';
+                });
+                checkAnswer(questionIndex, optionIndex, true);
+            } else {
+                showAnswerFeedback(questionIndex, optionIndex, parseInt(this.dataset.correct));
+            }
+        });
+
+        // Add touch event listeners for better mobile experience
+        option.addEventListener('touchstart', function () {
+            this.style.transform = 'scale(0.98)';
+        });
+
+        option.addEventListener('touchend', function () {
+            this.style.transform = '';
+        });
+    });
+}
+
+function showAnswerFeedback(questionIndex, selectedAnswer, correctAnswer) {
+    const questionDiv = document.querySelector(`[data-question="${questionIndex}"]`).parentElement;
+    const options = questionDiv.querySelectorAll('.option-item');
+
+    // Remove previous feedback
+    options.forEach(opt => {
+        opt.classList.remove('correct', 'incorrect');
+    });
+
+    // Show feedback
+    if (selectedAnswer === correctAnswer) {
+        options[selectedAnswer].classList.add('correct');
+
+        // Add celebration animation
+        setTimeout(() => {
+            options[selectedAnswer].style.animation = 'correctPulse 0.6s ease-in-out';
+        }, 100);
+    } else {
+        options[selectedAnswer].classList.add('incorrect');
+        options[correctAnswer].classList.add('correct');
+
+        // Store incorrect answer for review
+        incorrectAnswers.push({
+            questionIndex: questionIndex,
+            question: questions[questionIndex],
+            userAnswer: selectedAnswer,
+            correctAnswer: correctAnswer
+        });
+
+        // Add shake animation
+        setTimeout(() => {
+            options[selectedAnswer].style.animation = 'incorrectShake 0.6s ease-in-out';
+        }, 100);
+    }
+
+    // Disable further interaction
+    options.forEach(opt => {
+        opt.style.pointerEvents = 'none';
+    });
+}
+
+function showQuestion(index) {
+    const slides = document.querySelectorAll('.question-slide');
+    const currentSlide = slides[currentQuestionIndex];
+    const newSlide = slides[index];
+
+    if (currentSlide && newSlide && currentQuestionIndex !== index) {
+        // Add fade-out animation to current question
+        currentSlide.classList.add('fade-out');
+
+        // After fade-out animation, show new question with fade-in animation
+        setTimeout(() => {
+            // Hide all slides
+            slides.forEach((slide, i) => {
+                slide.style.display = i === index ? 'block' : 'none';
+            });
+
+            // Remove fade-out class and add fade-in class
+            currentSlide.classList.remove('fade-out');
+            newSlide.classList.add('fade-in');
+
+            // Remove fade-in class after animation completes
+            setTimeout(() => {
+                newSlide.classList.remove('fade-in');
+            }, 200);
+        }, 200);
+    } else {
+        // Simple show/hide for initial load or same question
+        slides.forEach((slide, i) => {
+            slide.style.display = i === index ? 'block' : 'none';
+        });
+    }
+
+    document.getElementById('questionNumber').textContent = index + 1;
+    document.getElementById('questionCounterNumber').textContent = index + 1;
+    document.getElementById('questionCounterTotal').textContent = totalQuestions;
+    currentQuestionIndex = index;
+
+    updateNavigationButtons();
+    updateProgress();
+
+    if (gameStarted) ensureQuestionPages(index);
+    restoreAnswer(index);
+
+    // Emit progress update for multiplayer
+    if (multiplayerMode && roomCode) {
+        socket.emit('progress_update', { room_code: roomCode, current_index: index, client_id: clientId });
+    }
+}
+
+// Show previous answers if they exist
+function restoreAnswer(index) {
+    const question = questions[index];
+    if (userAnswers[index] === undefined) {
+        hideNextButton(); // Hide next button for unanswered questions
+        return;
+    }
+    showNextButton(); // Show next button if question was already answered
+    if (!question) return;
+    if (question.correct_answer !== undefined) {
+        showAnswerFeedback(index, userAnswers[index], question.correct_answer);
+    } else if (gameStarted) {
+        // Answered before a reload: ask the server for the recorded result
+        checkAnswer(index, userAnswers[index], false);
+    }
+}
+
+function nextQuestion() {
+    if (currentQuestionIndex < totalQuestions - 1) {
+        showQuestion(currentQuestionIndex + 1);
+    }
+}
+
+function previousQuestion() {
+    if (currentQuestionIndex > 0) {
+        showQuestion(currentQuestionIndex - 1);
+    }
+}
+
+function showNextButton() {
+    const nextBtn = document.getElementById('nextBtn');
+    const finishBtn = document.getElementById('finishBtn');
+
+    if (currentQuestionIndex === totalQuestions - 1) {
+        // Last question - show finish button
+        nextBtn.style.display = 'none';
+        finishBtn.style.display = 'inline-block';
+    } else {
+        // Not last question - show next button
+        nextBtn.style.display = 'inline-block';
+        finishBtn.style.display = 'none';
+    }
+}
+
+function hideNextButton() {
+    const nextBtn = document.getElementById('nextBtn');
+    const finishBtn = document.getElementById('finishBtn');
+
+    nextBtn.style.display = 'none';
+    finishBtn.style.display = 'none';
+}
+
+function updateNavigationButtons() {
+    const prevBtn = document.getElementById('prevBtn');
+
+    // Enable/disable previous button
+    prevBtn.disabled = currentQuestionIndex === 0;
+}
+
+function updateProgress() {
+    const progress = ((currentQuestionIndex + 1) / totalQuestions) * 100;
+    document.getElementById('progressBar').style.width = progress + '%';
+}
+
+function generateQuestionList() {
+    const container = document.getElementById('questionList');
+    container.innerHTML = '';
+
+    questions.forEach((question, index) => {
+        const questionBtn = document.createElement('div');
+        questionBtn.className = 'col-6 col-md-3 mb-2';
+        questionBtn.innerHTML = `
+    <button class="btn btn-outline-primary w-100 question-nav-btn" 
+            onclick="goToQuestion(${index})" 
+            data-question="${index}">
+        ${index + 1}
+    </button>
+`;
+        container.appendChild(questionBtn);
+    });
+}
+
+function goToQuestion(index) {
+    showQuestion(index);
+    // Close modal
+    const modal = bootstrap.Modal.getInstance(document.getElementById('questionListModal'));
+    modal.hide();
+}
+
+function showQuestionList() {
+    const modal = new bootstrap.Modal(document.getElementById('questionListModal'));
+    modal.show();
+}
+
+function showResults(data) {
+    document.getElementById('finalScore').textContent = data.score_percentage.toFixed(1) + '%';
+    document.getElementById('correctCount').textContent = data.correct_answers;
+    document.getElementById('incorrectCount').textContent = data.total_questions - data.correct_answers;
+    document.getElementById('finalProgressBar').style.width = data.score_percentage + '%';
+
+    // Performance message
+    let message = '';
+    if (data.score_percentage >= 90) {
+        message = '<strong>ممتاز!</strong> أداء رائع، احتفظ بهذا المستوى.';
+    } else if (data.score_percentage >= 80) {
+        message = '<strong>جيد جداً!</strong> أداء ممتاز، واصل التقدم.';
+    } else if (data.score_percentage >= 70) {
+        message = '<strong>جيد!</strong> أداء مقبول، يمكنك التحسن أكثر.';
+    } else if (data.score_percentage >= 60) {
+        message = '<strong>مقبول!</strong> تحتاج إلى مراجعة أكثر.';
+    } else {
+        message = '<strong>تحتاج إلى تحسين!</strong> راجع المادة جيداً وحاول مرة أخرى.';
+    }
+    document.getElementById('performanceMessage').innerHTML = message;
+
+    // Show review section if there are incorrect answers
+    if (incorrectAnswers.length > 0) {
+        document.getElementById('reviewSection').style.display = 'block';
+        generateReviewContent();
+    }
+
+    const modal = new bootstrap.Modal(document.getElementById('resultsModal'));
+    modal.show();
+}
+
+function generateReviewContent() {
+    const container = document.getElementById('reviewQuestions');
+    container.innerHTML = '';
+
+    incorrectAnswers.forEach((item, index) => {
+        const reviewDiv = document.createElement('div');
+        reviewDiv.className = 'review-question';
+        reviewDiv.innerHTML = `
+        <h6 class="mb-2">
+            <i class="fas fa-question-circle me-2"></i>
+            السؤال ${item.questionIndex + 1}:
+        </h6>
+        <p class="mb-3">${item.question.text}</p>
+
+        <div class="options-review">
+            ${item.question.options.map((option, optionIndex) => {
+            let className = 'review-option';
+            if (optionIndex === item.userAnswer) {
+                className += ' user-answer';
+            }
+            if (optionIndex === item.correctAnswer) {
+                className += ' correct-answer';
+            }
+
+            return `
+                <div class="${className}">
+                    <i class="fas ${optionIndex === item.correctAnswer ? 'fa-check text-success' :
+                    optionIndex === item.userAnswer ? 'fa-times text-danger' : 'fa-circle text-muted'} me-2"></i>
+                    ${option}
+                </div>
+            `;
+        }).join('')}
+        </div>
+    `;
+        container.appendChild(reviewDiv);
+    });
+}
+
+function toggleReview() {
+    const content = document.getElementById('reviewContent');
+    const isVisible = content.style.display !== 'none';
+
+    if (isVisible) {
+        content.style.display = 'none';
+        content.style.animation = 'slideInUp 0.3s ease-in-out reverse';
+    } else {
+        content.style.display = 'block';
+        content.style.animation = 'slideInUp 0.3s ease-in-out';
+    }
+}
+
+function closeResultsModal() {
+    const modal = bootstrap.Modal.getInstance(document.getElementById('resultsModal'));
+    modal.hide();
+}
+
+// Keyboard navigation
+document.addEventListener('keydown', function (e) {
+    if (!gameStarted) return; // Only allow keyboard navigation when game has started
+
+    if (e.key >= '1' && e.key <= '3') {
+        const currentQuestion = questions[currentQuestionIndex];
+        const optionIndex = parseInt(e.key) - 1;
+        if (currentQuestion && optionIndex < currentQuestion.options.length) {
+            const optionElement = document.querySelector(`[data-question="${currentQuestionIndex}"][data-option="${optionIndex}"]`);
+            if (optionElement) {
+                optionElement.click();
+            }
+        }
+    } else if (e.key === 'ArrowRight') {
+        previousQuestion();
+    }
+});
+
+// Swipe navigation for mobile
+let touchStartX = 0;
+let touchEndX = 0;
+
+document.addEventListener('touchstart', e => {
+    touchStartX = e.changedTouches[0].screenX;
+});
+
+document.addEventListener('touchend', e => {
+    touchEndX = e.changedTouches[0].screenX;
+    handleSwipe();
+});
+
+function handleSwipe() {
+    const swipeThreshold = 50;
+    const diff = touchStartX - touchEndX;
+
+    if (Math.abs(diff) > swipeThreshold) {
+        if (diff > 0) {
+            // Swipe left - go to next question
+            if (currentQuestionIndex < totalQuestions - 1) {
+                nextQuestion();
+            }
+        } else {
+            // Swipe right - go to previous question
+            if (currentQuestionIndex > 0) {
+                previousQuestion();
+            }
+        }
+    }
+}
+
+// Efficient sound effect handling
+const soundUrls = {
+    correct: 'https://assets.mixkit.co/active_storage/sfx/2870/2870-preview.mp3',
+    wrong: 'https://assets.mixkit.co/active_storage/sfx/950/950-preview.mp3',
+    toggle: 'https://assets.mixkit.co/active_storage/sfx/2579/2579-preview.mp3'
+};
+const soundEffects = {
+    correct: new Audio(soundUrls.correct),
+    wrong: new Audio(soundUrls.wrong),
+    toggle: new Audio(soundUrls.toggle)
+};
+// Preload sounds
+Object.values(soundEffects).forEach(audio => { audio.preload = 'auto'; audio.load(); });
+window.isMuted = false;
+function playSound(type) {
+    if (window.isMuted) return;
+    const audio = soundEffects[type];
+    if (audio) {
+        audio.currentTime = 0;
+        audio.play();
+    }
+}
+document.getElementById('muteBtn').onclick = function () {
+    window.isMuted = !window.isMuted;
+    this.innerHTML = window.isMuted ? '<i class="fas fa-volume-mute"></i>' : '<i class="fas fa-volume-up"></i>';
+    playSound('toggle');
+};